@@ -1,25 +1,72 @@
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
 import requests
+from utils.candle_store import candle_store, rows_from_tuples, interval_seconds
+from utils.quotes import COINGECKO_IDS, quote_service
+
+ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY", "TU_CLAVE_API")
 
 # Función para obtener precios de acciones
-def get_stock_price(symbol):
+def get_stock_price(symbol, interval="5min"):
     url = "https://www.alphavantage.co/query"
     params = {
         "function": "TIME_SERIES_INTRADAY",
         "symbol": symbol,
-        "interval": "5min",
-        "apikey": "TU_CLAVE_API"
+        "interval": interval,
+        "outputsize": "full",
+        "apikey": ALPHA_VANTAGE_API_KEY
     }
     response = requests.get(url, params=params)
     data = response.json()
-    return data["Time Series (5min)"] if "Time Series (5min)" in data else None
+    series = data.get(f"Time Series ({interval})")
+    if series:
+        # Guardar las velas localmente para gráficos y análisis
+        timezone = data.get("Meta Data", {}).get("6. Time Zone", "US/Eastern")
+        candle_store.write(symbol, interval, rows_from_tuples(parse_stock_candles(series, timezone)))
+    return series
+
+def parse_stock_candles(series, timezone="US/Eastern"):
+    tz = ZoneInfo(timezone)
+    candles = []
+    for timestamp, values in series.items():
+        ts = int(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=tz).timestamp())
+        candles.append((
+            ts,
+            float(values["1. open"]),
+            float(values["2. high"]),
+            float(values["3. low"]),
+            float(values["4. close"]),
+            float(values["5. volume"]),
+        ))
+    return candles
+
+# Precio en USD de una criptomoneda, a través del servicio de cotizaciones compartido
+async def get_crypto_price(symbol):
+    return await quote_service.get(symbol, "crypto")
 
-# Función para obtener precios de criptomonedas
-def get_crypto_price(symbol):
-    url = f"https://api.coingecko.com/api/v3/simple/price"
+# Velas OHLC de CoinGecko: 30 minutos para 1-2 días, 4 horas para 3-30 días
+def get_crypto_candles(symbol, days=1, interval=None):
+    # Intervalos mayores que el de CoinGecko se agregan localmente
+    native = "30min" if days <= 2 else "4h"
+    interval = interval or native
+    if interval_seconds(interval) < interval_seconds(native):
+        raise ValueError(f"No {interval} candles available for {days} days of {symbol}")
+    # Los pares de Kraken (XXBTZUSD) se piden con su id de CoinGecko y se guardan con el nombre del par
+    coin = COINGECKO_IDS.get(symbol, symbol)
+    url = f"https://api.coingecko.com/api/v3/coins/{coin}/ohlc"
     params = {
-        "ids": symbol,
-        "vs_currencies": "usd"
+        "vs_currency": "usd",
+        "days": days
     }
     response = requests.get(url, params=params)
     data = response.json()
-    return data.get(symbol, {}).get("usd", None)
+    if not isinstance(data, list):
+        return []
+    # CoinGecko no incluye volumen en este endpoint
+    candles = [(int(ms // 1000), o, h, l, c, 0.0) for ms, o, h, l, c in data]
+    rows = rows_from_tuples(candles)
+    if interval != native:
+        rows = candle_store.downsample(rows, interval_seconds(interval))
+    candle_store.write(symbol, interval, rows)
+    return candles
@@ -0,0 +1,48 @@
+"""
+Full-universe trend recompute cost.
+
+    python -m benchmarks.bench_analytics
+
+Fills the candle history with a random walk for a few hundred pairs and times
+MarketAnalytics.trends() for several windows, cold (cache cleared) and cached.
+"""
+import time
+import numpy as np
+from utils.analytics import MarketAnalytics
+
+PAIRS = 400
+CANDLES = 1440
+WINDOWS = (14, 50, 200, 1000)
+REPEATS = 20
+
+
+def main():
+    analytics = MarketAnalytics(candle_seconds=60, capacity=CANDLES)
+    rng = np.random.default_rng(42)
+    for i in range(PAIRS):
+        analytics.history.row(f"PAIR{i:04d}USD")
+
+    prices = rng.uniform(1, 1000, PAIRS)
+    for _ in range(CANDLES):
+        prices *= np.exp(rng.normal(0, 0.002, PAIRS))
+        candles = np.vstack([prices, prices * 1.001, prices * 0.999, prices])
+        analytics.history.append(candles)
+
+    print(f"{PAIRS} pairs x {CANDLES} candles")
+    for window in WINDOWS:
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            analytics.cache.clear()
+            analytics.trends(window)
+        cold = (time.perf_counter() - start) / REPEATS
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            analytics.trends(window)
+        cached = (time.perf_counter() - start) / REPEATS
+
+        print(f"window {window:5d}: recompute {cold * 1e3:7.2f} ms, cached {cached * 1e6:7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Firebase ID-token verification cost per request.
+
+    python -m benchmarks.bench_auth
+
+Signs tokens with a throwaway RSA key, installs its certificate in the verifier and
+compares a cold verification (RS256 signature check) with a warm one (LRU hit).
+"""
+import time
+import asyncio
+from fakes import firebase as fake_firebase
+from fakes.firebase import make_key_and_cert
+from utils.firebase_auth import FirebaseTokenVerifier
+
+PROJECT_ID = "bench-project"
+ITERATIONS = 2000
+
+
+def make_token(key, uid):
+    return fake_firebase.make_token(key, uid, PROJECT_ID, kid="bench")
+
+
+async def main():
+    key, cert = make_key_and_cert()
+    verifier = FirebaseTokenVerifier(project_id=PROJECT_ID, revocation_sample_rate=0)
+    verifier.set_certificates({"bench": cert}, max_age=3600)
+    tokens = [make_token(key, f"user-{i}") for i in range(ITERATIONS)]
+
+    start = time.perf_counter()
+    for token in tokens:
+        await verifier.verify(token)
+    cold = (time.perf_counter() - start) / ITERATIONS
+
+    start = time.perf_counter()
+    for token in tokens:
+        await verifier.verify(token)
+    warm = (time.perf_counter() - start) / ITERATIONS
+
+    print(f"cold (signature check): {cold * 1e6:8.1f} us/request")
+    print(f"warm (LRU hit):         {warm * 1e6:8.1f} us/request")
+    print(f"cert fetches:           {verifier.cert_fetches}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
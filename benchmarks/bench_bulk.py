@@ -0,0 +1,102 @@
+"""
+Per-user wallet queries versus keyset-paginated bulk reads, before and after migrations.
+
+    python -m benchmarks.bench_bulk
+
+Seeds a SQLite database (20k users, 5 wallets each), then times the dashboard
+pattern of one query per user against bulk pages and the NDJSON export for the same
+users, first without indexes and then with migrations/ applied. Also reports the
+export's peak Python memory, which grows with the id list but not with the rows.
+"""
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import tempfile
+import tracemalloc
+
+USERS = 20000
+WALLETS_PER_USER = 5
+SAMPLE = 2000
+
+
+def seed(path: str):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE wallets (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, currency TEXT, balance REAL)")
+    conn.execute("CREATE TABLE subscriptions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, plan TEXT, "
+                 "price REAL, is_active INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    rng = random.Random(1)
+    # Interleaved inserts, as in production where users add wallets over time
+    rows = [(user_id, currency, rng.uniform(0, 1000))
+            for currency in ("USD", "BTC", "ETH", "SOL", "ADA")[:WALLETS_PER_USER]
+            for user_id in range(1, USERS + 1)]
+    conn.executemany("INSERT INTO wallets (user_id, currency, balance) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+async def per_user(db, user_ids):
+    count = 0
+    for user_id in user_ids:
+        async with db.acquire() as conn:
+            count += len(await conn.fetchall("SELECT id, user_id, currency, balance FROM wallets WHERE user_id = %s",
+                                             (user_id,)))
+    return count
+
+
+async def paged(query, user_ids):
+    count, cursor = 0, None
+    while True:
+        rows, cursor = await query.page(user_ids, ["currency", "balance"], limit=1000, cursor=cursor)
+        count += len(rows)
+        if cursor is None:
+            return count
+
+
+async def exported(query, user_ids):
+    count = 0
+    async for chunk in query.export(user_ids, ["user_id", "currency", "balance"], page_size=1000):
+        count += chunk.count("\n")
+    return count
+
+
+async def timed(label, coro):
+    start = time.perf_counter()
+    count = await coro
+    print(f"  {label:<34} {count:>7} rows {1000 * (time.perf_counter() - start):9.1f} ms")
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bulk.sqlite3")
+        os.environ.update(DB_BACKEND="sqlite", DB_SQLITE_PATH=path)
+        seed(path)
+        from utils.db import db
+        from utils.bulk import KeysetQuery
+        from utils.migrations import migrate
+        query = KeysetQuery("wallets", ("id", "user_id", "currency", "balance"))
+        user_ids = random.Random(2).sample(range(1, USERS + 1), SAMPLE)
+        await db.connect()
+
+        print(f"{SAMPLE} users, no indexes")
+        await timed("one query per user (first 200)", per_user(db, user_ids[:200]))
+        await timed("bulk pages of 1000", paged(query, user_ids))
+
+        await migrate()
+        print(f"{SAMPLE} users, after migrations")
+        await timed("one query per user", per_user(db, user_ids))
+        await timed("bulk pages of 1000", paged(query, user_ids))
+        await timed("NDJSON export", exported(query, user_ids))
+
+        for sample in (1000, 5000):
+            tracemalloc.start()
+            await exported(query, list(range(1, sample + 1)))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  export peak memory for {sample * WALLETS_PER_USER} rows: {peak / 1024:.0f} KiB")
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""
+Cost of serving /market to polling clients, before and after the cached response layer.
+
+    python -m benchmarks.bench_market_response
+
+Builds a snapshot of 600 pairs and compares, per request, FastAPI's default path
+(jsonable_encoder + json.dumps on every call) with utils.http_cache: a build per
+snapshot version, reuse of the encoded bytes, gzip, and 304 for unchanged ETags.
+Reports CPU time per request and bytes on the wire.
+"""
+import json
+import time
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from utils.http_cache import CachedResponse
+
+PAIRS = 600
+REQUESTS = 2000
+
+
+def request(headers=None) -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/market", "headers": raw})
+
+
+def timed(label, call):
+    call()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        size = call()
+    elapsed = (time.perf_counter() - start) / REQUESTS
+    print(f"  {label:<40} {1e6 * elapsed:9.1f} us/request {size:>8} bytes")
+
+
+def main():
+    data = [{"crypto": f"PAIR{i}USD", "last_price": f"{1000 + i * 1.37:.5f}", "bid": f"{999 + i:.5f}",
+             "ask": f"{1001 + i:.5f}"} for i in range(PAIRS)]
+    cached = CachedResponse("/market", max_age=5)
+    plain, gzipped = request(), request({"Accept-Encoding": "gzip, deflate, br"})
+    etag = cached.respond(plain, 1, lambda: data).headers["etag"]
+    conditional = request({"If-None-Match": etag, "Accept-Encoding": "gzip"})
+
+    print(f"{PAIRS} pairs, {REQUESTS} requests")
+    timed("default serialization", lambda: len(json.dumps(jsonable_encoder(data)).encode("utf-8")))
+    timed("cached, identity", lambda: len(cached.respond(plain, 1, lambda: data).body))
+    timed("cached, compressed", lambda: len(cached.respond(gzipped, 1, lambda: data).body))
+    timed("cached, 304 Not Modified", lambda: len(cached.respond(conditional, 1, lambda: data).body))
+    version = iter(range(2, 10 ** 9))
+    timed("rebuild every request (worst case)", lambda: len(cached.respond(gzipped, next(version), lambda: data).body))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Per-request cost of the rate limiter.
+
+    python -m benchmarks.bench_rate_limit
+
+Drives a bare ASGI app directly (no HTTP server) with and without
+RateLimitMiddleware in front of it, spreading requests over many client IPs and
+route classes, and reports the added microseconds per request.
+"""
+import time
+import asyncio
+from utils.rate_limit import RateLimitMiddleware, LocalBucketStore, rate_limit_policies
+
+REQUESTS = 200000
+CLIENTS = 10000
+PATHS = [("GET", "/market"), ("GET", "/market/trends"), ("POST", "/trade/"), ("POST", "/api/chatbot"), ("GET", "/db/stats")]
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+def scopes():
+    return [
+        {
+            "type": "http",
+            "method": PATHS[i % len(PATHS)][0],
+            "path": PATHS[i % len(PATHS)][1],
+            "headers": [(b"host", b"localhost")],
+            "client": (f"10.0.{(i % CLIENTS) // 256}.{i % 256}", 50000),
+        }
+        for i in range(REQUESTS)
+    ]
+
+
+async def timed(handler, requests):
+    start = time.perf_counter()
+    for scope in requests:
+        await handler(dict(scope), receive, send)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+async def main():
+    requests = scopes()
+    store = LocalBucketStore()
+    limited = RateLimitMiddleware(app, rate_limit_policies, store)
+
+    await timed(limited, requests[:10000])  # warm up
+    bare_us = await timed(app, requests)
+    limited_us = await timed(limited, requests)
+
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        await store.take(f"market:ip:{i % CLIENTS}", 60, 10)
+    take_us = (time.perf_counter() - start) / REQUESTS * 1e6
+
+    print(f"{REQUESTS} requests over {CLIENTS} clients, {len(store.buckets)} buckets")
+    print(f"bare app:       {bare_us:6.2f} us/request")
+    print(f"with limiter:   {limited_us:6.2f} us/request (+{limited_us - bare_us:.2f} us)")
+    print(f"store.take:     {take_us:6.2f} us/call")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
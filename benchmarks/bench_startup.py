@@ -0,0 +1,139 @@
+"""
+Import time of main and time for a fresh worker to become live and ready.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --max-import-ms 1200 --max-ready-ms 3000
+
+Imports main in fresh interpreters (median of --runs) and lists the slowest
+top-level imports, then boots `uvicorn main:app` against a seeded SQLite database
+with every external service unreachable and times /health/live and /health/ready.
+Exits 1 when a --max-* budget is exceeded, so it can run as a regression gate.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+import httpx
+from benchmarks.loadtest import free_port, seed_database
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def base_env(workdir: str) -> dict:
+    env = {**os.environ}
+    env.pop("FIREBASE_CREDENTIALS", None)
+    unreachable = f"http://127.0.0.1:{free_port()}"
+    env.update({
+        "DB_BACKEND": "sqlite",
+        "DB_SQLITE_PATH": os.path.join(workdir, "startup.sqlite3"),
+        "KRAKEN_API_URL": f"{unreachable}/0",
+        "WEB3_PROVIDER_URL": unreachable,
+        "OPENAI_BASE_URL": f"{unreachable}/v1",
+        "OPENAI_API_KEY": "fake",
+        "ORDER_JOURNAL_PATH": os.path.join(workdir, "orders.journal"),
+        "STRIPE_EVENTS_JOURNAL": os.path.join(workdir, "stripe_events.journal"),
+        "CANDLE_STORE_DIR": os.path.join(workdir, "candles"),
+        "ANALYTICS_PERSIST": "false",
+        "MARKET_FEED": "rest",
+    })
+    return env
+
+
+def import_times(env: dict, runs: int):
+    return [
+        float(subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, check=True,
+                             capture_output=True, text=True).stdout.strip().splitlines()[-1])
+        for _ in range(runs)
+    ]
+
+
+def slowest_imports(env: dict, top: int):
+    """
+    Top-level packages imported by main, by cumulative microseconds (python -X importtime).
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=env,
+                            check=True, capture_output=True, text=True).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Direct children of "import main" are indented by exactly three spaces
+        if name.startswith("   ") and not name.startswith("    "):
+            totals[name.strip()] = int(cumulative)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+async def boot(env: dict, workdir: str, timeout: float):
+    port = free_port()
+    log = open(os.path.join(workdir, "app.log"), "w")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    live = ready = None
+    report = None
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - start < timeout and ready is None:
+                try:
+                    if live is None:
+                        if (await client.get("/health/live")).status_code == 200:
+                            live = time.perf_counter() - start
+                    response = await client.get("/health/ready")
+                    report = response.json()
+                    if response.status_code == 200:
+                        ready = time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return live, ready, report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="fintt-startup-") as workdir:
+        env = base_env(workdir)
+        seed_database(env["DB_SQLITE_PATH"], [])
+
+        imports = import_times(env, args.runs)
+        import_ms = statistics.median(imports) * 1000
+        print(f"import main: median {import_ms:.0f} ms, min {min(imports) * 1000:.0f} ms over {args.runs} runs")
+        for name, micros in slowest_imports(env, args.top):
+            print(f"  {name:<32} {micros / 1000:8.1f} ms")
+
+        live, ready, report = await boot(env, workdir, args.timeout)
+        print(f"uvicorn main:app live after {live * 1000:.0f} ms" if live is not None else "never became live")
+        print(f"uvicorn main:app ready after {ready * 1000:.0f} ms" if ready is not None else "never became ready")
+        if report:
+            print(json.dumps(report["dependencies"], indent=2))
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import {import_ms:.0f} ms > {args.max_import_ms:.0f} ms")
+    if args.max_ready_ms is not None and (ready is None or ready * 1000 > args.max_ready_ms):
+        failures.append(f"ready {'never' if ready is None else f'{ready * 1000:.0f} ms'} > {args.max_ready_ms:.0f} ms")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+Concurrent transaction submission against a local dev chain.
+
+    anvil &
+    python -m benchmarks.bench_web3_tx
+
+Fires N concurrent self-transfers from one signer through the TransactionManager,
+waits for every receipt, and checks that nonces are contiguous with no failures.
+Uses anvil's first pre-funded account unless BENCH_PRIVATE_KEY is set.
+"""
+import os
+import time
+import asyncio
+from eth_account import Account
+from utils.web3_tx import TransactionManager, WEB3_PROVIDER_URL
+
+TRANSACTIONS = int(os.getenv("BENCH_TRANSACTIONS", 200))
+PRIVATE_KEY = os.getenv(
+    "BENCH_PRIVATE_KEY", "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+)
+
+
+async def run():
+    manager = TransactionManager(WEB3_PROVIDER_URL)
+    account = Account.from_key(PRIVATE_KEY)
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(manager.send(account, account.address, value=1) for _ in range(TRANSACTIONS)),
+            return_exceptions=True,
+        )
+        submit_seconds = time.perf_counter() - start
+        tx_hashes = [result for result in results if isinstance(result, str)]
+        errors = [result for result in results if not isinstance(result, str)]
+
+        receipts = await manager.wait_for_receipts(tx_hashes, timeout=120, poll=0.2)
+        total_seconds = time.perf_counter() - start
+        nonces = sorted([
+            int(tx["nonce"], 16)
+            for tx in await manager.batch([("eth_getTransactionByHash", [tx_hash]) for tx_hash in tx_hashes])
+        ])
+        contiguous = nonces == list(range(nonces[0], nonces[0] + len(nonces))) if nonces else True
+
+        print(f"{TRANSACTIONS} transactions, {len(errors)} errors")
+        print(f"submitted in {submit_seconds:.2f}s ({len(tx_hashes) / submit_seconds:.0f} tx/s), all mined after {total_seconds:.2f}s")
+        print(f"receipts: {len(receipts)}, nonces contiguous: {contiguous}")
+        print(f"JSON-RPC: {manager.rpc_calls} calls in {manager.rpc_requests} HTTP requests")
+        for error in errors[:5]:
+            print(f"  error: {error}")
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
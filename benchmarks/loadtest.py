@@ -0,0 +1,362 @@
+"""
+End-to-end load test of main:app against local fakes of every external service.
+
+    python -m benchmarks.loadtest --duration 20 --concurrency 32
+    python -m benchmarks.loadtest --compare benchmarks/results/baseline.json
+    python -m benchmarks.loadtest --mix chat --latency-ms 50 --error-rate 0.02
+    python -m benchmarks.loadtest --workers 4
+
+Boots fakes for Kraken, OpenAI, Firebase certs, Stripe and a JSON-RPC node, seeds a
+SQLite database with users, wallets and subscriptions, starts the app with uvicorn
+and drives a weighted traffic mix over closed-loop connections. Reports requests/s,
+error rate and latency percentiles per scenario and writes them as JSON.
+
+With --compare, exits 1 when any scenario's p99 or throughput regresses beyond
+--tolerance against the given results file.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import sqlite3
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import httpx
+from fakes import firebase as fake_firebase
+
+PROJECT_ID = "loadtest-project"
+USERS = 500
+PAIRS = ["XXBTZUSD", "XETHZUSD", "SOLUSD", "ADAUSD", "DOTUSD"]
+ASSETS = ["USD", "BTC", "ETH", "SOL", "ADA", "DOT"]
+QUESTIONS = [
+    "¿Cómo empiezo a invertir con poco dinero?",
+    "¿Qué es un fondo indexado?",
+    "¿Conviene diversificar entre acciones y bonos?",
+    "¿Cómo armo un fondo de emergencia?",
+    "¿Qué porcentaje de mi sueldo debería ahorrar?",
+    "¿Qué riesgo tiene invertir en criptomonedas?",
+    "¿Cómo funciona el interés compuesto?",
+    "¿Qué es el dollar cost averaging?",
+]
+
+# Scenario weights per traffic mix
+MIXES = {
+    "default": {"login": 1, "market": 4, "trends": 1, "portfolio": 2, "wallets": 1, "trade": 1, "chat": 1},
+    "read": {"market": 6, "trends": 2, "portfolio": 3, "wallets": 1},
+    "trade": {"login": 1, "market": 2, "trade": 4, "portfolio": 1},
+    "chat": {"login": 1, "chat": 6, "market": 1},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(path: str, uids):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, firebase_uid TEXT UNIQUE, name TEXT, email TEXT, country TEXT);
+        CREATE TABLE wallets (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, currency TEXT, balance REAL);
+        CREATE TABLE subscriptions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, plan TEXT, price REAL,
+                                    is_active INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    """)
+    rng = random.Random(7)
+    for user_id, uid in enumerate(uids, start=1):
+        conn.execute("INSERT INTO users VALUES (?, ?, ?, ?, ?)", (user_id, uid, f"User {user_id}", f"{uid}@example.com", "AR"))
+        for asset in rng.sample(ASSETS, 3):
+            conn.execute("INSERT INTO wallets (user_id, currency, balance) VALUES (?, ?, ?)",
+                         (user_id, asset, round(rng.uniform(0.01, 5000), 4)))
+        conn.execute("INSERT INTO subscriptions (user_id, plan, price, is_active) VALUES (?, 'premium', 70, 1)", (uid,))
+    conn.commit()
+    conn.close()
+
+
+class Stack:
+    """
+    The fakes plus the app, each in its own uvicorn process.
+    """
+
+    def __init__(self, workdir: str, args):
+        self.workdir = workdir
+        self.args = args
+        self.processes = []
+        self.ports = {}
+
+    def _spawn(self, name: str, target: str, env: dict, workers: int = 1):
+        port = free_port()
+        self.ports[name] = port
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log", "--workers", str(workers)],
+            env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT,
+        )
+        self.processes.append(process)
+        return port
+
+    async def _wait(self, url: str, timeout: float = 30, ok_only: bool = False):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                try:
+                    response = await client.get(url, timeout=1)
+                    if not ok_only or response.status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"{url} did not come up; see logs in {self.workdir}")
+
+    async def start(self, uids):
+        args = self.args
+        latency, errors = str(args.latency_ms), str(args.error_rate)
+        key, cert = fake_firebase.make_key_and_cert()
+        cert_path = os.path.join(self.workdir, "firebase_cert.pem")
+        with open(cert_path, "w") as f:
+            f.write(cert)
+        kraken_secret = "ZmFrZS1rcmFrZW4tc2VjcmV0LWZvci1sb2FkLXRlc3Rz"
+
+        fakes = {
+            "kraken": ("fakes.kraken:app", {"FAKE_KRAKEN_LATENCY_MS": latency, "FAKE_KRAKEN_ERROR_RATE": errors,
+                                             "FAKE_KRAKEN_API_SECRET": kraken_secret}),
+            "openai": ("fakes.openai:app", {"FAKE_OPENAI_TTFT_MS": str(args.llm_ttft_ms),
+                                             "FAKE_OPENAI_TOKENS_PER_SECOND": "200", "FAKE_OPENAI_ERROR_RATE": errors}),
+            "firebase": ("fakes.firebase:app", {"FAKE_FIREBASE_CERT_PATH": cert_path, "FAKE_FIREBASE_LATENCY_MS": latency}),
+            "stripe": ("fakes.stripe:app", {"FAKE_STRIPE_LATENCY_MS": latency, "FAKE_STRIPE_ERROR_RATE": errors}),
+            "web3": ("fakes.web3:app", {"FAKE_WEB3_LATENCY_MS": latency, "FAKE_WEB3_ERROR_RATE": errors}),
+        }
+        for name, (target, env) in fakes.items():
+            self._spawn(name, target, env)
+        await asyncio.gather(*(self._wait(f"http://127.0.0.1:{port}/docs") for port in self.ports.values()))
+
+        db_path = os.path.join(self.workdir, "loadtest.sqlite3")
+        seed_database(db_path, uids)
+        metrics_dir = os.path.join(self.workdir, "metrics")
+        os.makedirs(metrics_dir)
+        multi_worker = {
+            "WEB_CONCURRENCY": str(args.workers),
+            "INVALIDATION_BUS_PATH": os.path.join(self.workdir, "bus.sock"),
+            "PROMETHEUS_MULTIPROC_DIR": metrics_dir,
+        } if args.workers > 1 else {}
+        port = self._spawn("app", "main:app", {
+            **multi_worker,
+            "FIREBASE_CREDENTIALS": json.dumps(fake_firebase.service_account(key, PROJECT_ID)),
+            "FIREBASE_PROJECT_ID": PROJECT_ID,
+            "FIREBASE_CERTS_URL": f"http://127.0.0.1:{self.ports['firebase']}/certs",
+            "AUTH_REVOCATION_SAMPLE_RATE": "0",
+            "KRAKEN_API_URL": f"http://127.0.0.1:{self.ports['kraken']}/0",
+            "KRAKEN_API_KEY": "fake-kraken-key",
+            "KRAKEN_API_SECRET": kraken_secret,
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{self.ports['openai']}/v1",
+            "OPENAI_API_KEY": "fake",
+            "STRIPE_API_BASE": f"http://127.0.0.1:{self.ports['stripe']}",
+            "STRIPE_SECRET_KEY": "sk_test_fake",
+            "WEB3_PROVIDER_URL": f"http://127.0.0.1:{self.ports['web3']}",
+            "DB_BACKEND": "sqlite",
+            "DB_SQLITE_PATH": db_path,
+            "ORDER_JOURNAL_PATH": os.path.join(self.workdir, "orders.journal"),
+            "STRIPE_EVENTS_JOURNAL": os.path.join(self.workdir, "stripe_events.journal"),
+            "CANDLE_STORE_DIR": os.path.join(self.workdir, "candles"),
+            "ANALYTICS_PERSIST": "false",
+            "MARKET_FEED": "rest",
+            # Indexes come from migrations/, applied by the leader worker
+            "MIGRATE_ON_STARTUP": "true",
+            "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+        }, workers=args.workers)
+        await self._wait(f"http://127.0.0.1:{port}/health/ready", ok_only=True)
+        return key
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def scenarios(tokens, rng):
+    """
+    name -> function returning (method, path, kwargs) for one request.
+    """
+    def auth(i):
+        return {"Authorization": f"Bearer {tokens[i]}"}
+
+    def user():
+        return rng.randrange(len(tokens))
+
+    def login():
+        return "POST", "/login", {"headers": auth(user())}
+
+    def market():
+        return "GET", "/market", {}
+
+    def trends():
+        return "GET", "/market/trends", {"headers": auth(user())}
+
+    def portfolio():
+        return "GET", f"/wallets/{user() + 1}/portfolio", {}
+
+    def wallets():
+        return "GET", f"/wallets/{user() + 1}", {}
+
+    def trade():
+        i = user()
+        return "POST", "/trade/", {
+            "headers": {**auth(i), "Idempotency-Key": f"{i}-{rng.getrandbits(64):x}"},
+            "json": {"crypto_pair": rng.choice(PAIRS), "amount": round(rng.uniform(0.001, 0.1), 4),
+                     "action": rng.choice(["buy", "sell"])},
+        }
+
+    def chat():
+        return "POST", "/api/chatbot", {"headers": auth(user()), "json": {"message": rng.choice(QUESTIONS)}}
+
+    return {"login": login, "market": market, "trends": trends, "portfolio": portfolio,
+            "wallets": wallets, "trade": trade, "chat": chat}
+
+
+async def drive(base_url: str, tokens, mix: dict, concurrency: int, duration: float, warmup: float, seed: int):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    statuses = {name: {} for name in names}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        record_from = start + warmup
+        deadline = record_from + duration
+
+        async def worker(index: int):
+            rng = random.Random(seed + index)
+            build = scenarios(tokens, rng)
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    return
+                name = rng.choices(names, weights)[0]
+                method, path, kwargs = build[name]()
+                began = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                elapsed = time.perf_counter() - began
+                if began >= record_from:
+                    samples[name].append(elapsed)
+                    statuses[name][status] = statuses[name].get(status, 0) + 1
+                    if status == 0 or status >= 400:
+                        errors[name] += 1
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+
+    def summary(latencies, error_count, status_counts=None):
+        values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        result = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / duration, 1),
+            "error_rate": round(error_count / len(latencies), 4) if latencies else 0,
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p90_ms": round(float(np.percentile(values, 90)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "max_ms": round(float(values.max()), 2),
+        }
+        if status_counts is not None:
+            result["statuses"] = {str(code): count for code, count in sorted(status_counts.items())}
+        return result
+
+    routes = {name: summary(samples[name], errors[name], statuses[name]) for name in names}
+    total = summary([x for name in names for x in samples[name]], sum(errors.values()))
+    return routes, total
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for name, current in results["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous or not previous["requests"]:
+            continue
+        if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']} -> {current['p99_ms']} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {previous['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"{'scenario':<10} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    rows = list(results["routes"].items()) + [("TOTAL", results["total"])]
+    for name, row in rows:
+        print(f"{name:<10} {row['requests']:>7} {row['rps']:>8.1f} {row['error_rate'] * 100:>6.2f} "
+              f"{row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--latency-ms", type=float, default=20, help="added latency in every fake")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of fake upstream calls that fail")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the rate limiter on")
+    parser.add_argument("--workers", type=int, default=1, help="app worker processes (multi-worker mode when > 1)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to check against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    uids = [f"loadtest-user-{i:05d}" for i in range(args.users)]
+    with tempfile.TemporaryDirectory(prefix="fintt-loadtest-") as workdir:
+        stack = Stack(workdir, args)
+        try:
+            key = await stack.start(uids)
+            tokens = [fake_firebase.make_token(key, uid, PROJECT_ID) for uid in uids]
+            base_url = f"http://127.0.0.1:{stack.ports['app']}"
+            routes, total = await drive(base_url, tokens, MIXES[args.mix], args.concurrency,
+                                        args.duration, args.warmup, args.seed)
+        finally:
+            stack.stop()
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "routes": routes,
+        "total": total,
+    }
+    print_report(results)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
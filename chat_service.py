@@ -1,5 +1,11 @@
+import os
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from utils.intents import intent_router
+from utils.llm import cached_advice
+
+# Si está activo, los mensajes sin intención conocida se responden con el asesor IA
+CHAT_LLM_FALLBACK = os.getenv("CHAT_LLM_FALLBACK", "false").lower() == "true"
 
 router = APIRouter()
 
@@ -8,12 +14,12 @@ class ChatMessage(BaseModel):
 
 @router.post("/chat")
 async def fintto_chat(message: ChatMessage):
-    user_message = message.message.lower()
-
-    # Respuesta simulada - Aquí puedes integrar IA más adelante
-    if "bolsa de valores" in user_message:
-        return {"response": "Para invertir en la bolsa de valores, necesitas abrir una cuenta con un broker autorizado."}
-    elif "criptomonedas" in user_message:
-        return {"response": "Las criptomonedas son activos digitales que puedes comprar mediante plataformas como Binance o Coinbase."}
-    else:
-        return {"response": "Esto es una respuesta generada por el asistente Fintto."}
+    intent = intent_router.classify(message.message)
+    if intent:
+        return {"response": intent.response}
+    if CHAT_LLM_FALLBACK:
+        try:
+            return {"response": await cached_advice(message.message)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en el asistente Fintto: {str(e)}")
+    return {"response": "Esto es una respuesta generada por el asistente Fintto."}
@@ -0,0 +1,84 @@
+"""
+Local stand-in for Firebase ID-token signing.
+
+Run with `uvicorn fakes.firebase:app --port 9003` and point the backend at it with
+FIREBASE_CERTS_URL=http://127.0.0.1:9003/certs FIREBASE_PROJECT_ID=<project>.
+
+The certificate served is read from FAKE_FIREBASE_CERT_PATH; tokens are minted
+offline with make_token() and the matching private key, as the Firebase client
+SDK would. service_account() builds credentials that firebase_admin accepts.
+"""
+import os
+import time
+import asyncio
+import datetime
+import jwt
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+FAKE_FIREBASE_CERT_PATH = os.getenv("FAKE_FIREBASE_CERT_PATH", "fake_firebase_cert.pem")
+FAKE_FIREBASE_KID = os.getenv("FAKE_FIREBASE_KID", "fake")
+FAKE_LATENCY_MS = float(os.getenv("FAKE_FIREBASE_LATENCY_MS", 0))
+
+app = FastAPI()
+
+
+def make_key_and_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "fake-firebase")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+
+
+def private_key_pem(key) -> str:
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode("utf-8")
+
+
+def make_token(key, uid: str, project_id: str, kid: str = FAKE_FIREBASE_KID, ttl: int = 3600) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "aud": project_id,
+        "sub": uid,
+        "iat": now,
+        "exp": now + ttl,
+        "auth_time": now,
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+def service_account(key, project_id: str) -> dict:
+    return {
+        "type": "service_account",
+        "project_id": project_id,
+        "private_key_id": FAKE_FIREBASE_KID,
+        "private_key": private_key_pem(key),
+        "client_email": f"firebase-adminsdk@{project_id}.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": "http://127.0.0.1/token",
+    }
+
+
+@app.get("/certs")
+async def certs():
+    if FAKE_LATENCY_MS:
+        await asyncio.sleep(FAKE_LATENCY_MS / 1000)
+    with open(FAKE_FIREBASE_CERT_PATH, encoding="utf-8") as f:
+        cert = f.read()
+    return JSONResponse({FAKE_FIREBASE_KID: cert}, headers={"Cache-Control": "public, max-age=3600"})
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the Kraken REST API.
+
+Run with `uvicorn fakes.kraken:app --port 9001` and point the backend at it with
+KRAKEN_API_URL=http://127.0.0.1:9001/0
+"""
+import os
+import time
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from utils.kraken_client import sign_request
+
+FAKE_LATENCY_MS = float(os.getenv("FAKE_KRAKEN_LATENCY_MS", 0))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_KRAKEN_ERROR_RATE", 0))
+FAKE_API_SECRET = os.getenv("FAKE_KRAKEN_API_SECRET", os.getenv("KRAKEN_API_SECRET", ""))
+
+PAIRS = {
+    "XXBTZUSD": 65000.0,
+    "XETHZUSD": 3200.0,
+    "SOLUSD": 150.0,
+    "ADAUSD": 0.45,
+    "DOTUSD": 6.5,
+}
+
+app = FastAPI()
+orders = []
+
+
+async def _simulate():
+    if FAKE_LATENCY_MS:
+        await asyncio.sleep(FAKE_LATENCY_MS / 1000)
+    if FAKE_ERROR_RATE and random.random() < FAKE_ERROR_RATE:
+        return {"error": ["EService:Unavailable"]}
+    return None
+
+
+def _ticker(price):
+    spread = price * 0.0005
+    return {
+        "a": [f"{price + spread:.5f}", "1", "1.000"],
+        "b": [f"{price - spread:.5f}", "1", "1.000"],
+        "c": [f"{price:.5f}", "0.01"],
+        "v": ["100.0", "2000.0"],
+        "o": f"{price:.5f}",
+    }
+
+
+@app.get("/0/public/Time")
+async def server_time():
+    now = int(time.time())
+    return {"error": [], "result": {"unixtime": now, "rfc1123": time.strftime("%a, %d %b %y %H:%M:%S +0000", time.gmtime(now))}}
+
+
+@app.get("/0/public/AssetPairs")
+async def asset_pairs():
+    error = await _simulate()
+    if error:
+        return error
+    return {"error": [], "result": {pair: {"altname": pair} for pair in PAIRS}}
+
+
+@app.get("/0/public/Ticker")
+async def ticker(pair: str = ""):
+    error = await _simulate()
+    if error:
+        return error
+    # Random walk so consumers see prices move
+    for name in PAIRS:
+        PAIRS[name] *= 1 + random.uniform(-0.001, 0.001)
+    requested = pair.split(",") if pair else list(PAIRS)
+    return {"error": [], "result": {name: _ticker(PAIRS[name]) for name in requested if name in PAIRS}}
+
+
+@app.post("/0/private/{endpoint}")
+async def private(endpoint: str, request: Request):
+    error = await _simulate()
+    if error:
+        return error
+    form = dict(await request.form())
+    if FAKE_API_SECRET:
+        expected = sign_request(f"/0/private/{endpoint}", form, FAKE_API_SECRET)
+        if request.headers.get("API-Sign") != expected:
+            return {"error": ["EAPI:Invalid signature"]}
+
+    if endpoint == "AddOrder":
+        txid = f"FAKE-{len(orders) + 1:06d}"
+        orders.append({"txid": txid, **form})
+        return {"error": [], "result": {
+            "descr": {"order": f"{form.get('type')} {form.get('volume')} {form.get('pair')} @ market"},
+            "txid": [txid],
+        }}
+    if endpoint in ("OpenOrders", "ClosedOrders"):
+        # Market orders fill at once, so every order placed here is closed
+        key = "open" if endpoint == "OpenOrders" else "closed"
+        matches = {} if key == "open" else {
+            order["txid"]: {"status": "closed", "cl_ord_id": order.get("cl_ord_id"), "vol_exec": order.get("volume"),
+                            "descr": {"pair": order.get("pair"), "type": order.get("type"), "ordertype": "market"}}
+            for order in orders if not form.get("cl_ord_id") or order.get("cl_ord_id") == form["cl_ord_id"]
+        }
+        return {"error": [], "result": {key: matches}}
+    if endpoint == "Balance":
+        return {"error": [], "result": {"ZUSD": "10000.0000", "XXBT": "0.5000000000"}}
+    return {"error": ["EGeneral:Unknown method"]}
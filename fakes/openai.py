@@ -0,0 +1,66 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Run with `uvicorn fakes.openai:app --port 9002` and point the backend at it with
+OPENAI_BASE_URL=http://127.0.0.1:9002/v1 OPENAI_API_KEY=fake
+"""
+import os
+import json
+import time
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_TTFT_MS = float(os.getenv("FAKE_OPENAI_TTFT_MS", 300))
+FAKE_TOKENS_PER_SECOND = float(os.getenv("FAKE_OPENAI_TOKENS_PER_SECOND", 50))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", 0))
+
+ANSWER = (
+    "Para empezar a invertir, define tus objetivos, crea un fondo de emergencia y "
+    "diversifica entre distintos activos según tu perfil de riesgo."
+)
+
+app = FastAPI()
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake-model")
+    completion_id = f"chatcmpl-fake-{random.randint(0, 10**9)}"
+    if FAKE_ERROR_RATE and random.random() < FAKE_ERROR_RATE:
+        return JSONResponse(status_code=503, content={"error": {"message": "Fake upstream error", "type": "server_error"}})
+
+    tokens = [word + " " for word in ANSWER.split()]
+    if not body.get("stream"):
+        await asyncio.sleep((FAKE_TTFT_MS + 1000 * len(tokens) / FAKE_TOKENS_PER_SECOND) / 1000)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": len(tokens), "total_tokens": 10 + len(tokens)},
+        }
+
+    async def events():
+        await asyncio.sleep(FAKE_TTFT_MS / 1000)
+        yield f"data: {json.dumps(_chunk(completion_id, model, {'role': 'assistant', 'content': ''}))}\n\n"
+        for token in tokens:
+            yield f"data: {json.dumps(_chunk(completion_id, model, {'content': token}))}\n\n"
+            await asyncio.sleep(1 / FAKE_TOKENS_PER_SECOND)
+        yield f"data: {json.dumps(_chunk(completion_id, model, {}, 'stop'))}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
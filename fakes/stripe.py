@@ -0,0 +1,138 @@
+"""
+Local stand-in for Stripe: the checkout API and webhook delivery.
+
+Run the API with `uvicorn fakes.stripe:app --port 9004` and point the backend at it
+with STRIPE_API_BASE=http://127.0.0.1:9004. Send webhooks with
+
+    python -m fakes.stripe --url http://127.0.0.1:8000/stripe/webhook --user-id <uid>
+
+Signs a checkout -> subscription lifecycle with STRIPE_WEBHOOK_SECRET the same way
+Stripe does (t=<timestamp>,v1=HMAC-SHA256("<t>.<payload>")) and posts it, including
+a redelivery and an out-of-order event. The Stripe CLI works too:
+`stripe listen --forward-to localhost:8000/stripe/webhook` then `stripe trigger ...`.
+"""
+import os
+import hmac
+import json
+import time
+import uuid
+import hashlib
+import random
+import asyncio
+import argparse
+from urllib.parse import parse_qsl
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAKE_LATENCY_MS = float(os.getenv("FAKE_STRIPE_LATENCY_MS", 0))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_STRIPE_ERROR_RATE", 0))
+
+app = FastAPI()
+
+
+async def _form(request: Request) -> dict:
+    # The SDK posts urlencoded bodies; parsed here so python-multipart is not needed
+    return dict(parse_qsl((await request.body()).decode("utf-8")))
+
+
+@app.post("/v1/checkout/sessions")
+async def create_checkout_session(request: Request):
+    if FAKE_LATENCY_MS:
+        await asyncio.sleep(FAKE_LATENCY_MS / 1000)
+    if FAKE_ERROR_RATE and random.random() < FAKE_ERROR_RATE:
+        return JSONResponse(status_code=500, content={"error": {"type": "api_error", "message": "Fake upstream error"}})
+    form = await _form(request)
+    session_id = f"cs_fake_{uuid.uuid4().hex[:24]}"
+    return {
+        "id": session_id,
+        "object": "checkout.session",
+        "mode": form.get("mode", "subscription"),
+        "client_reference_id": form.get("client_reference_id"),
+        "url": f"http://127.0.0.1/checkout/{session_id}",
+    }
+
+
+@app.get("/v1/subscriptions/{subscription_id}")
+async def retrieve_subscription(subscription_id: str):
+    return {"id": subscription_id, "object": "subscription", "status": "active",
+            "items": {"object": "list", "data": [{"id": f"si_fake_{subscription_id[-14:]}", "object": "subscription_item"}]}}
+
+
+@app.post("/v1/subscriptions/{subscription_id}")
+async def modify_subscription(subscription_id: str, request: Request):
+    # Like pending_if_incomplete: the change is reported by a webhook once the invoice is paid
+    form = await _form(request)
+    return {"id": subscription_id, "object": "subscription", "status": "active",
+            "pending_update": {"subscription_items": [{"price": form.get("items[0][price]")}]}}
+
+
+def sign(payload: str, secret: str, timestamp: int = None) -> str:
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode("utf-8"), f"{timestamp}.{payload}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def event(event_type: str, obj: dict, created: int) -> dict:
+    return {
+        "id": f"evt_fake_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": event_type,
+        "created": created,
+        "data": {"object": obj},
+    }
+
+
+def lifecycle(user_id: str, plan: str = "premium"):
+    now = int(time.time())
+    customer = f"cus_fake_{uuid.uuid4().hex[:14]}"
+    subscription_id = f"sub_fake_{uuid.uuid4().hex[:14]}"
+    subscription = {
+        "id": subscription_id,
+        "object": "subscription",
+        "customer": customer,
+        "status": "active",
+        "metadata": {"user_id": user_id},
+        "items": {"data": [{"price": {"id": f"price_fake_{plan}", "lookup_key": plan}}]},
+        "current_period_end": now + 30 * 86400,
+        "cancel_at_period_end": False,
+    }
+    created = event("customer.subscription.created", subscription, now)
+    checkout = event("checkout.session.completed", {
+        "id": f"cs_fake_{uuid.uuid4().hex[:14]}",
+        "object": "checkout.session",
+        "mode": "subscription",
+        "payment_status": "paid",
+        "client_reference_id": user_id,
+        "customer": customer,
+        "subscription": subscription_id,
+    }, now + 1)
+    failed = event("invoice.payment_failed", {"object": "invoice", "customer": customer,
+                                              "subscription": subscription_id}, now + 2)
+    paid = event("invoice.paid", {"object": "invoice", "customer": customer, "subscription": subscription_id}, now + 3)
+    # Delivery order: redelivery of `created`, and `failed` arriving after the newer `paid`
+    return [created, checkout, created, paid, failed]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000/stripe/webhook")
+    parser.add_argument("--user-id", default="fake-user")
+    parser.add_argument("--plan", default="premium")
+    parser.add_argument("--secret", default=os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_fake"))
+    args = parser.parse_args()
+
+    with httpx.Client(timeout=10) as client:
+        for item in lifecycle(args.user_id, args.plan):
+            payload = json.dumps(item)
+            start = time.perf_counter()
+            response = client.post(args.url, content=payload, headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": sign(payload, args.secret),
+            })
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"{item['type']:<32} {response.status_code} {elapsed_ms:6.1f} ms {response.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Local stand-in for an Ethereum JSON-RPC node (Infura).
+
+Run with `uvicorn fakes.web3:app --port 9005` and point the backend at it with
+WEB3_PROVIDER_URL=http://127.0.0.1:9005
+
+Answers the calls the transaction manager and loan indexer make, including
+batches. Every sendRawTransaction is "mined" into its own block immediately.
+For real EVM semantics use anvil instead.
+"""
+import os
+import random
+import asyncio
+import hashlib
+from fastapi import FastAPI, Request
+
+FAKE_LATENCY_MS = float(os.getenv("FAKE_WEB3_LATENCY_MS", 0))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_WEB3_ERROR_RATE", 0))
+CHAIN_ID = int(os.getenv("FAKE_WEB3_CHAIN_ID", 31337))
+BASE_FEE = 10**9
+
+app = FastAPI()
+chain = {"head": 100, "nonces": {}, "receipts": {}}
+
+
+def _block_hash(number: int) -> str:
+    return "0x" + hashlib.sha256(f"block-{number}".encode()).hexdigest()
+
+
+def _call(method: str, params: list):
+    if method == "eth_chainId":
+        return hex(CHAIN_ID)
+    if method == "eth_blockNumber":
+        return hex(chain["head"])
+    if method == "eth_estimateGas":
+        return hex(21000 if (params[0].get("data") or "0x") == "0x" else 120000)
+    if method == "eth_feeHistory":
+        blocks = int(params[0], 16)
+        return {
+            "oldestBlock": hex(chain["head"] - blocks + 1),
+            "baseFeePerGas": [hex(BASE_FEE)] * (blocks + 1),
+            "reward": [[hex(2 * 10**9)] for _ in range(blocks)],
+            "gasUsedRatio": [0.5] * blocks,
+        }
+    if method == "eth_getTransactionCount":
+        return hex(chain["nonces"].get(params[0].lower(), 0))
+    if method == "eth_sendRawTransaction":
+        tx_hash = "0x" + hashlib.sha256(params[0].encode()).hexdigest()
+        chain["head"] += 1
+        chain["receipts"][tx_hash] = {
+            "transactionHash": tx_hash,
+            "status": "0x1",
+            "blockNumber": hex(chain["head"]),
+            "blockHash": _block_hash(chain["head"]),
+            "gasUsed": hex(21000),
+        }
+        return tx_hash
+    if method == "eth_getTransactionReceipt":
+        return chain["receipts"].get(params[0])
+    if method == "eth_getBlockByNumber":
+        number = chain["head"] if params[0] == "latest" else int(params[0], 16)
+        return {"number": hex(number), "hash": _block_hash(number)} if number <= chain["head"] else None
+    if method == "eth_getLogs":
+        return []
+    raise KeyError(method)
+
+
+def _reply(request: dict):
+    reply = {"jsonrpc": "2.0", "id": request.get("id")}
+    if FAKE_ERROR_RATE and random.random() < FAKE_ERROR_RATE:
+        reply["error"] = {"code": -32603, "message": "Fake upstream error"}
+        return reply
+    try:
+        reply["result"] = _call(request["method"], request.get("params") or [])
+    except KeyError:
+        reply["error"] = {"code": -32601, "message": f"Method not found: {request['method']}"}
+    return reply
+
+
+@app.post("/")
+async def rpc(request: Request):
+    if FAKE_LATENCY_MS:
+        await asyncio.sleep(FAKE_LATENCY_MS / 1000)
+    body = await request.json()
+    if isinstance(body, list):
+        return [_reply(item) for item in body]
+    return _reply(body)
@@ -1,5 +1,11 @@
+import os
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from utils.intents import intent_router
+from utils.llm import cached_advice
+
+# Si está activo, las preguntas sin intención conocida se responden con el asesor IA
+CHAT_LLM_FALLBACK = os.getenv("CHAT_LLM_FALLBACK", "false").lower() == "true"
 
 # Crear un router para fintto_chat
 router = APIRouter()
@@ -11,15 +17,12 @@ class ChatMessage(BaseModel):
 @router.post("/chat")
 async def fintto_chat(data: ChatMessage):
     try:
-        user_question = data.question.lower()
-
-        # Lógica básica para respuestas automáticas
-        if "bolsa" in user_question:
-            response = "Para invertir en la bolsa, necesitas abrir una cuenta con un broker y elegir tus activos."
-        elif "criptomonedas" in user_question:
-            response = "Las criptomonedas son activos digitales que puedes adquirir en plataformas como Binance o Coinbase."
-        elif "préstamo" in user_question or "loan" in user_question:
-            response = "Para solicitar un préstamo, asegúrate de cumplir con los requisitos necesarios en tu cuenta de usuario."
+        # Reglas compiladas en config/intents.json
+        intent = intent_router.classify(data.question)
+        if intent:
+            response = intent.response
+        elif CHAT_LLM_FALLBACK:
+            response = await cached_advice(data.question)
         else:
             response = f"Fintto Chat dice: La respuesta a tu pregunta '{data.question}' será más detallada en el futuro."
 
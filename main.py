@@ -1,29 +1,75 @@
 import os
 import json
-import stripe
-import mysql.connector.pooling
-from mysql.connector import Error
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from firebase_admin import credentials, auth, initialize_app
 import logging
-import time
-import hmac
-import hashlib
-import base64
-import requests
+import asyncio
+from utils.market_cache import MarketSnapshotService
+from utils.kraken_client import kraken_client, KrakenError
+from utils.kraken_ws import KrakenWebSocketFeed
+from utils.order_book import order_books
+from utils.broadcast import market_updates
+from utils.db import db
+from utils.firebase_auth import verify_user, get_current_user, require_admin, token_verifier
+from utils.metrics import render as render_metrics, CONTENT_TYPE_LATEST
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from routers import trade_routes, wallet_routes, market_routes, subscription_routes
+from routes import ia_chat, loans, defi_loans
+from routes import stripe as stripe_routes
+from utils.order_pipeline import order_pipeline
+from utils.portfolio import portfolio_store
+from utils.analytics import market_analytics
+from utils.quotes import quote_service
+from utils.loan_indexer import loan_indexer, LOAN_INDEXER_ENABLED
+from utils.stripe_events import stripe_events, subscription_state
+from utils.entitlements import EntitlementMiddleware, plan_catalog, subscription_index
+from utils.rate_limit import RateLimitMiddleware, rate_limit_store
+from utils.observability import MetricsMiddleware, loop_monitor
+from utils.container import container
+from utils.invalidation import invalidation_bus
+from utils.migrations import migrate, MIGRATE_ON_STARTUP
+from utils.registration import registrations, RegistrationPending
+from utils.http_cache import CachedResponse
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Startup only launches background work: SDK clients and the database are created
+# lazily by the dependency container, so an unreachable service never blocks boot
+@asynccontextmanager
+async def lifespan(app):
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Routers
+app.include_router(trade_routes.router, prefix="/trade")
+app.include_router(wallet_routes.router, prefix="/wallets")
+app.include_router(market_routes.router, prefix="/market")
+app.include_router(ia_chat.router)
+app.include_router(loans.router)
+app.include_router(defi_loans.router, prefix="/defi")
+app.include_router(stripe_routes.router)
+app.include_router(subscription_routes.router)
+
+# Plan gating for premium routes (AI chat, trading, analytics), behind per-client rate
+# limits; both are added before CORS so rejections still carry CORS headers
+app.add_middleware(EntitlementMiddleware)
+app.add_middleware(RateLimitMiddleware)
+# Per-route latency, status and in-flight requests, including rejected ones
+app.add_middleware(MetricsMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -33,34 +79,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Firebase private key configuration from environment
-firebase_creds = json.loads(os.getenv("FIREBASE_CREDENTIALS"))
-cred = credentials.Certificate(firebase_creds)
-initialize_app(cred)
-
-# Stripe Configuration
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-
-# Kraken API Configuration
-KRAKEN_API_KEY = os.getenv("KRAKEN_API_KEY")
-KRAKEN_API_SECRET = os.getenv("KRAKEN_API_SECRET")
-KRAKEN_API_URL = "https://api.kraken.com/0"
-
-# Database configuration
-db_config = {
-    "host": os.getenv("DB_HOST"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASSWORD"),
-    "database": os.getenv("DB_NAME"),
-    "port": os.getenv("DB_PORT"),
-}
-db_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="mypool", pool_size=5, **db_config)
-
 # Models
-class LoginData(BaseModel):
-    email: str
-    password: str
-
 class RegisterData(BaseModel):
     email: str
     password: str
@@ -74,135 +93,253 @@ class TradeData(BaseModel):
 class SubscriptionData(BaseModel):
     plan: str
 
-@app.on_event("startup")
+# Multi-worker mode (start.sh): one leader worker polls upstream and owns background
+# writers; every worker mirrors the others' committed changes over the invalidation bus
+MARKET_REPLICATION_SECONDS = float(os.getenv("MARKET_REPLICATION_SECONDS", 1))
+leader_tasks = []
+
+async def replicate_market():
+    version = None
+    while True:
+        if market_snapshot.version != version and market_snapshot.tickers:
+            version = market_snapshot.version
+            invalidation_bus.publish("market", {"pairs": market_snapshot.pairs, "tickers": market_snapshot.tickers})
+        await asyncio.sleep(MARKET_REPLICATION_SECONDS)
+
+def apply_market_replica(data):
+    market_snapshot.pairs = data["pairs"]
+    market_snapshot.replace(data["tickers"])
+
+async def start_leader_services():
+    if MIGRATE_ON_STARTUP:
+        try:
+            await migrate()
+        except Exception as err:
+            logger.error(f"Error applying migrations: {err}")
+    market_analytics.persist = True
+    market_snapshot.replica = False
+    market_snapshot.start(poll_tickers=market_feed is None)
+    if market_feed:
+        market_feed.start()
+    if LOAN_INDEXER_ENABLED:
+        loan_indexer.start()
+    registrations.start()
+    if invalidation_bus.enabled:
+        leader_tasks.append(asyncio.create_task(replicate_market()))
+
+def wire_invalidation_bus(bus):
+    bus.subscribe("market", apply_market_replica)
+    bus.subscribe("subscriptions", lambda data: subscription_index.apply_remote(data["user_id"], data["subscription"]))
+    bus.subscribe("stripe", subscription_state.merge)
+    bus.subscribe("orders", order_pipeline.apply_remote)
+    bus.subscribe("auth", lambda data: token_verifier.deny(data["key"], data["exp"]))
+    subscription_index.listeners.append(
+        lambda user_id, subscription: bus.publish("subscriptions", {"user_id": user_id, "subscription": subscription})
+    )
+    stripe_events.listeners.append(lambda user_id, state: bus.publish("stripe", state))
+    order_pipeline.replicas.append(lambda order: bus.publish("orders", order))
+    token_verifier.listeners.append(lambda key, exp: bus.publish("auth", {"key": key, "exp": exp}))
+    bus.on_leader(start_leader_services)
+    # Changes published while this worker was disconnected are lost; reload from the source of truth
+    bus.on_resync(subscription_index.load)
+    bus.on_resync(stripe_events.resync)
+
 async def startup_event():
-    try:
-        conn = db_pool.get_connection()
-        if conn.is_connected():
-            logger.info("Database connection successful")
-            conn.close()
-    except Error as err:
-        logger.error(f"Error connecting to MySQL: {err}")
-        raise Exception(f"Error connecting to MySQL: {err}")
+    loop_monitor.start()
+    # Database, subscription index and SDK clients warm up concurrently; /health/ready
+    # reports when the required ones are available
+    container.start()
+    wire_invalidation_bus(invalidation_bus)
+    market_analytics.persist = not invalidation_bus.enabled
+    # Until this worker leads, Kraken is only polled by the leader
+    market_snapshot.replica = invalidation_bus.enabled
+    portfolio_store.start(market_snapshot, market_updates)
+    market_analytics.start(market_updates)
+    order_pipeline.listeners.append(portfolio_store.on_order_settled)
+    stripe_events.listeners.append(subscription_index.on_stripe_update)
+    stripe_events.start()
+    # Runs start_leader_services right away in single-worker mode
+    await invalidation_bus.start()
+
+async def shutdown_event():
+    await loop_monitor.stop()
+    await invalidation_bus.stop()
+    for task in leader_tasks:
+        task.cancel()
+    await asyncio.gather(*leader_tasks, return_exceptions=True)
+    await loan_indexer.stop()
+    await stripe_events.stop()
+    await portfolio_store.stop(market_updates)
+    await market_analytics.stop(market_updates)
+    if market_feed:
+        await market_feed.stop()
+    await market_snapshot.stop()
+    await quote_service.close()
+    await rate_limit_store.close()
+    # Flushes queued writes before the pool closes
+    await registrations.stop()
+    await subscription_index.activations.stop()
+    # Database, Kraken, web3, OpenAI and Firebase clients
+    await container.close()
 
 @app.get("/")
 async def root():
     return {"message": "FINTT Backend is running with optimized functionality!"}
 
+# Liveness: the process and its event loop are responsive; never depends on external services
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive", "uptime": container.uptime(), "event_loop_lag": loop_monitor.stats()}
+
+# Readiness: 503 until every required dependency is up; optional ones are reported only
+@app.get("/health/ready")
+async def readiness():
+    ready, dependencies = await container.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "dependencies": dependencies},
+    )
+
 # User Registration
 @app.post("/register")
 async def register_user(data: RegisterData):
+    # Firebase account and users row are created together or not at all (utils/registration.py)
     try:
-        # Create a new Firebase user
-        user = auth.create_user(email=data.email, password=data.password)
-        
-        # Store user information in the database
-        conn = db_pool.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (firebase_uid, name, email, country) VALUES (%s, %s, %s, %s)",
-            (user.uid, data.name, data.email, data.country),
-        )
-        conn.commit()
-        conn.close()
-        
-        return {"message": "User registered successfully", "uid": user.uid}
+        uid = await registrations.register(data.email, data.password, data.name, data.country)
+        return {"message": "User registered successfully", "uid": uid}
+    except RegistrationPending as e:
+        logger.error(f"Registration pending, Firebase did not answer: {e.__cause__}")
+        raise HTTPException(status_code=503, detail="Registration is being processed, try signing in shortly")
     except Exception as e:
         logger.error(f"Error registering user: {e}")
         raise HTTPException(status_code=400, detail="Error registering user")
 
 # User Login
+# The client signs in with the Firebase SDK and sends its ID token as "Authorization: Bearer <token>";
+# the token is verified locally, so no Admin SDK round-trip is made here.
 @app.post("/login")
-async def login_user(data: LoginData):
+async def login_user(user: dict = Depends(get_current_user)):
     try:
-        # Authenticate using Firebase
-        user = auth.get_user_by_email(data.email)
-        token = auth.create_custom_token(user.uid)
-        
         # Fetch additional user details from the database
-        conn = db_pool.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, name, email FROM users WHERE firebase_uid = %s", (user.uid,))
-        user_data = cursor.fetchone()
-        conn.close()
-        
-        if not user_data:
-            raise HTTPException(status_code=401, detail="User not found in database")
-        
-        return {
-            "message": "Login successful",
-            "user": user_data,
-            "token": token.decode("utf-8"),
-        }
+        async with db.acquire() as conn:
+            user_data = await conn.fetchone("SELECT id, name, email FROM users WHERE firebase_uid = %s", (user["uid"],))
     except Exception as e:
         logger.error(f"Error logging in: {e}")
-        raise HTTPException(status_code=401, detail="Invalid email or password")
+        raise HTTPException(status_code=500, detail="Error logging in")
+
+    if not user_data:
+        raise HTTPException(status_code=401, detail="User not found in database")
+
+    return {
+        "message": "Login successful",
+        "user": user_data,
+    }
+
+@app.get("/auth/stats", dependencies=[Depends(require_admin)])
+async def get_auth_stats():
+    return token_verifier.stats()
 
 # Utility functions for Kraken API
-def kraken_api_request(endpoint: str, data=None, is_private=False):
+async def kraken_api_request(endpoint: str, data=None, is_private=False):
     try:
-        headers = {}
-        url = f"{KRAKEN_API_URL}/{endpoint}"
-
         if is_private:
-            nonce = str(int(time.time() * 1000))
-            post_data = f"nonce={nonce}"
-            if data:
-                post_data += "&" + "&".join(f"{key}={value}" for key, value in data.items())
-            message = f"{nonce}{post_data}".encode("utf-8")
-            signature = hmac.new(
-                base64.b64decode(KRAKEN_API_SECRET),
-                f"/0/{endpoint}".encode("utf-8") + hashlib.sha256(message).digest(),
-                hashlib.sha512
-            )
-            headers["API-Key"] = KRAKEN_API_KEY
-            headers["API-Sign"] = base64.b64encode(signature.digest())
-        else:
-            post_data = data if data else None
-
-        response = requests.post(url, headers=headers, data=post_data)
-        return response.json()
+            return await kraken_client.private(endpoint, data)
+        return await kraken_client.public(endpoint, data)
+    except KrakenError:
+        raise
     except Exception as e:
         logger.error(f"Kraken API request failed: {e}")
         raise HTTPException(status_code=500, detail="Error communicating with Kraken API")
 
+async def fetch_asset_pairs():
+    result = await kraken_api_request("AssetPairs")
+    return {pair: info.get("wsname") for pair, info in result.items()}
+
+async def fetch_ticker(pairs):
+    return await kraken_api_request("Ticker", {"pair": ",".join(pairs)})
+
+market_snapshot = MarketSnapshotService(fetch_asset_pairs, fetch_ticker, broadcaster=market_updates)
+
+# "rest" polls public/Ticker, "ws" streams Kraken's ticker and book channels
+MARKET_FEED = os.getenv("MARKET_FEED", "rest").lower()
+market_feed = KrakenWebSocketFeed(market_snapshot, order_books, market_updates) if MARKET_FEED == "ws" else None
+
+# Encoded once per snapshot version and shared by every poller; If-None-Match gets a 304
+market_response = CachedResponse("/market", max_age=int(market_snapshot.ticker_interval))
+
 @app.get("/market")
-async def get_market_data():
+async def get_market_data(request: Request):
     try:
-        response = kraken_api_request("public/AssetPairs")
-        if "error" in response and response["error"]:
-            raise HTTPException(status_code=500, detail="Error fetching market data")
-
-        pairs = list(response["result"].keys())
-        ticker_response = kraken_api_request(f"public/Ticker?pair={','.join(pairs)}")
-        if "error" in ticker_response and ticker_response["error"]:
-            raise HTTPException(status_code=500, detail="Error fetching ticker data")
-
-        market_data = []
-        for pair, info in ticker_response["result"].items():
-            market_data.append({
-                "crypto": pair,
-                "last_price": info["c"][0],
-                "bid": info["b"][0],
-                "ask": info["a"][0]
-            })
-        return market_data
+        data = await market_snapshot.get()
+        return market_response.respond(request, market_snapshot.version, lambda: data)
     except Exception as e:
         logger.error(f"Error fetching market data: {e}")
         raise HTTPException(status_code=500, detail="Error fetching market data")
 
+@app.get("/market/stats", dependencies=[Depends(require_admin)])
+async def get_market_stats():
+    stats = market_snapshot.stats()
+    stats["response"] = market_response.stats()
+    if market_feed:
+        stats["feed"] = market_feed.stats()
+    return stats
+
+@app.get("/db/stats", dependencies=[Depends(require_admin)])
+async def get_db_stats():
+    return db.stats()
+
+@app.get("/db/writes", dependencies=[Depends(require_admin)])
+async def get_write_batch_stats():
+    return {**registrations.stats(), "subscriptions": subscription_index.activations.stats()}
+
+@app.get("/bus/stats", dependencies=[Depends(require_admin)])
+async def get_bus_stats():
+    return invalidation_bus.stats()
+
+@app.get("/metrics", dependencies=[Depends(require_admin)])
+async def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/market/book/{pair}")
+async def get_order_book(pair: str):
+    book = order_books.get(pair)
+    if book is None or not book.synced:
+        raise HTTPException(status_code=404, detail="Order book not available")
+    return {"crypto": pair, **book.to_dict()}
+
+@app.get("/market/stream")
+async def stream_market(request: Request):
+    async def events():
+        subscription = market_updates.subscribe()
+        try:
+            # Initial snapshot, then coalesced updates
+            yield f"data: {json.dumps(await market_snapshot.get())}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    batch = await asyncio.wait_for(subscription.next_batch(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(batch)}\n\n"
+        finally:
+            market_updates.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.post("/subscription")
 async def subscribe(data: SubscriptionData, request: Request):
     user = await verify_user(request.headers.get("Authorization"))
+    plan = plan_catalog.resolve(data.plan)
+    if plan is None:
+        raise HTTPException(status_code=400, detail=f"Unknown plan: {data.plan}")
     try:
-        plan_price = 30 if data.plan.lower() == "basic" else 70
-        conn = db_pool.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO subscriptions (user_id, plan, price, is_active) VALUES (%s, %s, %s, 1)",
-                       (user["uid"], data.plan, plan_price))
-        conn.commit()
-        conn.close()
-        return {"message": f"Subscribed to {data.plan} plan successfully"}
+        # Paid plans are activated by the Stripe webhook once the checkout is paid
+        result = await subscription_index.subscribe(user["uid"], plan)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing subscription: {e}")
         raise HTTPException(status_code=500, detail="Error processing subscription")
+    if result["status"] == "active":
+        return {"message": f"Subscribed to {plan} plan successfully", **result}
+    return {"message": f"Complete the payment to activate the {plan} plan", "plan": plan, **result}
@@ -0,0 +1,3 @@
+-- Per-user wallet lookups and keyset pages over (user_id, id); InnoDB and SQLite
+-- both append the primary key to secondary indexes
+CREATE INDEX idx_wallets_user_id ON wallets (user_id);
@@ -0,0 +1,2 @@
+-- Active-subscription lookups per user (entitlements, upgrades, bulk exports)
+CREATE INDEX idx_subscriptions_user_active ON subscriptions (user_id, is_active);
@@ -0,0 +1,7 @@
+-- Registrations whose Firebase account is not confirmed yet; rows are removed once settled
+CREATE TABLE registration_outbox (
+    firebase_uid VARCHAR(128) NOT NULL PRIMARY KEY,
+    email VARCHAR(255) NOT NULL,
+    created_at DOUBLE NOT NULL
+);
+CREATE INDEX idx_registration_outbox_created ON registration_outbox (created_at);
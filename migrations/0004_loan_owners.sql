@@ -0,0 +1,7 @@
+-- Which user submitted each loan transaction; written by /loans even when the loan indexer is disabled
+CREATE TABLE loan_owners (
+    tx_hash VARCHAR(66) NOT NULL PRIMARY KEY,
+    user_id VARCHAR(128) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_loan_owners_user ON loan_owners (user_id);
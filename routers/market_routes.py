@@ -1,9 +1,36 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import os
+import math
+import time
+import asyncio
+import logging
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from typing import List, Optional
 from pydantic import BaseModel
+from utils.analytics import market_analytics
+from utils.candle_store import candle_store, interval_seconds, FIELDS
+from utils.ttl_cache import TTLCache
+from utils.quotes import quote_service
+from utils.firebase_auth import require_admin
+from utils.http_cache import CachedResponse
+from app.services.financial_api import get_stock_price, get_crypto_candles
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Cache lifetimes for clients polling news and trends (seconds); both answer 304 while unchanged
+MARKET_NEWS_MAX_AGE = int(os.getenv("MARKET_NEWS_MAX_AGE", 300))
+MARKET_TRENDS_MAX_AGE = int(os.getenv("MARKET_TRENDS_MAX_AGE", 10))
+news_response = CachedResponse("/market/news", max_age=MARKET_NEWS_MAX_AGE)
+# Trends are plan-gated, so shared caches must not store them
+trends_response = CachedResponse("/market/trends", max_age=MARKET_TRENDS_MAX_AGE, private=True)
+# Symbols accepted by one /market/quotes request
+QUOTES_MAX_SYMBOLS = int(os.getenv("QUOTES_MAX_SYMBOLS", 100))
+
+# Last backfill attempt per series, so market closures and provider gaps don't refetch on every request
+backfill_attempts = TTLCache(maxsize=10000, ttl=300)
+
 # Define data models
 class MarketNews(BaseModel):
     title: str
@@ -13,37 +40,132 @@ class MarketNews(BaseModel):
 class MarketTrend(BaseModel):
     trend: str
     percentage_change: float
+    pair: Optional[str] = None
+    window: Optional[int] = None
+    sma: Optional[float] = None
+    volatility: Optional[float] = None
+    rsi: Optional[float] = None
+    correlation: Optional[float] = None
 
 # Example: Fetch market news
+def market_news():
+    # Dummy data for market news
+    return [
+        MarketNews(
+            title="Crypto Prices Surge",
+            description="Bitcoin and Ethereum prices see a massive surge.",
+            url="https://example.com/news1"
+        ),
+        MarketNews(
+            title="Market Crash Expected",
+            description="Analysts predict a potential market crash next week.",
+            url="https://example.com/news2"
+        ),
+    ]
+
 @router.get("/news", response_model=List[MarketNews])
-async def get_market_news():
+async def get_market_news(request: Request):
     try:
-        # Dummy data for market news
-        market_news = [
-            MarketNews(
-                title="Crypto Prices Surge",
-                description="Bitcoin and Ethereum prices see a massive surge.",
-                url="https://example.com/news1"
-            ),
-            MarketNews(
-                title="Market Crash Expected",
-                description="Analysts predict a potential market crash next week.",
-                url="https://example.com/news2"
-            ),
-        ]
-        return market_news
+        # The news list is static, so its version never changes
+        return news_response.respond(request, 0, lambda: [news.model_dump() for news in market_news()])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching market news: {e}")
 
-# Example: Fetch market trends
+# Market trends over the last `window` candles for every pair
 @router.get("/trends", response_model=List[MarketTrend])
-async def get_market_trends():
-    try:
-        # Dummy data for market trends
-        market_trends = [
-            MarketTrend(trend="Bitcoin Uptrend", percentage_change=5.6),
-            MarketTrend(trend="Ethereum Downtrend", percentage_change=-3.2),
+async def get_market_trends(request: Request, window: int = Query(14, ge=2, le=market_analytics.history.capacity - 1)):
+    def build():
+        return [
+            MarketTrend(
+                trend=f"{row['pair']} {'Uptrend' if row['percentage_change'] >= 0 else 'Downtrend'}",
+                window=window,
+                **row,
+            ).model_dump()
+            for row in market_analytics.trends(window)["pairs"]
         ]
-        return market_trends
+
+    try:
+        # Rebuilt once per closed candle and window
+        return trends_response.respond(request, market_analytics.version, build, variant=window)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching market trends: {e}")
+
+@router.get("/trends/correlation")
+async def get_market_correlation(window: int = Query(14, ge=2, le=market_analytics.history.capacity - 1)):
+    try:
+        result = market_analytics.trends(window)
+        matrix = result.get("correlation_matrix")
+        if matrix is not None:
+            # NaN (pairs without variance) is not valid JSON
+            matrix = np.where(np.isnan(matrix), None, matrix.round(4)).tolist()
+        return {
+            "window": window,
+            "pairs": result.get("names", []),
+            "matrix": matrix if matrix is not None else [],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching market correlation: {e}")
+
+@router.get("/trends/stats", dependencies=[Depends(require_admin)])
+async def get_market_trends_stats():
+    return {**market_analytics.stats(), "response": trends_response.stats()}
+
+# Price history for charts, served from the local candle store
+@router.get("/history/{symbol}")
+async def get_price_history(
+    symbol: str,
+    kind: str = Query("crypto", pattern="^(crypto|stock)$"),
+    interval: Optional[str] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    resolution: Optional[str] = None,
+):
+    end = end or int(time.time())
+    start = start or end - 86400
+    days = max(1, math.ceil((end - start) / 86400))
+    if interval is None:
+        interval = ("30min" if days <= 2 else "4h") if kind == "crypto" else "5min"
+    try:
+        step = interval_seconds(interval)
+        # The newest candle may still be open, so only gaps older than one step count
+        gaps = candle_store.gaps(symbol, interval, start, end - step)
+        key = (symbol, interval)
+        if gaps and backfill_attempts.get(key) is None:
+            backfill_attempts.set(key, True)
+            # A failed or unsupported backfill (e.g. candles finer than the provider's) still serves what is stored
+            try:
+                if kind == "crypto":
+                    await asyncio.to_thread(get_crypto_candles, symbol, days, interval)
+                else:
+                    await asyncio.to_thread(get_stock_price, symbol, interval)
+            except Exception as e:
+                logger.warning(f"Backfill of {symbol} {interval} candles failed: {e}")
+
+        columns = candle_store.range(symbol, interval, start, end)
+        if resolution:
+            columns = candle_store.downsample(columns, interval_seconds(resolution))
+        return {"symbol": symbol, "interval": resolution or interval,
+                **{field: columns[field].tolist() for field in FIELDS}}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching price history: {e}")
+
+# USD quotes through the coalescing quote service
+@router.get("/quote/{symbol}")
+async def get_quote(symbol: str, kind: str = Query("crypto", pattern="^(crypto|stock)$")):
+    price = await quote_service.get(symbol, kind)
+    if price is None:
+        raise HTTPException(status_code=404, detail=f"No quote available for {symbol}")
+    return {"symbol": symbol, "kind": kind, "usd": price}
+
+@router.get("/quotes")
+async def get_quotes(symbols: str, kind: str = Query("crypto", pattern="^(crypto|stock)$")):
+    names = list(dict.fromkeys(symbol.strip() for symbol in symbols.split(",") if symbol.strip()))
+    if len(names) > QUOTES_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {QUOTES_MAX_SYMBOLS} symbols per request")
+    return {"kind": kind, "usd": await quote_service.get_many(names, kind)}
+
+@router.get("/quotes/stats", dependencies=[Depends(require_admin)])
+async def get_quotes_stats():
+    return quote_service.stats()
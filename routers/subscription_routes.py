@@ -1,8 +1,90 @@
-from fastapi import APIRouter
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from utils.entitlements import plan_catalog, subscription_index
+from utils.stripe_events import subscription_state
+from utils.firebase_auth import get_current_user, require_admin
+from utils.bulk import KeysetQuery, BULK_PAGE_SIZE
 
 router = APIRouter()
 
+SUBSCRIPTION_FIELDS = ("id", "user_id", "plan", "price", "is_active", "created_at")
+subscriptions_query = KeysetQuery("subscriptions", SUBSCRIPTION_FIELDS)
+
+class BulkSubscriptionsRequest(BaseModel):
+    # Firebase uids; numeric ids from older rows are accepted too
+    user_ids: List[Union[str, int]]
+    fields: Optional[List[str]] = None
+    active_only: bool = False
+    limit: int = BULK_PAGE_SIZE
+    cursor: Optional[str] = None
+
+    def where(self):
+        return " AND is_active = 1" if self.active_only else ""
+
+    def owners(self):
+        return [str(user_id) for user_id in self.user_ids]
+
+@router.get("/subscriptions/plans")
+async def list_plans():
+    return {"period_days": plan_catalog.period_seconds // 86400, "plans": list(plan_catalog.plans.values())}
+
+@router.get("/subscriptions/me")
+async def my_subscription(user: dict = Depends(get_current_user)):
+    plan = subscription_index.plan(user["uid"])
+    return {
+        "user_id": user["uid"],
+        "plan": plan,
+        "features": sorted(plan_catalog.features.get(plan, ())),
+        "subscription": subscription_index.active.get(user["uid"]),
+    }
+
 @router.post("/subscriptions/upgrade")
-async def upgrade_subscription(user_id: int, new_plan: str):
-    # Logic for subscription upgrade
-    return {"message": "Subscription upgraded", "user_id": user_id, "new_plan": new_plan}
+async def upgrade_subscription(new_plan: str, user: dict = Depends(get_current_user)):
+    plan = plan_catalog.resolve(new_plan)
+    if plan is None:
+        raise HTTPException(status_code=400, detail=f"Unknown plan: {new_plan}")
+    state = subscription_state.get(user["uid"]) or {}
+    result = await subscription_index.upgrade(user["uid"], plan, state.get("subscription_id"))
+    # The new plan is activated by the Stripe webhook once amount_due is paid
+    return {"message": "Upgrade pending payment", "user_id": user["uid"], "new_plan": plan, **result}
+
+@router.post("/subscriptions/bulk", dependencies=[Depends(require_admin)])
+async def get_subscriptions_bulk(data: BulkSubscriptionsRequest):
+    """
+    One page of subscription rows for many users; pass next_cursor back to get the next page.
+    """
+    try:
+        rows, next_cursor = await subscriptions_query.page(
+            data.owners(), data.fields, data.limit, data.cursor, where=data.where()
+        )
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Error fetching subscriptions: {err}")
+    return {"subscriptions": rows, "next_cursor": next_cursor}
+
+@router.post("/subscriptions/bulk/export", dependencies=[Depends(require_admin)])
+async def export_subscriptions(data: BulkSubscriptionsRequest):
+    """
+    Every subscription row of the given users as NDJSON, streamed page by page.
+    """
+    try:
+        rows = subscriptions_query.export(data.owners(), data.fields, data.limit, where=data.where())
+        first = await anext(rows, "")
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Error exporting subscriptions: {err}")
+
+    async def body():
+        yield first
+        async for chunk in rows:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@router.get("/subscriptions/stats", dependencies=[Depends(require_admin)])
+async def subscription_stats():
+    return subscription_index.stats()
@@ -1,6 +1,11 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from utils.kraken import execute_trade
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Header, Request, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+from utils.firebase_auth import current_account, require_admin
+from utils.order_book import order_books
+from utils.order_pipeline import order_pipeline, QueueFull, TERMINAL
 
 router = APIRouter()
 
@@ -9,10 +14,81 @@ class TradeData(BaseModel):
     amount: float
     action: str  # "buy" or "sell"
 
-@router.post("/")
-async def trade(data: TradeData):
+    @field_validator("amount")
+    @classmethod
+    def amount_positive(cls, amount):
+        if not amount > 0:
+            raise ValueError("amount must be positive")
+        return amount
+
+async def owned_order(order_id: str, request: Request) -> dict:
+    """
+    The caller's own order; someone else's is reported as missing rather than forbidden.
+    """
+    user_id = await current_account(request)
+    order = order_pipeline.get(order_id)
+    if order is None or order["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+@router.on_event("startup")
+async def start_order_pipeline():
+    order_pipeline.start()
+
+@router.on_event("shutdown")
+async def stop_order_pipeline():
+    await order_pipeline.stop()
+
+@router.post("/", status_code=202)
+async def trade(data: TradeData, request: Request, idempotency_key: str = Header(None)):
+    if data.action not in ("buy", "sell"):
+        raise HTTPException(status_code=400, detail="action must be 'buy' or 'sell'")
+    user_id = await current_account(request)
     try:
-        result = execute_trade(data.crypto_pair, data.amount, data.action)
-        return {"message": "Trade executed successfully", "result": result}
+        order = await order_pipeline.submit(data.crypto_pair, data.amount, data.action, idempotency_key, user_id)
+    except QueueFull:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Trade queue is full, retry shortly"},
+            headers={"Retry-After": "5"},
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error executing trade: {e}")
+        raise HTTPException(status_code=500, detail=f"Error queueing trade: {e}")
+
+    # Reference price from the local order book (streaming mode only)
+    top = order_books.best(data.crypto_pair)
+    reference_price = None
+    if top:
+        reference_price = top["ask"] if data.action == "buy" else top["bid"]
+
+    return {"message": "Trade accepted", "order": order, "reference_price": reference_price}
+
+@router.get("/orders/{order_id}")
+async def get_order(order_id: str, request: Request):
+    return await owned_order(order_id, request)
+
+@router.get("/orders/{order_id}/stream")
+async def stream_order(order_id: str, request: Request):
+    await owned_order(order_id, request)
+
+    async def events():
+        subscription = order_pipeline.watch(order_id)
+        try:
+            current = order_pipeline.get(order_id)
+            yield f"data: {json.dumps(current)}\n\n"
+            while current["status"] not in TERMINAL and not await request.is_disconnected():
+                try:
+                    batch = await asyncio.wait_for(subscription.next_batch(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                current = batch[-1]
+                yield f"data: {json.dumps(current)}\n\n"
+        finally:
+            order_pipeline.unwatch(order_id, subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.get("/stats", dependencies=[Depends(require_admin)])
+async def get_trade_stats():
+    return order_pipeline.stats()
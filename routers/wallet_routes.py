@@ -1,19 +1,91 @@
-from fastapi import APIRouter, HTTPException
-from utils.db import db_pool
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from utils.db import db
+from utils.portfolio import portfolio_store
+from utils.firebase_auth import require_admin, current_account
+from utils.bulk import KeysetQuery, BULK_PAGE_SIZE, BULK_MAX_IDS
 
 router = APIRouter()
 
-@router.get("/{user_id}")
+async def own_account(user_id: int, request: Request):
+    """
+    Dependency for per-user routes: the token must belong to user_id.
+    """
+    if await current_account(request) != user_id:
+        raise HTTPException(status_code=403, detail="Not your account")
+
+WALLET_FIELDS = ("id", "user_id", "currency", "balance")
+wallets_query = KeysetQuery("wallets", WALLET_FIELDS)
+
+class BulkValuationRequest(BaseModel):
+    user_ids: List[int]
+
+class BulkWalletsRequest(BaseModel):
+    user_ids: List[int]
+    fields: Optional[List[str]] = None
+    limit: int = BULK_PAGE_SIZE
+    cursor: Optional[str] = None
+
+@router.post("/bulk", dependencies=[Depends(require_admin)])
+async def get_wallets_bulk(data: BulkWalletsRequest):
+    """
+    One page of wallets for many users; pass next_cursor back to get the next page.
+    """
+    try:
+        wallets, next_cursor = await wallets_query.page(data.user_ids, data.fields, data.limit, data.cursor)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Error fetching wallets: {err}")
+    return {"wallets": wallets, "next_cursor": next_cursor}
+
+@router.post("/bulk/export", dependencies=[Depends(require_admin)])
+async def export_wallets(data: BulkWalletsRequest):
+    """
+    Every wallet of the given users as NDJSON, streamed page by page.
+    """
+    try:
+        rows = wallets_query.export(data.user_ids, data.fields, data.limit)
+        first = await anext(rows, "")
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Error exporting wallets: {err}")
+
+    async def body():
+        yield first
+        async for chunk in rows:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@router.get("/{user_id}", dependencies=[Depends(own_account)])
 async def get_wallets(user_id: int):
     try:
-        conn = db_pool.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = "SELECT * FROM wallets WHERE user_id = %s"
-        cursor.execute(query, (user_id,))
-        wallets = cursor.fetchall()
+        async with db.acquire() as conn:
+            query = f"SELECT {', '.join(WALLET_FIELDS)} FROM wallets WHERE user_id = %s ORDER BY id"
+            wallets = await conn.fetchall(query, (user_id,))
         return {"wallets": wallets}
     except Exception as err:
         raise HTTPException(status_code=500, detail=f"Error fetching wallets: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+
+@router.get("/{user_id}/portfolio", dependencies=[Depends(own_account)])
+async def get_portfolio(user_id: int):
+    try:
+        await portfolio_store.get(user_id)
+        return portfolio_store.valuation(user_id)
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Error valuing portfolio: {err}")
+
+@router.post("/valuation", dependencies=[Depends(require_admin)])
+async def value_portfolios(data: BulkValuationRequest):
+    user_ids = list(dict.fromkeys(data.user_ids))
+    if len(user_ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_IDS} ids per request")
+    try:
+        totals = await portfolio_store.value_many(user_ids)
+        return {"currency": "USD", "totals": totals}
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Error valuing portfolios: {err}")
@@ -1,6 +1,13 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, Header, Depends
 from pydantic import BaseModel
-from web3 import Web3
+from utils.firebase_auth import verify_user, get_current_user, require_admin
+from utils.loan_contract import LOAN_CONTRACT_ADDRESS, encode_call, loan_signer, to_wei
+from utils.loan_indexer import loan_indexer, balances
+from utils.web3_tx import web3_tx
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -8,30 +15,83 @@ class LoanRequest(BaseModel):
     amount: float
     interestRate: float
 
-# Configuración de la blockchain
-provider = "https://mainnet.infura.io/v3/TU_INFURA_PROJECT_ID"
-private_key = "TU_CLAVE_PRIVADA"
-contract_address = "DIRECCIÓN_CONTRATO"
-abi = [...]  # Copia el ABI del contrato
-
-w3 = Web3(Web3.HTTPProvider(provider))
-account = w3.eth.account.from_key(private_key)
-contract = w3.eth.contract(address=contract_address, abi=abi)
+# Configuración de la blockchain: WEB3_PROVIDER_URL, LOAN_CONTRACT_ADDRESS y LOAN_SIGNER_PRIVATE_KEY
 
 @router.post("/api/loans/request")
-async def request_loan(request: LoanRequest):
+async def request_loan(request: LoanRequest, authorization: str = Header(None)):
+    # Con un token de usuario, el préstamo queda asociado a su cuenta ("mis préstamos")
+    user = await verify_user(authorization) if authorization else None
     try:
-        tx = contract.functions.requestLoan(
-            int(request.amount * 1e18),  # Convertir a Wei
-            int(request.interestRate)
-        ).buildTransaction({
-            "from": account.address,
-            "nonce": w3.eth.getTransactionCount(account.address),
-            "gas": 2000000,
-            "gasPrice": w3.toWei("20", "gwei")
-        })
-        signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.sendRawTransaction(signed_tx.rawTransaction)
-        return {"txHash": tx_hash.hex()}
+        tx_hash = await web3_tx.send(
+            loan_signer(),
+            LOAN_CONTRACT_ADDRESS,
+            encode_call("requestLoan", to_wei(request.amount), int(request.interestRate)),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al solicitar préstamo: {str(e)}")
+    if user:
+        try:
+            await loan_indexer.record_owner(tx_hash, user["uid"])
+        except Exception as e:
+            logger.error(f"Error linking loan {tx_hash} to user {user['uid']}: {e}")
+    return {"txHash": tx_hash}
+
+@router.get("/api/loans/mine")
+async def my_loans(user: dict = Depends(get_current_user)):
+    try:
+        loans = await loan_indexer.loans_for_user(user["uid"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar préstamos: {str(e)}")
+    return {"summary": balances(loans), "loans": loans}
+
+@router.get("/api/loans/borrower/{address}")
+async def borrower_loans(address: str):
+    try:
+        loans = await loan_indexer.loans_for_borrower(address)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar préstamos: {str(e)}")
+    return {"summary": balances(loans), "loans": loans}
+
+@router.get("/api/loans/indexer/stats", dependencies=[Depends(require_admin)])
+async def indexer_stats():
+    return loan_indexer.stats()
+
+@router.get("/api/loans/tx/{tx_hash}")
+async def loan_transaction(tx_hash: str, wait: float = 0):
+    """
+    Estado de una transacción; con wait > 0 espera hasta ese número de segundos a que se mine.
+    """
+    try:
+        if wait > 0:
+            receipt = await web3_tx.wait_for_receipt(tx_hash, timeout=min(wait, 60))
+        else:
+            receipt = (await web3_tx.receipts([tx_hash]))[tx_hash]
+    except asyncio.TimeoutError:
+        receipt = None
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar la transacción: {str(e)}")
+    if receipt is None:
+        return {"txHash": tx_hash, "status": "pending"}
+    return {
+        "txHash": tx_hash,
+        "status": "confirmed" if receipt.get("status") == "0x1" else "reverted",
+        "blockNumber": int(receipt["blockNumber"], 16),
+        "gasUsed": int(receipt["gasUsed"], 16),
+    }
+
+@router.get("/api/loans/tx-stats", dependencies=[Depends(require_admin)])
+async def transaction_stats():
+    return web3_tx.stats()
+
+@router.get("/api/loans/{loan_id}")
+async def loan_history(loan_id: int):
+    """
+    Estado y pagos de un préstamo según los eventos indexados.
+    """
+    try:
+        loan = await loan_indexer.loan(loan_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar el préstamo: {str(e)}")
+    if loan is None:
+        raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+    return loan
@@ -1,32 +1,66 @@
 import os
-import stripe
-from fastapi import APIRouter, HTTPException
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Header, Request, Depends
 from dotenv import load_dotenv
+from utils.firebase_auth import verify_user, get_current_user, require_admin
+from utils.stripe_utils import checkout_session_params
+from utils.stripe_events import stripe_events, subscription_state
+from utils.observability import track
+from utils.container import container
 
 load_dotenv()  # Cargar las variables de entorno si usas un archivo .env
 
-# Claves de Stripe
-STRIPE_SECRET_KEY = "sk_test_51QfQbOCFuzFSWK4L7KMEakMZVSFM7dCq2FHekAzw9Dj5gjgjEu3lXMXlCX2VJvFWqEYCm8mVYr9e2GHLu1anUBhM00HeEKCAwW"
-stripe.api_key = STRIPE_SECRET_KEY
+# Claves de Stripe (la clave secreta se aplica al cargar el SDK en utils/stripe_utils.py)
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Antigüedad máxima aceptada de la firma del webhook (segundos)
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv("STRIPE_WEBHOOK_TOLERANCE", 300))
 
 router = APIRouter()
 
 # Endpoint para crear la sesión de pago
 @router.post("/create-checkout-session")
-async def create_checkout_session(plan_id: str):
+async def create_checkout_session(plan_id: str, authorization: str = Header(None)):
+    # Con un token de usuario, los webhooks de esta suscripción quedan asociados a su cuenta
+    user = await verify_user(authorization) if authorization else None
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price": plan_id,
-                    "quantity": 1,
-                },
-            ],
-            mode="subscription",
+        params = checkout_session_params(
+            plan_id,
+            user["uid"] if user else None,
             success_url="http://localhost:5173/success",  # Cambia a tu URL en producción
             cancel_url="http://localhost:5173/cancel",  # Cambia a tu URL en producción
         )
+        stripe = await container.get("stripe")
+        # El SDK de Stripe es síncrono; se ejecuta fuera del event loop
+        async with track("stripe", "checkout.session.create"):
+            session = await asyncio.to_thread(stripe.checkout.Session.create, **params)
         return {"url": session.url}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# Webhook de Stripe: verifica la firma, guarda el evento y responde de inmediato
+@router.post("/stripe/webhook")
+async def stripe_webhook(request: Request, stripe_signature: str = Header(None)):
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhook secret not configured")
+    payload = (await request.body()).decode("utf-8")
+    stripe = await container.get("stripe")
+    try:
+        stripe.WebhookSignature.verify_header(payload, stripe_signature, STRIPE_WEBHOOK_SECRET, STRIPE_WEBHOOK_TOLERANCE)
+        event = json.loads(payload)
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid webhook: {e}")
+
+    accepted = await stripe_events.enqueue(event)
+    return {"received": True, "duplicate": not accepted}
+
+@router.get("/stripe/subscription")
+async def subscription_status(user: dict = Depends(get_current_user)):
+    state = subscription_state.get(user["uid"])
+    if state is None:
+        raise HTTPException(status_code=404, detail="No subscription state for user")
+    return {**state, "active": subscription_state.is_active(user["uid"])}
+
+@router.get("/stripe/stats", dependencies=[Depends(require_admin)])
+async def webhook_stats():
+    return stripe_events.stats()
@@ -1,2 +1,18 @@
 #!/bin/bash
-uvicorn main:app --host 0.0.0.0 --port $PORT
+# One worker per core unless WEB_CONCURRENCY is set. With more than one, workers keep
+# their caches coherent over the invalidation bus (utils/invalidation.py) and the
+# leader worker alone polls Kraken and runs the background writers.
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-$(nproc)}
+# Rate limits: with the default local backend every worker enforces 1/WEB_CONCURRENCY of
+# each policy, so the totals in config/rate_limits.json hold on average whatever the
+# worker count. Set RATE_LIMIT_BACKEND=redis (and RATE_LIMIT_REDIS_URL) for exact limits
+# shared by all workers.
+if [ "$WEB_CONCURRENCY" -gt 1 ]; then
+    # Aggregate /metrics across workers; stale files from a previous run are dropped
+    export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/fintt-metrics}
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+# Schema first: /register writes to registration_outbox (migration 0003), so workers
+# must not start against an unmigrated database. A failed migration aborts the deploy.
+python -m utils.migrations || exit 1
+exec uvicorn main:app --host 0.0.0.0 --port $PORT --workers $WEB_CONCURRENCY
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import mysql.connector.pooling
+from utils.db import db
+from utils.entitlements import plan_catalog, subscription_index
 
 router = APIRouter()
 
@@ -10,31 +11,26 @@ class Subscription(BaseModel):
 
 @router.post("/subscribe")
 async def create_subscription(data: Subscription):
+    plan = plan_catalog.resolve(data.plan)
+    if plan is None:
+        raise HTTPException(status_code=400, detail=f"Plan desconocido: {data.plan}")
     try:
-        conn = db_pool.get_connection()
-        cursor = conn.cursor()
-        query = """
-        INSERT INTO subscriptions (user_id, plan, created_at)
-        VALUES (%s, %s, NOW())
-        """
-        cursor.execute(query, (data.user_id, data.plan))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return {"message": "Suscripción creada exitosamente"}
-    except mysql.connector.Error as err:
+        # Los planes de pago se activan desde el webhook de Stripe cuando se confirma el pago
+        result = await subscription_index.subscribe(data.user_id, plan)
+    except HTTPException:
+        raise
+    except Exception as err:
         raise HTTPException(status_code=500, detail=f"Error al crear suscripción: {err}")
+    if result["status"] == "active":
+        return {"message": "Suscripción creada exitosamente", **result}
+    return {"message": "Completa el pago para activar la suscripción", **result}
 
 @router.get("/subscriptions/{user_id}")
 async def get_subscriptions(user_id: int):
     try:
-        conn = db_pool.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = "SELECT * FROM subscriptions WHERE user_id = %s"
-        cursor.execute(query, (user_id,))
-        subscriptions = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        async with db.acquire() as conn:
+            query = "SELECT id, user_id, plan, price, is_active, created_at FROM subscriptions WHERE user_id = %s"
+            subscriptions = await conn.fetchall(query, (user_id,))
         return subscriptions
-    except mysql.connector.Error as err:
+    except Exception as err:
         raise HTTPException(status_code=500, detail=f"Error al obtener suscripciones: {err}")
@@ -0,0 +1,49 @@
+import json
+import numpy as np
+from utils.analytics import MarketAnalytics
+
+
+def build(prices: dict, candles: int) -> MarketAnalytics:
+    analytics = MarketAnalytics(candle_seconds=60, capacity=32)
+    for i in range(candles):
+        for pair, series in prices.items():
+            analytics.on_price(pair, series(i), now=i * 60)
+    # Close the last candle
+    analytics.on_price(next(iter(prices)), prices[next(iter(prices))](candles), now=candles * 60)
+    return analytics
+
+
+def test_flat_series_has_no_correlation_and_neutral_rsi():
+    analytics = build({
+        "XXBTZUSD": lambda i: 100 + (i % 3),
+        "XETHZUSD": lambda i: 50 + (i % 4),
+        "IDLEUSD": lambda i: 10.0,
+    }, candles=20)
+    result = analytics.trends(14)
+    pairs = {row["pair"]: row for row in result["pairs"]}
+
+    assert pairs["IDLEUSD"]["rsi"] == 50.0
+    assert pairs["IDLEUSD"]["correlation"] is None
+    matrix = result["correlation_matrix"]
+    idle = result["names"].index("IDLEUSD")
+    assert np.isnan(matrix[idle]).all() and np.isnan(matrix[:, idle]).all()
+    # Pairs with variance are unaffected
+    btc = result["names"].index("XXBTZUSD")
+    assert abs(matrix[btc, btc] - 1) < 1e-9
+
+
+def test_correlation_endpoint_encodes_flat_pairs(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routers import market_routes
+
+    analytics = build({"XXBTZUSD": lambda i: 100 + (i % 3), "IDLEUSD": lambda i: 10.0}, candles=20)
+    monkeypatch.setattr(market_routes, "market_analytics", analytics)
+    app = FastAPI()
+    app.include_router(market_routes.router, prefix="/market")
+
+    response = TestClient(app).get("/market/trends/correlation", params={"window": 14})
+    assert response.status_code == 200
+    body = json.loads(response.content)
+    idle = body["pairs"].index("IDLEUSD")
+    assert body["matrix"][idle] == [None, None]
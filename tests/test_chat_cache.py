@@ -0,0 +1,37 @@
+import pytest
+from utils.chat_cache import ChatResponseCache
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("¿Es buena idea invertir en bolsa?", "¿No es buena idea invertir en bolsa?"),
+    ("¿Cómo invierto 100 dólares?", "¿Cómo invierto 1000 dólares?"),
+    ("¿Debo pagar mis deudas antes de invertir?", "¿Debo invertir antes de pagar mis deudas?"),
+])
+def test_similar_questions_with_different_meaning_miss(cached, asked):
+    cache = ChatResponseCache(maxsize=16)
+    cache.set(cached, "respuesta")
+    assert cache.get(asked) is None
+    assert cache.semantic_hits == 0
+
+
+def test_rephrasing_with_same_meaning_hits():
+    cache = ChatResponseCache(maxsize=16)
+    cache.set("¿Cómo empiezo a invertir en criptomonedas?", "respuesta")
+    assert cache.get("Como empiezo a invertir en criptomoneda") == "respuesta"
+    assert cache.semantic_hits == 1
+
+
+def test_reported_pairs_miss_alongside_each_other():
+    cache = ChatResponseCache(maxsize=16)
+    cache.set("¿Es buena idea invertir en bolsa?", "sí")
+    cache.set("¿Cómo invierto 100 dólares?", "así")
+    assert cache.get("¿No es buena idea invertir en bolsa?") is None
+    assert cache.get("¿Cómo invierto 1000 dólares?") is None
+
+
+def test_evicted_question_no_longer_matches_rephrasings():
+    cache = ChatResponseCache(maxsize=1)
+    cache.set("¿Cómo empiezo a invertir en criptomonedas?", "respuesta")
+    cache.set("¿Qué es un ETF?", "otra")
+    assert cache.get("Como empiezo a invertir en criptomoneda") is None
+    assert cache.signatures == {("etf",): "que es un etf"}
@@ -0,0 +1,117 @@
+import asyncio
+import datetime
+import time
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+from utils import firebase_auth
+from utils.firebase_auth import FirebaseTokenVerifier
+
+PROJECT = "fintt-test"
+
+
+def signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+
+
+KEY, CERT = signing_key()
+OTHER_KEY, _ = signing_key()
+
+
+def token(key=KEY, kid="kid-1", **claims):
+    now = int(time.time())
+    payload = {"aud": PROJECT, "iss": f"https://securetoken.google.com/{PROJECT}", "sub": "user-1",
+               "iat": now, "exp": now + 3600, "auth_time": now, **claims}
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def verifier(monkeypatch):
+    verifier = FirebaseTokenVerifier(project_id=PROJECT, revocation_sample_rate=0)
+    verifier.set_certificates({"kid-1": CERT}, max_age=3600)
+
+    async def no_refresh():
+        verifier.cert_fetches += 1
+
+    monkeypatch.setattr(verifier, "_refresh_certs", no_refresh)
+    return verifier
+
+
+def test_valid_token_is_verified_once_and_cached(verifier, monkeypatch):
+    raw = token()
+    claims = asyncio.run(verifier.verify(raw))
+    assert claims["uid"] == "user-1"
+
+    monkeypatch.setattr(verifier, "decode", lambda *args: pytest.fail("cached claims were decoded again"))
+    assert asyncio.run(verifier.verify(raw))["uid"] == "user-1"
+    assert verifier.cert_fetches == 0
+
+
+@pytest.mark.parametrize("raw, error", [
+    (token(exp=int(time.time()) - 10), jwt.ExpiredSignatureError),
+    (token(aud="another-project"), jwt.InvalidAudienceError),
+    (token(iss="https://securetoken.google.com/another-project"), jwt.InvalidIssuerError),
+    (token(key=OTHER_KEY), jwt.InvalidSignatureError),
+    (token(sub=""), jwt.InvalidTokenError),
+    (token(auth_time=int(time.time()) + 600), jwt.InvalidTokenError),
+])
+def test_invalid_tokens_are_rejected(verifier, raw, error):
+    with pytest.raises(error):
+        asyncio.run(verifier.verify(raw))
+
+
+def test_unknown_key_id_refetches_certificates_then_fails(verifier):
+    with pytest.raises(jwt.InvalidTokenError, match="Unknown key id"):
+        asyncio.run(verifier.verify(token(kid="rotated")))
+    assert verifier.cert_fetches == 1
+
+
+def test_revoked_token_stays_denied_and_is_announced(verifier, monkeypatch):
+    announced = []
+    verifier.listeners.append(lambda key, exp: announced.append(key))
+    verifier.revocation_sample_rate = 1
+
+    async def revoked(claims):
+        return True
+
+    monkeypatch.setattr(verifier, "_is_revoked", revoked)
+    raw = token()
+    with pytest.raises(jwt.InvalidTokenError, match="revoked"):
+        asyncio.run(verifier.verify(raw))
+    assert len(announced) == 1
+
+    # Denied without another revocation check, even though the signature is still valid
+    verifier.revocation_sample_rate = 0
+    with pytest.raises(jwt.InvalidTokenError, match="revoked"):
+        asyncio.run(verifier.verify(raw))
+
+
+def test_verify_user_maps_failures_to_401(verifier, monkeypatch):
+    monkeypatch.setattr(firebase_auth, "token_verifier", verifier)
+    for header in (None, "Basic abc", f"Bearer {token(aud='another-project')}"):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(firebase_auth.verify_user(header))
+        assert error.value.status_code == 401
+    assert asyncio.run(firebase_auth.verify_user(f"Bearer {token()}"))["uid"] == "user-1"
+
+
+def test_require_admin_accepts_api_keys_and_admin_claims(verifier, monkeypatch):
+    monkeypatch.setattr(firebase_auth, "token_verifier", verifier)
+    monkeypatch.setattr(firebase_auth, "ADMIN_API_KEYS", ["secret"])
+
+    assert asyncio.run(firebase_auth.require_admin(None, "secret")) == {"api_key": True}
+    assert asyncio.run(firebase_auth.require_admin(f"Bearer {token(admin=True)}", None))["admin"] is True
+    for authorization, api_key, status in ((None, "wrong", 401), (f"Bearer {token()}", None, 403)):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(firebase_auth.require_admin(authorization, api_key))
+        assert error.value.status_code == status
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from utils import db as db_module
+from utils import loan_indexer as indexer_module
+from utils.db import Database
+from utils.loan_indexer import LoanEventIndexer
+
+
+class FakeChain:
+    """
+    JSON-RPC stand-in: block hashes by number and already-decoded loan logs.
+    """
+
+    def __init__(self, head):
+        self.head = head
+        self.hashes = {number: f"0xa{number}" for number in range(head + 1)}
+        self.logs = []
+
+    def add_loan(self, block, loan_id):
+        self.logs.append({"blockNumber": hex(block), "logIndex": "0x0", "blockHash": self.hashes[block],
+                          "transactionHash": f"0xT{loan_id}", "loan_id": loan_id})
+
+    def reorg(self, from_block, logs):
+        for number in range(from_block, self.head + 1):
+            self.hashes[number] = f"0xb{number}"
+        self.logs = [log for log in self.logs if int(log["blockNumber"], 16) < from_block]
+        for block, loan_id in logs:
+            self.add_loan(block, loan_id)
+
+    async def call(self, method, *params):
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        assert method == "eth_getLogs"
+        start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+        return [log for log in self.logs if start <= int(log["blockNumber"], 16) <= end]
+
+    async def batch(self, calls):
+        return [{"hash": self.hashes[int(params[0], 16)]} for _, params in calls]
+
+
+def decode_log(log):
+    return "LoanRequested", {"id": log["loan_id"], "borrower": "0xB0", "amount": 10 ** 18, "interestRate": 5}
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    monkeypatch.setattr(db_module, "DB_SQLITE_PATH", str(tmp_path / "loans.sqlite3"))
+    database = Database(backend="sqlite")
+    monkeypatch.setattr(indexer_module, "db", database)
+    monkeypatch.setattr(indexer_module, "decode_log", decode_log)
+    monkeypatch.setattr(indexer_module, "event_topics", dict)
+    return database
+
+
+def run(database, coro):
+    async def main():
+        try:
+            return await coro()
+        finally:
+            await database.close()
+    return asyncio.run(main())
+
+
+async def indexed_loans(database):
+    async with database.acquire() as conn:
+        rows = await conn.fetchall("SELECT loan_id, block_hash FROM loan_events ORDER BY block_number")
+    return [(row["loan_id"], row["block_hash"]) for row in rows]
+
+
+def indexer(chain):
+    return LoanEventIndexer(rpc=chain, contract_address="0xC0", chunk=5, parallel=2, confirmations=0)
+
+
+def test_reorg_rolls_back_to_the_last_matching_checkpoint_and_reindexes(database):
+    chain = FakeChain(head=20)
+    for block, loan_id in ((3, 1), (12, 2), (18, 3)):
+        chain.add_loan(block, loan_id)
+    loans = indexer(chain)
+    loans.cursor = 0
+
+    async def scenario():
+        await loans.ensure_schema()
+        assert await loans.sync() == 3
+        # Blocks from 14 on are replaced: loan 3 is gone and loan 4 landed in block 16
+        chain.reorg(14, [(16, 4)])
+        await loans.sync()
+        return await indexed_loans(database)
+
+    assert run(database, scenario) == [(1, "0xa3"), (2, "0xa12"), (4, "0xb16")]
+    assert loans.reorgs == 1
+    assert loans.cursor == 20
+
+
+def test_matching_chain_is_not_rolled_back(database):
+    chain = FakeChain(head=10)
+    chain.add_loan(4, 1)
+    loans = indexer(chain)
+    loans.cursor = 0
+
+    async def scenario():
+        await loans.ensure_schema()
+        await loans.sync()
+        chain.head = 12
+        chain.hashes.update({11: "0xa11", 12: "0xa12"})
+        chain.add_loan(12, 2)
+        await loans.sync()
+        return await indexed_loans(database)
+
+    assert run(database, scenario) == [(1, "0xa4"), (2, "0xa12")]
+    assert loans.reorgs == 0
+
+
+def test_reorg_deeper_than_every_checkpoint_rolls_back_past_the_oldest(database):
+    chain = FakeChain(head=10)
+    chain.add_loan(8, 1)
+    loans = indexer(chain)
+    loans.cursor = 5
+
+    async def scenario():
+        await loans.ensure_schema()
+        await loans.sync()
+        chain.reorg(6, [(9, 2)])
+        await loans.sync()
+        return await indexed_loans(database)
+
+    assert run(database, scenario) == [(2, "0xb9")]
+    assert loans.reorgs == 1
+
+
+def test_removed_logs_are_not_stored(database):
+    chain = FakeChain(head=5)
+    chain.add_loan(2, 1)
+    chain.add_loan(3, 2)
+    chain.logs[1]["removed"] = True
+    loans = indexer(chain)
+    loans.cursor = 0
+
+    async def scenario():
+        await loans.ensure_schema()
+        await loans.sync()
+        return await indexed_loans(database)
+
+    assert run(database, scenario) == [(1, "0xa2")]
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from utils.metrics import HTTP_REQUESTS
+from utils.observability import MetricsMiddleware
+
+
+def requests_for(route):
+    return HTTP_REQUESTS.labels("GET", route, "200")._value.get()
+
+
+def test_prefixed_route_is_labelled_with_its_prefix():
+    router = APIRouter()
+
+    @router.get("/orders/{order_id}")
+    async def get_order(order_id: str):
+        return {"id": order_id}
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router, prefix="/trade")
+    before = requests_for("/trade/orders/{order_id}")
+
+    assert TestClient(app).get("/trade/orders/abc").status_code == 200
+    assert requests_for("/trade/orders/{order_id}") == before + 1
+    assert requests_for("/orders/{order_id}") == 0
+
+
+def test_unprefixed_route_keeps_its_path():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/market/{symbol}")
+    async def market(symbol: str):
+        return {}
+
+    before = requests_for("/market/{symbol}")
+    TestClient(app).get("/market/BTC")
+    assert requests_for("/market/{symbol}") == before + 1
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import httpx
+import pytest
+from utils import order_pipeline as pipeline_module
+from utils.journal import Journal
+from utils.kraken_client import KrakenError
+from utils.order_pipeline import OrderPipeline, SUBMITTING, SUBMITTED, FAILED, UNKNOWN
+
+
+class FakeKraken:
+    """
+    Scripted AddOrder outcomes (a result dict, an exception, or a callable taking the cl_ord_id)
+    plus the orders Kraken knows by cl_ord_id.
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.placed = {}  # cl_ord_id -> (txid, info)
+        self.submissions = 0
+        self.lookup_error = None
+
+    async def execute_trade(self, pair, amount, action, cl_ord_id=None):
+        self.submissions += 1
+        outcome = self.outcomes.pop(0)
+        if callable(outcome):
+            outcome = outcome(cl_ord_id)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def find_order(self, cl_ord_id):
+        if self.lookup_error is not None:
+            raise self.lookup_error
+        return self.placed.get(cl_ord_id)
+
+
+@pytest.fixture
+def kraken(monkeypatch):
+    fake = FakeKraken()
+    monkeypatch.setattr(pipeline_module, "execute_trade", fake.execute_trade)
+    monkeypatch.setattr(pipeline_module, "find_order", fake.find_order)
+    monkeypatch.setattr(pipeline_module, "ORDER_BACKOFF_BASE", 0)
+    monkeypatch.setattr(pipeline_module, "ORDER_RECONCILE_DELAY", 0)
+    return fake
+
+
+def run(pipeline, coro):
+    async def main():
+        try:
+            return await coro(pipeline)
+        finally:
+            await pipeline.journal.close()
+    return asyncio.run(main())
+
+
+async def place(pipeline):
+    order = await pipeline.submit("XXBTZUSD", 0.1, "buy", user_id=1)
+    await pipeline._execute(order)
+    return order
+
+
+def test_rate_limited_order_is_retried(kraken, tmp_path):
+    kraken.outcomes = [KrakenError(["EAPI:Rate limit exceeded"]), {"txid": ["TX1"]}]
+    order = run(OrderPipeline(str(tmp_path / "orders.journal")), place)
+    assert order["status"] == SUBMITTED
+    assert order["result"] == {"txid": ["TX1"]}
+    assert kraken.submissions == 2
+
+
+def test_rejected_order_fails_without_retry(kraken, tmp_path):
+    kraken.outcomes = [KrakenError(["EOrder:Insufficient funds"])]
+    order = run(OrderPipeline(str(tmp_path / "orders.journal")), place)
+    assert order["status"] == FAILED
+    assert kraken.submissions == 1
+
+
+def test_timeout_after_the_order_was_placed_is_not_resubmitted(kraken, tmp_path):
+    def timeout_after_placing(cl_ord_id):
+        kraken.placed[cl_ord_id] = ("TX1", {"status": "closed", "vol_exec": "0.1", "descr": None})
+        return httpx.ReadTimeout("read timed out")
+
+    kraken.outcomes = [timeout_after_placing]
+    order = run(OrderPipeline(str(tmp_path / "orders.journal")), place)
+    assert order["status"] == SUBMITTED
+    assert order["result"]["txid"] == ["TX1"]
+    assert kraken.submissions == 1
+
+
+def test_timeout_before_the_order_was_placed_is_resubmitted(kraken, tmp_path):
+    kraken.outcomes = [httpx.ReadTimeout("read timed out"), {"txid": ["TX2"]}]
+    order = run(OrderPipeline(str(tmp_path / "orders.journal")), place)
+    assert order["status"] == SUBMITTED
+    assert order["result"] == {"txid": ["TX2"]}
+    assert kraken.submissions == 2
+
+
+def test_outcome_stays_unknown_while_lookups_fail(kraken, tmp_path):
+    kraken.outcomes = [httpx.RemoteProtocolError("connection dropped")]
+    kraken.lookup_error = httpx.ConnectError("unreachable")
+    order = run(OrderPipeline(str(tmp_path / "orders.journal")), place)
+    assert order["status"] == UNKNOWN
+    assert kraken.submissions == 1
+
+
+def test_order_interrupted_mid_submission_is_reconciled_on_restart(kraken, tmp_path):
+    path = tmp_path / "orders.journal"
+    interrupted = {"id": "order-1", "idempotency_key": "key", "user_id": 1, "pair": "XXBTZUSD",
+                   "amount": 0.1, "action": "buy", "status": SUBMITTING, "attempts": 1, "result": None,
+                   "error": None, "created_at": 0, "updated_at": 0}
+    path.write_text(json.dumps(interrupted) + "\n")
+    kraken.placed["order-1"] = ("TX1", {"status": "closed", "vol_exec": "0.1", "descr": None})
+
+    async def recover(pipeline):
+        pipeline._recover()
+        assert pipeline.queue.get_nowait() == "order-1"
+        assert pipeline.idempotency_keys[(1, "key")] == "order-1"
+        order = pipeline.get("order-1")
+        await pipeline._execute(order)
+        return order
+
+    order = run(OrderPipeline(str(path)), recover)
+    assert order["status"] == SUBMITTED
+    assert kraken.submissions == 0
+    assert Journal(str(path)).load()["order-1"]["status"] == SUBMITTED
+
+
+def test_repeated_idempotency_key_returns_the_original_order(kraken, tmp_path):
+    async def submit_twice(pipeline):
+        first = await pipeline.submit("XXBTZUSD", 0.1, "buy", "key", user_id=1)
+        again = await pipeline.submit("XXBTZUSD", 0.1, "buy", "key", user_id=1)
+        other_user = await pipeline.submit("XXBTZUSD", 0.1, "buy", "key", user_id=2)
+        return first, again, other_user
+
+    first, again, other_user = run(OrderPipeline(str(tmp_path / "orders.journal")), submit_twice)
+    assert again is first
+    assert other_user["id"] != first["id"]
@@ -0,0 +1,91 @@
+import asyncio
+from utils import stripe_events as stripe_module
+from utils.journal import Journal
+from utils.stripe_events import StripeEventProcessor, SubscriptionStateCache, PROCESSED, QUEUED, FAILED
+
+
+def event(event_id, event_type="customer.subscription.updated", created=1, status="active"):
+    return {"id": event_id, "type": event_type, "created": created, "data": {"object": {
+        "id": "sub_1", "customer": "cus_1", "status": status, "metadata": {"user_id": "u1", "plan": "pro"},
+    }}}
+
+
+def run(processor, coro):
+    async def main():
+        try:
+            return await coro(processor)
+        finally:
+            await processor.stop()
+    return asyncio.run(main())
+
+
+def test_event_is_journaled_before_processing_and_duplicates_are_dropped(tmp_path):
+    path = str(tmp_path / "stripe.journal")
+
+    async def deliver_twice(processor):
+        assert await processor.enqueue(event("evt_1"))
+        assert Journal(path).load()["evt_1"]["status"] == QUEUED
+        assert not await processor.enqueue(event("evt_1"))
+        await processor._process(processor.events[processor.queue.get_nowait()])
+
+    processor = StripeEventProcessor(SubscriptionStateCache(), path)
+    run(processor, deliver_twice)
+    assert processor.duplicates == 1
+    assert processor.state.is_active("u1")
+    assert Journal(path).load()["evt_1"]["status"] == PROCESSED
+
+
+def test_restart_rebuilds_state_and_still_drops_redeliveries(tmp_path):
+    path = str(tmp_path / "stripe.journal")
+
+    async def deliver(processor):
+        await processor.enqueue(event("evt_1", created=1))
+        await processor.enqueue(event("evt_2", created=2, status="past_due"))
+        while not processor.queue.empty():
+            await processor._process(processor.events[processor.queue.get_nowait()])
+
+    run(StripeEventProcessor(SubscriptionStateCache(), path), deliver)
+
+    async def restart(processor):
+        processor._recover()
+        return await processor.enqueue(event("evt_1", created=1))
+
+    restarted = StripeEventProcessor(SubscriptionStateCache(), path)
+    assert run(restarted, restart) is False
+    assert restarted.state.get("u1")["status"] == "past_due"
+    assert restarted.queue.empty()
+
+
+def test_out_of_order_event_does_not_override_newer_state(tmp_path):
+    async def deliver(processor):
+        await processor.enqueue(event("evt_2", created=2, status="canceled",
+                                      event_type="customer.subscription.deleted"))
+        await processor.enqueue(event("evt_1", created=1))
+        while not processor.queue.empty():
+            await processor._process(processor.events[processor.queue.get_nowait()])
+
+    processor = StripeEventProcessor(SubscriptionStateCache(), str(tmp_path / "stripe.journal"))
+    run(processor, deliver)
+    assert processor.state.get("u1")["status"] == "canceled"
+
+
+def test_failing_listener_is_retried_then_marked_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(stripe_module, "STRIPE_EVENT_MAX_ATTEMPTS", 2)
+
+    def broken_listener(user_id, state):
+        raise RuntimeError("database down")
+
+    async def deliver(processor):
+        processor.listeners.append(broken_listener)
+        await processor.enqueue(event("evt_1"))
+        entry = processor.events[processor.queue.get_nowait()]
+        await processor._process(entry)
+        assert entry["status"] == QUEUED and entry["retry_at"] is not None
+        assert len(processor._retries) == 1
+        await processor._process(entry)
+        return entry
+
+    entry = run(StripeEventProcessor(SubscriptionStateCache(), str(tmp_path / "stripe.journal")), deliver)
+    assert entry["status"] == FAILED
+    assert entry["attempts"] == 2
+    assert entry["error"] == "database down"
@@ -0,0 +1,280 @@
+import os
+import time
+import asyncio
+import logging
+import numpy as np
+from utils.candle_store import INTERVAL_SECONDS, candle_store
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CANDLE_SECONDS = int(os.getenv("ANALYTICS_CANDLE_SECONDS", 60))
+ANALYTICS_HISTORY = int(os.getenv("ANALYTICS_HISTORY", 1440))
+ANALYTICS_REFERENCE_PAIR = os.getenv("ANALYTICS_REFERENCE_PAIR", "XXBTZUSD")
+# Persist closed candles to the local candle store and reload them at startup
+ANALYTICS_PERSIST = os.getenv("ANALYTICS_PERSIST", "true").lower() == "true"
+
+OPEN, HIGH, LOW, CLOSE = range(4)
+
+
+class CandleHistory:
+    """
+    Columnar OHLC ring buffer for every pair: shape (4, pairs, 2 * capacity).
+    Each candle is written twice, `capacity` apart, so the latest `n` candles
+    are always a contiguous slice (a view, no copy).
+    """
+
+    def __init__(self, capacity=ANALYTICS_HISTORY, pairs=64):
+        self.capacity = capacity
+        self.index = {}  # pair -> row
+        self.names = []
+        self.data = np.full((4, pairs, 2 * capacity), np.nan)
+        self.head = 0  # next write position in [0, capacity)
+        self.count = 0
+
+    def row(self, pair: str) -> int:
+        row = self.index.get(pair)
+        if row is None:
+            row = len(self.names)
+            if row == self.data.shape[1]:
+                grown = np.full((4, row * 2, 2 * self.capacity), np.nan)
+                grown[:, :row] = self.data
+                self.data = grown
+            self.index[pair] = row
+            self.names.append(pair)
+        return row
+
+    def append(self, candles: np.ndarray):
+        """
+        Appends one candle per known pair; `candles` has shape (4, len(self.names)).
+        """
+        n = len(self.names)
+        self.data[:, :n, self.head] = candles
+        self.data[:, :n, self.head + self.capacity] = candles
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def last(self, n: int, field: int = CLOSE) -> np.ndarray:
+        """
+        View of the last `n` candles of one field, shape (pairs, n), oldest first.
+        """
+        n = min(n, self.count)
+        end = self.head + self.capacity
+        return self.data[field, :len(self.names), end - n:end]
+
+
+class MarketAnalytics:
+    """
+    Builds candles from streamed ticker prices and computes trend indicators
+    for the whole universe at once. Results are cached per window until the next candle closes.
+    """
+
+    def __init__(self, candle_seconds=ANALYTICS_CANDLE_SECONDS, capacity=ANALYTICS_HISTORY, store=None):
+        self.candle_seconds = candle_seconds
+        self.store = store
+        # Only one worker writes closed candles; the others read the store on restore
+        self.persist = True
+        # Candle store interval name, e.g. "1min"; None if the candle size has no name
+        self.interval = next((name for name, seconds in INTERVAL_SECONDS.items() if seconds == candle_seconds), None)
+        self.history = CandleHistory(capacity)
+        self.current = np.full((4, self.history.data.shape[1]), np.nan)
+        self.bucket = None
+        self.version = 0
+        self.cache = {}
+        self._subscription = None
+        self._tasks = []
+
+    def on_price(self, pair: str, price: float, now: float = None):
+        now = time.time() if now is None else now
+        bucket = int(now // self.candle_seconds)
+        if self.bucket is None:
+            self.bucket = bucket
+        while bucket > self.bucket:
+            self._close_candle()
+            self.bucket += 1
+
+        row = self.history.row(pair)
+        if row >= self.current.shape[1]:
+            grown = np.full((4, self.history.data.shape[1]), np.nan)
+            grown[:, :self.current.shape[1]] = self.current
+            self.current = grown
+        candle = self.current[:, row]
+        if np.isnan(candle[OPEN]):
+            candle[OPEN] = candle[HIGH] = candle[LOW] = price
+        else:
+            candle[HIGH] = max(candle[HIGH], price)
+            candle[LOW] = min(candle[LOW], price)
+        candle[CLOSE] = price
+
+    def _close_candle(self):
+        n = len(self.history.names)
+        candles = self.current[:, :n].copy()
+        # Pairs without ticks in this bucket carry the previous close forward
+        if self.history.count:
+            previous_close = self.history.last(1)[:, 0]
+            idle = np.isnan(candles[CLOSE])
+            candles[:, idle] = previous_close[idle]
+        self.history.append(candles)
+        self.current[:] = np.nan
+        self.version += 1
+        self.cache.clear()
+        if self.store is not None and self.persist and self.interval and self._tasks:
+            asyncio.create_task(asyncio.to_thread(
+                self._persist, self.bucket * self.candle_seconds, list(self.history.names), candles
+            ))
+
+    def _persist(self, ts, names, candles):
+        try:
+            for row, pair in enumerate(names):
+                if np.isnan(candles[CLOSE, row]):
+                    continue
+                self.store.write(pair, self.interval, {
+                    "ts": [ts],
+                    "open": [candles[OPEN, row]],
+                    "high": [candles[HIGH, row]],
+                    "low": [candles[LOW, row]],
+                    "close": [candles[CLOSE, row]],
+                    "volume": [0.0],
+                })
+        except Exception as e:
+            logger.error(f"Error persisting candles: {e}")
+
+    def restore(self):
+        """
+        Reloads the most recent candles from the candle store so indicators survive restarts.
+        """
+        if self.store is None or not self.interval:
+            return
+        end_bucket = int(time.time() // self.candle_seconds)
+        start_bucket = end_bucket - self.history.capacity
+        pairs = self.store.symbols(self.interval)
+        if not pairs:
+            return
+        rows = [self.history.row(pair) for pair in pairs]
+        restored = np.full((4, len(self.history.names), self.history.capacity), np.nan)
+        for pair, row in zip(pairs, rows):
+            columns = self.store.range(pair, self.interval, start_bucket * self.candle_seconds,
+                                       end_bucket * self.candle_seconds - 1)
+            positions = columns["ts"] // self.candle_seconds - start_bucket
+            for field, name in ((OPEN, "open"), (HIGH, "high"), (LOW, "low"), (CLOSE, "close")):
+                restored[field, row, positions] = columns[name]
+        for i in range(self.history.capacity):
+            self.history.append(restored[:, :, i])
+        self.bucket = end_bucket
+        if len(self.history.names) > self.current.shape[1]:
+            self.current = np.full((4, self.history.data.shape[1]), np.nan)
+        logger.info(f"Restored {len(pairs)} pairs of {self.interval} candles")
+
+    def trends(self, window: int) -> dict:
+        """
+        Indicators over the last `window` candles for every pair with enough history.
+        """
+        cached = self.cache.get(window)
+        if cached is not None:
+            return cached
+
+        closes = self.history.last(window + 1)
+        names = np.array(self.history.names)
+        if closes.shape[1] < window + 1:
+            result = {"window": window, "candles": closes.shape[1], "pairs": []}
+            self.cache[window] = result
+            return result
+
+        valid = ~np.isnan(closes).any(axis=1) & (closes > 0).all(axis=1)
+        closes, names = closes[valid], names[valid]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = (closes[:, -1] / closes[:, 0] - 1) * 100
+            sma = closes[:, 1:].mean(axis=1)
+            returns = np.diff(np.log(closes), axis=1)
+            volatility = returns.std(axis=1) * 100
+
+            diffs = np.diff(closes, axis=1)
+            avg_gain = np.clip(diffs, 0, None).mean(axis=1)
+            avg_loss = np.clip(-diffs, 0, None).mean(axis=1)
+            rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+            # No movement at all is neutral, not overbought
+            rsi[(avg_gain == 0) & (avg_loss == 0)] = 50.0
+
+            correlation = self._correlation(returns)
+            reference = np.flatnonzero(names == ANALYTICS_REFERENCE_PAIR)
+            to_reference = correlation[:, reference[0]] if reference.size else np.full(len(names), np.nan)
+
+        pairs = [
+            {
+                "pair": str(name),
+                "percentage_change": float(change[i]),
+                "sma": float(sma[i]),
+                "volatility": float(volatility[i]),
+                "rsi": float(rsi[i]),
+                "correlation": None if np.isnan(to_reference[i]) else float(to_reference[i]),
+            }
+            for i, name in enumerate(names)
+        ]
+        result = {"window": window, "candles": window + 1, "pairs": pairs,
+                  "names": names.tolist(), "correlation_matrix": correlation}
+        self.cache[window] = result
+        return result
+
+    @staticmethod
+    def _correlation(returns: np.ndarray) -> np.ndarray:
+        """
+        Pearson correlation matrix. Pairs without variance (e.g. idle pairs carried
+        forward) have no defined correlation: their rows and columns are NaN.
+        """
+        centered = returns - returns.mean(axis=1, keepdims=True)
+        norms = np.sqrt((centered ** 2).sum(axis=1))
+        flat = norms == 0
+        standardized = centered / np.where(flat, 1, norms)[:, None]
+        correlation = standardized @ standardized.T
+        correlation[flat, :] = np.nan
+        correlation[:, flat] = np.nan
+        return correlation
+
+    async def _follow_prices(self, subscription):
+        while True:
+            for update in await subscription.next_batch():
+                if "last_price" in update:
+                    self.on_price(update["crypto"], float(update["last_price"]))
+
+    async def _tick(self):
+        # Closes candles on time even when no price arrives
+        while True:
+            await asyncio.sleep(self.candle_seconds)
+            if self.bucket is not None:
+                bucket = int(time.time() // self.candle_seconds)
+                while bucket > self.bucket:
+                    self._close_candle()
+                    self.bucket += 1
+
+    def start(self, broadcaster):
+        try:
+            self.restore()
+        except Exception as e:
+            logger.error(f"Error restoring candles: {e}")
+        self._subscription = broadcaster.subscribe()
+        self._tasks = [
+            asyncio.create_task(self._follow_prices(self._subscription)),
+            asyncio.create_task(self._tick()),
+        ]
+
+    async def stop(self, broadcaster):
+        if self._tasks:
+            broadcaster.unsubscribe(self._subscription)
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+    def stats(self):
+        return {
+            "pairs": len(self.history.names),
+            "candles": self.history.count,
+            "capacity": self.history.capacity,
+            "candle_seconds": self.candle_seconds,
+            "version": self.version,
+            "cached_windows": sorted(self.cache),
+        }
+
+
+# Shared engine for the whole process
+market_analytics = MarketAnalytics(store=candle_store if ANALYTICS_PERSIST else None)
@@ -0,0 +1,52 @@
+import asyncio
+
+
+class Subscription:
+    """
+    Pending updates for one client. A newer update for the same key replaces the
+    older one, so a slow client only ever holds one entry per key.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.event = asyncio.Event()
+
+    def push(self, key, value):
+        self.pending[key] = value
+        self.event.set()
+
+    async def next_batch(self):
+        await self.event.wait()
+        self.event.clear()
+        batch, self.pending = self.pending, {}
+        return list(batch.values())
+
+
+class Broadcaster:
+    """
+    Fans one upstream feed out to many clients without blocking the publisher.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.published = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, key, value):
+        self.published += 1
+        for subscription in self.subscribers:
+            subscription.push(key, value)
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "published": self.published}
+
+
+# Market updates shared by the ingest loop and the streaming endpoint
+market_updates = Broadcaster()
@@ -0,0 +1,119 @@
+import os
+import json
+import base64
+import datetime
+from decimal import Decimal
+from utils.db import db
+
+# Most owner ids accepted by one bulk request; dashboards split larger sets
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", 5000))
+BULK_PAGE_SIZE = int(os.getenv("BULK_PAGE_SIZE", 500))
+BULK_MAX_PAGE_SIZE = int(os.getenv("BULK_MAX_PAGE_SIZE", 5000))
+
+
+def encode_cursor(owner, key) -> str:
+    raw = json.dumps([owner, key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        owner, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return owner, key
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class KeysetQuery:
+    """
+    Rows of one table for many owners, ordered by (owner, id). Each page is an index
+    range seek that resumes after the last key returned, so page N costs the same as
+    page 1 and nothing is skipped or repeated when rows are added between pages.
+
+        rows, cursor = await wallets_query.page([1, 2, 3], fields=["currency", "balance"])
+    """
+
+    def __init__(self, table: str, fields, owner="user_id", key="id"):
+        self.table = table
+        self.fields = tuple(fields)
+        self.owner = owner
+        self.key = key
+
+    def projection(self, fields=None):
+        """
+        Requested columns, validated against the allowed ones (all of them by default).
+        """
+        if not fields:
+            return list(self.fields)
+        unknown = [field for field in fields if field not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return list(dict.fromkeys(fields))
+
+    def _owners(self, owners):
+        owners = sorted(set(owners))
+        if not owners:
+            raise ValueError("No ids given")
+        if len(owners) > BULK_MAX_IDS:
+            raise ValueError(f"At most {BULK_MAX_IDS} ids per request")
+        return owners
+
+    async def _fetch(self, owners, columns, limit, after=None, where=""):
+        placeholders = ", ".join(["%s"] * len(owners))
+        params = list(owners)
+        query = f"SELECT {', '.join(columns)} FROM {self.table} WHERE {self.owner} IN ({placeholders}){where}"
+        if after is not None:
+            # Expanded instead of a row comparison, which MySQL does not always turn into a range
+            query += f" AND ({self.owner} > %s OR ({self.owner} = %s AND {self.key} > %s))"
+            params += [after[0], after[0], after[1]]
+        query += f" ORDER BY {self.owner}, {self.key} LIMIT %s"
+        params.append(limit)
+        async with db.acquire() as conn:
+            return await conn.fetchall(query, tuple(params))
+
+    def _columns(self, fields):
+        return list(dict.fromkeys([self.owner, self.key, *fields]))
+
+    async def page(self, owners, fields=None, limit=BULK_PAGE_SIZE, cursor=None, where=""):
+        """
+        Returns (rows with only the requested fields, cursor for the next page or None).
+        """
+        owners = self._owners(owners)
+        fields = self.projection(fields)
+        limit = max(1, min(limit, BULK_MAX_PAGE_SIZE))
+        after = decode_cursor(cursor) if cursor else None
+        rows = await self._fetch(owners, self._columns(fields), limit + 1, after, where)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][self.owner], rows[-1][self.key])
+        return [{field: row[field] for field in fields} for row in rows], next_cursor
+
+    async def export(self, owners, fields=None, page_size=BULK_PAGE_SIZE, where=""):
+        """
+        Yields NDJSON, one chunk per page. Only one page is held in memory and the
+        database connection is released between pages.
+        """
+        owners = self._owners(owners)
+        fields = self.projection(fields)
+        columns = self._columns(fields)
+        page_size = max(1, min(page_size, BULK_MAX_PAGE_SIZE))
+        after = None
+        while True:
+            rows = await self._fetch(owners, columns, page_size, after, where)
+            if not rows:
+                return
+            yield "".join(
+                json.dumps({field: row[field] for field in fields}, default=_json_default) + "\n" for row in rows
+            )
+            if len(rows) < page_size:
+                return
+            after = (rows[-1][self.owner], rows[-1][self.key])
@@ -0,0 +1,192 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "data/candles")
+# Series kept open (with their memmaps) at once; the least recently used are dropped first
+CANDLE_STORE_OPEN_SERIES = int(os.getenv("CANDLE_STORE_OPEN_SERIES", 256))
+
+FIELDS = ("ts", "open", "high", "low", "close", "volume")
+DTYPES = {"ts": np.int64, "open": np.float64, "high": np.float64, "low": np.float64,
+          "close": np.float64, "volume": np.float64}
+
+INTERVAL_SECONDS = {"1min": 60, "5min": 300, "15min": 900, "30min": 1800, "60min": 3600,
+                    "4h": 14400, "1d": 86400}
+
+
+def interval_seconds(interval: str) -> int:
+    if interval not in INTERVAL_SECONDS:
+        raise ValueError(f"Unknown interval {interval}")
+    return INTERVAL_SECONDS[interval]
+
+
+class Series:
+    """
+    One (symbol, interval) series: a directory with one raw little-endian file per column.
+    Columns are read through np.memmap, so slices are views over the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._columns = None
+
+    def _file(self, field: str) -> str:
+        return os.path.join(self.path, f"{field}.bin")
+
+    def __len__(self):
+        return len(self.columns()["ts"])
+
+    def columns(self) -> dict:
+        if self._columns is None:
+            lengths = []
+            for field in FIELDS:
+                size = os.path.getsize(self._file(field)) if os.path.exists(self._file(field)) else 0
+                lengths.append(size // np.dtype(DTYPES[field]).itemsize)
+            # A crash between column appends leaves some files longer; ignore the partial row
+            rows = min(lengths)
+            self._columns = {
+                field: (np.memmap(self._file(field), dtype=DTYPES[field], mode="r", shape=(rows,))
+                        if rows else np.empty(0, dtype=DTYPES[field]))
+                for field in FIELDS
+            }
+        return self._columns
+
+    def last_ts(self):
+        ts = self.columns()["ts"]
+        return int(ts[-1]) if len(ts) else None
+
+    def append(self, rows: dict):
+        os.makedirs(self.path, exist_ok=True)
+        rows_before = len(self)
+        for field in FIELDS:
+            # Drop any partial tail first so columns stay aligned
+            with open(self._file(field), "ab") as f:
+                f.truncate(rows_before * np.dtype(DTYPES[field]).itemsize)
+                f.write(np.ascontiguousarray(rows[field], dtype=DTYPES[field]).tobytes())
+        self._columns = None
+
+    def rewrite(self, rows: dict):
+        os.makedirs(self.path, exist_ok=True)
+        for field in FIELDS:
+            tmp = self._file(field) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(np.ascontiguousarray(rows[field], dtype=DTYPES[field]).tobytes())
+            os.replace(tmp, self._file(field))
+        self._columns = None
+
+
+class CandleStore:
+    """
+    Append-only columnar candle files keyed by (symbol, interval).
+    """
+
+    def __init__(self, root=CANDLE_STORE_DIR, max_series=CANDLE_STORE_OPEN_SERIES):
+        self.root = root
+        self.max_series = max_series
+        self.series = OrderedDict()
+        self._lock = threading.Lock()
+        self._series_lock = threading.Lock()
+
+    def _series(self, symbol: str, interval: str) -> Series:
+        key = (symbol, interval)
+        with self._series_lock:
+            series = self.series.get(key)
+            if series is None:
+                safe = re.sub(r"[^A-Za-z0-9_.-]", "_", symbol)
+                # "." and ".." would resolve outside the symbol's own directory
+                if not safe.strip("."):
+                    raise ValueError(f"Invalid symbol {symbol!r}")
+                series = self.series[key] = Series(os.path.join(self.root, safe, interval))
+                while len(self.series) > self.max_series:
+                    self.series.popitem(last=False)
+            else:
+                self.series.move_to_end(key)
+            return series
+
+    def symbols(self, interval: str):
+        if not os.path.isdir(self.root):
+            return []
+        return [name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name, interval))]
+
+    def write(self, symbol: str, interval: str, rows: dict):
+        """
+        Merges candles (dict of equal-length columns). New candles after the last stored
+        timestamp are appended; anything older (a backfilled gap) triggers a rewrite.
+        """
+        ts = np.asarray(rows["ts"], dtype=np.int64)
+        if not len(ts):
+            return
+        order = np.argsort(ts, kind="stable")
+        rows = {field: np.asarray(rows[field], dtype=DTYPES[field])[order] for field in FIELDS}
+
+        with self._lock:
+            series = self._series(symbol, interval)
+            last = series.last_ts()
+            if last is None or rows["ts"][0] > last:
+                series.append(rows)
+                return
+
+            existing = series.columns()
+            merged = {field: np.concatenate([existing[field], rows[field]]) for field in FIELDS}
+            # Keep the newest value for duplicate timestamps
+            _, reverse_index = np.unique(merged["ts"][::-1], return_index=True)
+            keep = len(merged["ts"]) - 1 - reverse_index
+            series.rewrite({field: merged[field][keep] for field in FIELDS})
+
+    def range(self, symbol: str, interval: str, start: int = None, end: int = None) -> dict:
+        """
+        Zero-copy column slices with start <= ts <= end.
+        """
+        columns = self._series(symbol, interval).columns()
+        ts = columns["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="right"))
+        return {field: columns[field][lo:hi] for field in FIELDS}
+
+    def gaps(self, symbol: str, interval: str, start: int, end: int):
+        """
+        Missing [from, to] timestamp ranges within [start, end].
+        """
+        step = interval_seconds(interval)
+        ts = self.range(symbol, interval, start, end)["ts"]
+        if not len(ts):
+            return [(start, end)]
+        gaps = []
+        if ts[0] - start >= step:
+            gaps.append((start, int(ts[0]) - step))
+        holes = np.flatnonzero(np.diff(ts) > step)
+        gaps.extend((int(ts[i]) + step, int(ts[i + 1]) - step) for i in holes)
+        if end - ts[-1] >= step:
+            gaps.append((int(ts[-1]) + step, end))
+        return gaps
+
+    @staticmethod
+    def downsample(columns: dict, seconds: int) -> dict:
+        ts = columns["ts"]
+        if not len(ts):
+            return {field: np.asarray(columns[field]) for field in FIELDS}
+        buckets = ts // seconds * seconds
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+        ends = np.concatenate([starts[1:], [len(ts)]]) - 1
+        return {
+            "ts": buckets[starts],
+            "open": np.asarray(columns["open"])[starts],
+            "high": np.maximum.reduceat(columns["high"], starts),
+            "low": np.minimum.reduceat(columns["low"], starts),
+            "close": np.asarray(columns["close"])[ends],
+            "volume": np.add.reduceat(columns["volume"], starts),
+        }
+
+
+def rows_from_tuples(candles) -> dict:
+    """
+    [(ts, open, high, low, close, volume), ...] -> columns.
+    """
+    columns = list(zip(*candles)) if candles else [[] for _ in FIELDS]
+    return {field: np.asarray(values, dtype=DTYPES[field]) for field, values in zip(FIELDS, columns)}
+
+
+# Shared store for the whole process
+candle_store = CandleStore()
@@ -0,0 +1,125 @@
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from utils.intents import fold_word
+from utils.metrics import CHAT_CACHE_REQUESTS, CHAT_CACHE_SIZE
+
+CHAT_CACHE_SIZE_MAX = int(os.getenv("CHAT_CACHE_SIZE", 5000))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", 86400))
+# Answers about prices or current events go stale quickly
+CHAT_CACHE_VOLATILE_TTL = float(os.getenv("CHAT_CACHE_VOLATILE_TTL", 300))
+
+VOLATILE_TERMS = ("precio", "cotiza", "hoy", "ahora", "actual", "price", "today", "now")
+# Words that flip the meaning of a question; "t" is what normalize() leaves of "don't"
+NEGATIONS = {"no", "ni", "nunca", "jamas", "tampoco", "sin", "not", "never", "nor", "without", "t"}
+# Ignored when comparing meaning (negations are never ignored)
+STOPWORDS = {
+    "a", "al", "de", "del", "el", "la", "las", "lo", "los", "un", "una", "unos", "unas", "en", "es", "son",
+    "que", "me", "mi", "mis", "por", "para", "con", "y", "o", "se", "su", "sus",
+    "the", "an", "of", "in", "on", "to", "is", "are", "my", "for", "and", "or", "it", "do", "does",
+}
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase, strip accents and punctuation, collapse whitespace.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def signature(text: str) -> tuple:
+    """
+    What two normalized questions must share to share an answer: numbers, negations and
+    the order of the plural-folded content words. "100" vs "1000", "es" vs "no es" and
+    "pay debt before investing" vs the reverse all differ.
+    """
+    return tuple(fold_word(word) for word in text.split() if word not in STOPWORDS or word in NEGATIONS)
+
+
+def freshness_ttl(question: str, answer: str) -> float:
+    text = f"{question} {normalize(answer)}"
+    return CHAT_CACHE_VOLATILE_TTL if any(term in text for term in VOLATILE_TERMS) else CHAT_CACHE_TTL
+
+
+class ChatResponseCache:
+    """
+    Two-tier answer cache: exact match on normalized text, then a lookup by signature,
+    which catches rephrasings that differ only in accents, punctuation, stopwords or plurals.
+    Bounded by LRU with a per-answer TTL.
+    """
+
+    def __init__(self, maxsize=CHAT_CACHE_SIZE_MAX):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # normalized question -> (signature, answer, expires_at)
+        self.signatures = {}  # signature -> most recently cached normalized question
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _remove(self, key):
+        expected, _, _ = self.entries.pop(key)
+        if self.signatures.get(expected) == key:
+            del self.signatures[expected]
+
+    def _hit(self, key):
+        _, answer, expires_at = self.entries[key]
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return answer
+
+    def get(self, question: str):
+        key = normalize(question)
+        if key in self.entries:
+            answer = self._hit(key)
+            if answer is not None:
+                self.exact_hits += 1
+                CHAT_CACHE_REQUESTS.labels("exact").inc()
+                return answer
+
+        similar = self.signatures.get(signature(key))
+        if similar is not None:
+            answer = self._hit(similar)
+            if answer is not None:
+                self.semantic_hits += 1
+                CHAT_CACHE_REQUESTS.labels("semantic").inc()
+                return answer
+
+        self.misses += 1
+        CHAT_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    def set(self, question: str, answer: str, ttl: float = None):
+        key = normalize(question)
+        if not key or not answer:
+            return
+        if key in self.entries:
+            self._remove(key)
+        if len(self.entries) >= self.maxsize:
+            self._remove(next(iter(self.entries)))
+        expected = signature(key)
+        self.signatures[expected] = key
+        ttl = freshness_ttl(key, answer) if ttl is None else ttl
+        self.entries[key] = (expected, answer, time.time() + ttl)
+        CHAT_CACHE_SIZE.set(len(self.entries))
+
+    def stats(self):
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "maxsize": self.maxsize,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / total if total else 0,
+        }
+
+
+# Shared cache for every chat handler
+chat_cache = ChatResponseCache()
@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import logging
+from utils.metrics import DEPENDENCY_READY, DEPENDENCY_INIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Per-dependency budget for a readiness check
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 2))
+# Readiness check results are reused for this long so probes don't hammer dependencies
+HEALTH_CHECK_CACHE_SECONDS = float(os.getenv("HEALTH_CHECK_CACHE_SECONDS", 5))
+# Background warm-up retries failed dependencies with exponential backoff up to this cap
+DEPENDENCY_RETRY_MAX_SECONDS = float(os.getenv("DEPENDENCY_RETRY_MAX_SECONDS", 30))
+
+
+class Dependency:
+    def __init__(self, name, factory, close=None, check=None, required=False, warm=True):
+        self.name = name
+        self.factory = factory
+        self.close = close
+        self.check = check
+        self.required = required
+        self.warm = warm
+        self.instance = None
+        self.state = "pending"  # pending -> starting -> ready | failed
+        self.error = None
+        self.init_seconds = None
+        self.lock = asyncio.Lock()
+        self.checked_at = 0
+        self.check_result = None
+
+
+class Container:
+    """
+    Lazily created clients for external services. Nothing is built at import time:
+    a dependency is created on first get(), or concurrently in the background by
+    start(), so one unreachable service neither crashes the worker nor delays the
+    others.
+
+        container.register("stripe", create_stripe, required=False)
+        stripe = await container.get("stripe")
+
+    Factories are zero-argument coroutine functions; blocking SDK setup belongs in
+    asyncio.to_thread inside the factory.
+    """
+
+    def __init__(self):
+        self.dependencies = {}
+        self.started_at = None
+        self._warm_task = None
+
+    def register(self, name: str, factory, close=None, check=None, required=False, warm=True):
+        """
+        close(instance) runs on shutdown; check(instance) -> bool backs readiness.
+        Required dependencies gate /health/ready.
+        """
+        self.dependencies[name] = Dependency(name, factory, close, check, required, warm)
+        DEPENDENCY_READY.labels(name).set(0)
+
+    async def get(self, name: str):
+        dependency = self.dependencies[name]
+        if dependency.state == "ready":
+            return dependency.instance
+        async with dependency.lock:
+            if dependency.state == "ready":
+                return dependency.instance
+            dependency.state = "starting"
+            start = time.perf_counter()
+            try:
+                dependency.instance = await dependency.factory()
+            except Exception as err:
+                dependency.state = "failed"
+                dependency.error = str(err) or type(err).__name__
+                raise
+            except BaseException:
+                # Caller cancelled mid-creation: the next get() starts over instead of seeing "starting" forever
+                dependency.state = "pending"
+                raise
+            dependency.init_seconds = time.perf_counter() - start
+            dependency.state = "ready"
+            dependency.error = None
+            DEPENDENCY_READY.labels(name).set(1)
+            DEPENDENCY_INIT_SECONDS.labels(name).set(dependency.init_seconds)
+            logger.info(f"Dependency {name} ready in {dependency.init_seconds * 1000:.0f} ms")
+            return dependency.instance
+
+    def peek(self, name: str):
+        """
+        The instance if already created, without triggering creation.
+        """
+        dependency = self.dependencies[name]
+        return dependency.instance if dependency.state == "ready" else None
+
+    async def _warm_one(self, dependency: Dependency):
+        delay = 1
+        while True:
+            try:
+                await self.get(dependency.name)
+                return
+            except Exception as err:
+                logger.error(f"Dependency {dependency.name} failed to start, retrying in {delay}s: {err}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DEPENDENCY_RETRY_MAX_SECONDS)
+
+    async def _warm(self):
+        await asyncio.gather(*(self._warm_one(d) for d in self.dependencies.values() if d.warm))
+
+    def start(self):
+        """
+        Begins creating every warm dependency in the background and returns at once.
+        """
+        self.started_at = time.monotonic()
+        if self._warm_task is None:
+            self._warm_task = asyncio.create_task(self._warm())
+
+    async def close(self):
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            await asyncio.gather(self._warm_task, return_exceptions=True)
+            self._warm_task = None
+        for dependency in reversed(list(self.dependencies.values())):
+            if dependency.state != "ready":
+                continue
+            try:
+                if dependency.close is not None:
+                    await dependency.close(dependency.instance)
+            except Exception as err:
+                logger.error(f"Error closing dependency {dependency.name}: {err}")
+            dependency.instance = None
+            dependency.state = "pending"
+            DEPENDENCY_READY.labels(dependency.name).set(0)
+
+    async def _check(self, dependency: Dependency) -> bool:
+        if dependency.state != "ready":
+            return False
+        if dependency.check is None:
+            return True
+        now = time.monotonic()
+        if now - dependency.checked_at < HEALTH_CHECK_CACHE_SECONDS:
+            return dependency.check_result
+        try:
+            ok = bool(await asyncio.wait_for(dependency.check(dependency.instance), HEALTH_CHECK_TIMEOUT))
+            dependency.error = None if ok else "check failed"
+        except Exception as err:
+            ok = False
+            dependency.error = str(err) or type(err).__name__
+        dependency.checked_at = now
+        dependency.check_result = ok
+        DEPENDENCY_READY.labels(dependency.name).set(1 if ok else 0)
+        return ok
+
+    async def readiness(self):
+        """
+        Returns (ready, per-dependency report). Ready means every required dependency
+        is created and passes its check; optional ones are reported but never gate.
+        """
+        dependencies = list(self.dependencies.values())
+        results = await asyncio.gather(*(self._check(d) for d in dependencies))
+        report = {}
+        for dependency, ok in zip(dependencies, results):
+            report[dependency.name] = {
+                "status": "ok" if ok else dependency.state if dependency.state != "ready" else "unhealthy",
+                "required": dependency.required,
+                "init_ms": round(dependency.init_seconds * 1000, 1) if dependency.init_seconds is not None else None,
+                "error": dependency.error,
+            }
+        ready = all(ok for dependency, ok in zip(dependencies, results) if dependency.required)
+        return ready, report
+
+    def uptime(self) -> float:
+        return time.monotonic() - self.started_at if self.started_at is not None else 0
+
+
+# Shared dependency container for the whole process
+container = Container()
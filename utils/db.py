@@ -1,58 +1,296 @@
-import mysql.connector
-from mysql.connector import pooling
-from dotenv import load_dotenv
 import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+try:
+    import aiomysql
+except ImportError:  # SQLite-only environments
+    aiomysql = None
+from utils.metrics import (
+    DB_POOL_SIZE, DB_POOL_IN_USE, DB_POOL_MAX, DB_POOL_WAIT, DB_POOL_TIMEOUTS,
+    DB_QUERY_LATENCY, DB_QUERY_ERRORS,
+)
+from utils.observability import track
+from utils.container import container
 
 # Load environment variables
 load_dotenv()
 
-# Global database connection pool
-db_pool = None
-
-def init_db():
-    """
-    Initialize the database connection pool.
-    """
-    global db_pool
-    try:
-        db_pool = pooling.MySQLConnectionPool(
-            pool_name="mypool",
-            pool_size=5,
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-            port=int(os.getenv("DB_PORT", 3306)),  # Default port is 3306
-        )
-        print("✅ Database connection pool initialized.")
-    except mysql.connector.Error as err:
-        print(f"❌ Error initializing DB connection pool: {err}")
-        raise
-
-def get_db_connection():
-    """
-    Get a connection from the database connection pool.
-    """
-    global db_pool
-    if not db_pool:
-        raise Exception("❌ Database connection pool is not initialized.")
-    try:
-        connection = db_pool.get_connection()
-        if connection.is_connected():
-            return connection
-        else:
-            raise Exception("❌ Failed to get a valid database connection.")
-    except mysql.connector.Error as err:
-        print(f"❌ Error getting DB connection: {err}")
-        raise
+logger = logging.getLogger(__name__)
+
+# "mysql" (aiomysql) or "sqlite" (aiosqlite stand-in for local tests)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "fintt.sqlite3")
 
-def close_connection(connection):
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", 10))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 5))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", 30))
+
+
+class PoolTimeout(Exception):
     """
-    Close the provided database connection.
+    Raised when no connection could be acquired within DB_ACQUIRE_TIMEOUT.
     """
-    if connection:
+
+
+def _operation(query: str) -> str:
+    return query.lstrip().split(None, 1)[0].lower() if query.strip() else "unknown"
+
+
+class Connection:
+    """
+    Thin wrapper over a driver connection that records query latency.
+    Rows are returned as dicts for both backends.
+    """
+
+    def __init__(self, raw, backend: str):
+        self.raw = raw
+        self.backend = backend
+
+    def _translate(self, query: str) -> str:
+        if self.backend == "sqlite":
+            return query.replace("%s", "?").replace("NOW()", "CURRENT_TIMESTAMP")
+        return query
+
+    @asynccontextmanager
+    async def _timed(self, query: str):
+        operation = _operation(query)
+        start = time.perf_counter()
         try:
-            connection.close()
-            print("✅ Database connection closed.")
-        except mysql.connector.Error as err:
-            print(f"❌ Error closing DB connection: {err}")
+            async with track(self.backend, operation):
+                yield
+        except Exception:
+            DB_QUERY_ERRORS.labels(operation).inc()
+            raise
+        finally:
+            DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+    async def _run(self, query: str, params, fetch: str = None):
+        query = self._translate(query)
+        async with self._timed(query):
+            if self.backend == "sqlite":
+                cursor = await self.raw.execute(query, params or ())
+                try:
+                    if fetch == "one":
+                        row = await cursor.fetchone()
+                        return dict(row) if row is not None else None
+                    if fetch == "all":
+                        return [dict(row) for row in await cursor.fetchall()]
+                    return cursor.lastrowid, cursor.rowcount
+                finally:
+                    await cursor.close()
+
+            async with self.raw.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                if fetch == "one":
+                    return await cursor.fetchone()
+                if fetch == "all":
+                    return await cursor.fetchall()
+                return cursor.lastrowid, cursor.rowcount
+
+    async def fetchone(self, query: str, params=None):
+        return await self._run(query, params, "one")
+
+    async def fetchall(self, query: str, params=None):
+        return await self._run(query, params, "all")
+
+    async def execute(self, query: str, params=None):
+        """
+        Runs a statement and returns (lastrowid, rowcount).
+        """
+        return await self._run(query, params)
+
+    async def executemany(self, query: str, seq_of_params):
+        query = self._translate(query)
+        async with self._timed(query):
+            if self.backend == "sqlite":
+                await self.raw.executemany(query, seq_of_params)
+                return
+            async with self.raw.cursor() as cursor:
+                await cursor.executemany(query, seq_of_params)
+
+    async def commit(self):
+        await self.raw.commit()
+
+    async def rollback(self):
+        await self.raw.rollback()
+
+    def in_transaction(self) -> bool:
+        if self.backend == "sqlite":
+            return self.raw.in_transaction
+        return self.raw.get_transaction_status()
+
+
+class SQLitePool:
+    """
+    Minimal pool of aiosqlite connections with the same acquire/release shape as aiomysql.
+    """
+
+    def __init__(self, path: str, maxsize: int):
+        self.path = path
+        self.maxsize = maxsize
+        self.size = 0
+        self._free = asyncio.Queue()
+
+    async def _open(self):
+        import aiosqlite
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        return conn
+
+    async def acquire(self):
+        if self._free.empty() and self.size < self.maxsize:
+            # Reserve the slot before awaiting, so concurrent acquirers cannot overshoot maxsize
+            self.size += 1
+            try:
+                return await self._open()
+            except BaseException:
+                self.size -= 1
+                raise
+        return await self._free.get()
+
+    def release(self, conn):
+        self._free.put_nowait(conn)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        while not self._free.empty():
+            await self._free.get_nowait().close()
+            self.size -= 1
+
+
+class Database:
+    """
+    Single async access layer shared by every router.
+
+        async with db.acquire() as conn:
+            rows = await conn.fetchall("SELECT ...", (user_id,))
+    """
+
+    def __init__(self, backend=DB_BACKEND, minsize=DB_POOL_MIN, maxsize=DB_POOL_MAX_SIZE,
+                 acquire_timeout=DB_ACQUIRE_TIMEOUT, recycle=DB_POOL_RECYCLE):
+        self.backend = backend
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.acquire_timeout = acquire_timeout
+        self.recycle = recycle
+        self.pool = None
+        self.in_use = 0
+        self.healthy = False
+        self._health_task = None
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._connect_lock:
+            if self.pool is None:
+                await self._connect()
+
+    async def _connect(self):
+        if self.backend == "sqlite":
+            self.pool = SQLitePool(DB_SQLITE_PATH, self.maxsize)
+        else:
+            self.pool = await aiomysql.create_pool(
+                host=os.getenv("DB_HOST"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                db=os.getenv("DB_NAME"),
+                port=int(os.getenv("DB_PORT", 3306)),  # Default port is 3306
+                minsize=self.minsize,
+                maxsize=self.maxsize,
+                pool_recycle=self.recycle,
+                autocommit=False,
+            )
+        DB_POOL_MAX.set(self.maxsize)
+        await self.health_check()
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"Database pool initialized ({self.backend}, min={self.minsize}, max={self.maxsize})")
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.pool is None:
+            # First use before the background warm-up finished
+            await self.connect()
+
+        start = time.perf_counter()
+        try:
+            raw = await asyncio.wait_for(self.pool.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise PoolTimeout(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+        DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+        self.in_use += 1
+        DB_POOL_IN_USE.set(self.in_use)
+        DB_POOL_SIZE.set(self.pool.size)
+        conn = Connection(raw, self.backend)
+        try:
+            yield conn
+            # Reads leave a transaction open (autocommit is off); aiomysql closes such
+            # connections on release instead of pooling them
+            if conn.in_transaction():
+                await conn.rollback()
+        except BaseException:
+            # Never hand a connection with an open transaction back to the pool
+            try:
+                await conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self.in_use -= 1
+            DB_POOL_IN_USE.set(self.in_use)
+            self.pool.release(raw)
+
+    async def health_check(self) -> bool:
+        try:
+            async with self.acquire() as conn:
+                await conn.fetchone("SELECT 1 AS ok")
+            self.healthy = True
+        except Exception as err:
+            self.healthy = False
+            logger.error(f"Database health check failed: {err}")
+        return self.healthy
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(DB_HEALTH_CHECK_INTERVAL)
+            await self.health_check()
+
+    def stats(self):
+        size = self.pool.size if self.pool is not None else 0
+        return {
+            "backend": self.backend,
+            "healthy": self.healthy,
+            "size": size,
+            "in_use": self.in_use,
+            "max": self.maxsize,
+            "saturation": self.in_use / self.maxsize if self.maxsize else 0,
+        }
+
+
+# Shared database for the whole process
+db = Database()
+
+
+async def _connect_database():
+    await db.connect()
+    return db
+
+
+container.register("database", _connect_database, close=Database.close, check=Database.health_check, required=True)
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from utils.db import db
+from utils.firebase_auth import verify_user
+from utils.container import container
+from utils.write_batch import WriteBatcher, values_clause, placeholders
+from utils.stripe_utils import create_plan_checkout, change_subscription_price
+
+logger = logging.getLogger(__name__)
+
+PLANS_PATH = os.getenv("PLANS_PATH", os.path.join(os.path.dirname(__file__), "..", "config", "plans.json"))
+ENTITLEMENTS_ENABLED = os.getenv("ENTITLEMENTS_ENABLED", "true").lower() == "true"
+DEFAULT_PLAN = "free"
+
+
+class PlanCatalog:
+    """
+    Plans, prices and the features each one unlocks, plus which routes need which feature.
+    """
+
+    def __init__(self, path=PLANS_PATH):
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        self.period_seconds = config.get("period_days", 30) * 86400
+        self.plans = {plan["name"]: plan for plan in config["plans"]}
+        self.features = {name: set(plan["features"]) for name, plan in self.plans.items()}
+        # Longest prefix first so "/market/trends" is matched before a broader "/market"
+        self.routes = sorted(config.get("routes", []), key=lambda route: len(route["prefix"]), reverse=True)
+
+    def get(self, name: str):
+        return self.plans.get(name.lower()) if name else None
+
+    def price(self, name: str) -> float:
+        return self.plans[name]["price"]
+
+    def resolve(self, name: str):
+        """
+        Catalog name for a plan name, Stripe lookup key or Stripe price id.
+        """
+        if not name:
+            return None
+        if name.lower() in self.plans:
+            return name.lower()
+        return next((plan["name"] for plan in self.plans.values() if plan.get("stripe_price") == name), None)
+
+    def feature_for(self, path: str, method: str):
+        for route in self.routes:
+            if path.startswith(route["prefix"]) and method in route.get("methods", (method,)):
+                return route["feature"]
+        return None
+
+
+def _timestamp(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+async def _activate_rows(conn, rows):
+    # rows: (user id, plan, price), at most one per user (the batcher is keyed by user)
+    user_ids = tuple(row[0] for row in rows)
+    await conn.execute(
+        f"UPDATE subscriptions SET is_active = 0 WHERE user_id IN ({placeholders(user_ids)}) AND is_active = 1", user_ids
+    )
+    await conn.execute(
+        "INSERT INTO subscriptions (user_id, plan, price, is_active, created_at) "
+        f"VALUES {values_clause(rows, '(%s, %s, %s, 1, NOW())')}",
+        tuple(value for row in rows for value in row),
+    )
+
+
+class SubscriptionIndex:
+    """
+    Active subscription per user, loaded once at startup and updated after every
+    committed write, so entitlement checks cost a dict lookup instead of a query.
+    """
+
+    def __init__(self, catalog: PlanCatalog):
+        self.catalog = catalog
+        self.active = {}  # user id -> {"plan", "price", "started_at"}
+        self.loaded = False
+        # Called with (user id, subscription or None) after every committed change
+        self.listeners = []
+        # Activations from concurrent checkouts share one transaction
+        self.activations = WriteBatcher("subscriptions", _activate_rows, key=lambda row: str(row[0]))
+
+    async def load(self):
+        async with db.acquire() as conn:
+            rows = await conn.fetchall(
+                "SELECT user_id, plan, price, created_at FROM subscriptions WHERE is_active = 1 ORDER BY created_at"
+            )
+        active = {}
+        for row in rows:
+            plan = self.catalog.resolve(row["plan"])
+            if plan is not None:
+                active[str(row["user_id"])] = {
+                    "plan": plan,
+                    "price": float(row["price"]) if row["price"] is not None else self.catalog.price(plan),
+                    "started_at": _timestamp(row["created_at"]),
+                }
+        self.active = active
+        self.loaded = True
+        logger.info(f"Subscription index loaded: {len(active)} active subscriptions")
+
+    def _set(self, user_id, subscription):
+        self.apply_remote(user_id, subscription)
+        for listener in self.listeners:
+            listener(str(user_id), subscription)
+
+    def apply_remote(self, user_id, subscription):
+        """
+        Updates the in-memory entry only, e.g. for a change committed by another worker.
+        """
+        if subscription is None:
+            self.active.pop(str(user_id), None)
+        else:
+            self.active[str(user_id)] = subscription
+
+    def plan(self, user_id) -> str:
+        subscription = self.active.get(str(user_id))
+        return subscription["plan"] if subscription else DEFAULT_PLAN
+
+    def allows(self, user_id, feature: str) -> bool:
+        return feature in self.catalog.features.get(self.plan(user_id), ())
+
+    async def activate(self, user_id, plan: str):
+        """
+        Makes plan the user's only active subscription.
+        """
+        price = self.catalog.price(plan)
+        await self.activations.submit((user_id, plan, price))
+        self._set(user_id, {"plan": plan, "price": price, "started_at": time.time()})
+        return self.active[str(user_id)]
+
+    async def deactivate(self, user_id):
+        async with db.acquire() as conn:
+            await conn.execute("UPDATE subscriptions SET is_active = 0 WHERE user_id = %s AND is_active = 1", (user_id,))
+            await conn.commit()
+        self._set(user_id, None)
+
+    def proration(self, current: dict, new_plan: str, now: float = None) -> dict:
+        """
+        Credit for the unused part of the current period against a new full period
+        of new_plan, which starts now.
+        """
+        now = time.time() if now is None else now
+        period = self.catalog.period_seconds
+        elapsed = (now - current["started_at"]) % period
+        remaining = 1 - elapsed / period
+        credit = round(current["price"] * remaining, 2)
+        charge = self.catalog.price(new_plan)
+        return {"credit": credit, "charge": charge, "amount_due": round(max(charge - credit, 0), 2),
+                "remaining_fraction": round(remaining, 4)}
+
+    async def subscribe(self, user_id, plan: str) -> dict:
+        """
+        Free plans are activated at once. Paid plans only get a Stripe Checkout session;
+        on_stripe_update activates them when Stripe reports the payment.
+        """
+        current = self.active.get(str(user_id))
+        if current is not None and current["price"] > 0:
+            raise HTTPException(status_code=409, detail="Already on a paid plan; use /subscriptions/upgrade")
+        if self.catalog.price(plan) == 0:
+            return {"status": "active", "subscription": await self.activate(user_id, plan)}
+        url = await create_plan_checkout(self.catalog.plans[plan], self.catalog.period_seconds // 86400, user_id)
+        return {"status": "pending_payment", "checkout_url": url}
+
+    async def upgrade(self, user_id, new_plan: str, subscription_id: str = None) -> dict:
+        """
+        Starts an upgrade to a pricier plan; nothing is activated here. The user's Stripe
+        subscription is moved to the new price with the prorated difference invoiced, and
+        the webhook activates the plan once that invoice is paid. Without a Stripe
+        subscription to prorate against, the new plan goes through Checkout at full price.
+        """
+        async with db.acquire() as conn:
+            row = await conn.fetchone(
+                "SELECT plan, price, created_at FROM subscriptions WHERE user_id = %s AND is_active = 1", (user_id,)
+            )
+        if row is None:
+            raise HTTPException(status_code=404, detail="No active subscription to upgrade")
+        current_plan = self.catalog.resolve(row["plan"]) or DEFAULT_PLAN
+        current = {
+            "plan": current_plan,
+            "price": float(row["price"]) if row["price"] is not None else self.catalog.price(current_plan),
+            "started_at": _timestamp(row["created_at"]),
+        }
+        if self.catalog.price(new_plan) <= current["price"]:
+            raise HTTPException(status_code=400, detail=f"{new_plan} is not an upgrade from {current_plan}")
+
+        plan = self.catalog.plans[new_plan]
+        if subscription_id and plan.get("stripe_price"):
+            await change_subscription_price(subscription_id, plan["stripe_price"])
+            return {"from": current_plan, "to": new_plan, "status": "pending_payment",
+                    **self.proration(current, new_plan)}
+        url = await create_plan_checkout(plan, self.catalog.period_seconds // 86400, user_id)
+        charge = self.catalog.price(new_plan)
+        return {"from": current_plan, "to": new_plan, "status": "pending_payment", "checkout_url": url,
+                "credit": 0, "charge": charge, "amount_due": charge}
+
+    async def on_stripe_update(self, user_id: str, state: dict):
+        """
+        Stripe webhook listener: mirrors paid subscriptions into the index and table.
+        This is the only path that activates a paid plan.
+        """
+        # The subscription item's price reflects upgrades; the metadata plan covers inline prices
+        plan = self.catalog.resolve(state.get("price")) or self.catalog.resolve(state.get("plan"))
+        if state.get("status") in ("active", "trialing") and plan:
+            if self.plan(user_id) != plan:
+                await self.activate(user_id, plan)
+        elif state.get("status") in ("canceled", "unpaid", "incomplete_expired") and str(user_id) in self.active:
+            await self.deactivate(user_id)
+
+    def stats(self):
+        counts = {}
+        for subscription in self.active.values():
+            counts[subscription["plan"]] = counts.get(subscription["plan"], 0) + 1
+        return {"loaded": self.loaded, "active": len(self.active), "by_plan": counts}
+
+
+class EntitlementMiddleware:
+    """
+    ASGI middleware that rejects requests to plan-gated routes before they reach
+    the handler. The verified token claims are left in request.state.user.
+    """
+
+    def __init__(self, app, index=None):
+        self.app = app
+        self.index = index
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not ENTITLEMENTS_ENABLED:
+            return await self.app(scope, receive, send)
+        index = self.index or subscription_index
+        feature = index.catalog.feature_for(scope["path"], scope["method"])
+        if feature is None:
+            return await self.app(scope, receive, send)
+
+        # Already verified by the rate limiter when it runs first
+        user = scope.get("state", {}).get("user")
+        if user is None:
+            authorization = dict(scope["headers"]).get(b"authorization")
+            try:
+                user = await verify_user(authorization.decode("latin-1") if authorization else None)
+            except HTTPException as e:
+                return await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+        if not index.allows(user["uid"], feature):
+            return await JSONResponse(
+                {"detail": f"Your plan does not include {feature}", "plan": index.plan(user["uid"]), "feature": feature},
+                status_code=403,
+            )(scope, receive, send)
+        scope.setdefault("state", {})["user"] = user
+        return await self.app(scope, receive, send)
+
+
+# Shared catalog and subscription index for the whole process
+plan_catalog = PlanCatalog()
+subscription_index = SubscriptionIndex(plan_catalog)
+
+
+async def _load_subscription_index():
+    await container.get("database")
+    await subscription_index.load()
+    return subscription_index
+
+
+# Not ready until loaded: before that every user would be gated as free
+container.register("subscription_index", _load_subscription_index, required=True)
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hmac
+import hashlib
+import logging
+import httpx
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+from dotenv import load_dotenv
+from fastapi import Header, HTTPException, Request
+from utils.db import db
+from utils.ttl_cache import TTLCache
+from utils.observability import track
+from utils.container import container
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
+FIREBASE_CERTS_URL = os.getenv(
+    "FIREBASE_CERTS_URL",
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com",
+)
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 300))
+# Fraction of requests that also check revocation against Firebase (0 disables)
+AUTH_REVOCATION_SAMPLE_RATE = float(os.getenv("AUTH_REVOCATION_SAMPLE_RATE", 0.01))
+# Keys for service callers of admin-only routes (X-API-Key header), comma separated
+ADMIN_API_KEYS = [key.strip() for key in os.getenv("ADMIN_API_KEYS", "").split(",") if key.strip()]
+# Used when Google omits Cache-Control
+DEFAULT_CERTS_MAX_AGE = 3600
+
+# Firebase uid -> users.id (what wallets, portfolios and orders are keyed by); the mapping never changes
+account_ids = TTLCache(maxsize=10000, ttl=3600)
+
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens locally against Google's cached signing certificates.
+    Verified claims are kept in a TTL/LRU cache keyed by the token hash; tokens found
+    revoked stay denied until they expire, even though their signature is still valid.
+    """
+
+    def __init__(self, project_id=FIREBASE_PROJECT_ID, certs_url=FIREBASE_CERTS_URL,
+                 cache_size=AUTH_CACHE_SIZE, cache_ttl=AUTH_CACHE_TTL,
+                 revocation_sample_rate=AUTH_REVOCATION_SAMPLE_RATE):
+        self.project_id = project_id
+        self.certs_url = certs_url
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.denied = {}  # cache key of a revoked token -> its exp
+        # Called with (cache key, exp) of every token found revoked (cross-worker denial)
+        self.listeners = []
+        self.revocation_sample_rate = revocation_sample_rate
+        self.public_keys = {}
+        self.certs_expire_at = 0
+        self.cert_fetches = 0
+        self.revocation_checks = 0
+        self._certs_lock = asyncio.Lock()
+
+    async def _refresh_certs(self):
+        async with self._certs_lock:
+            if self.certs_expire_at > time.time():
+                return
+            async with track("firebase", "certs"), httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(self.certs_url)
+                response.raise_for_status()
+            match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+            max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+            self.set_certificates(response.json(), max_age)
+            self.cert_fetches += 1
+
+    def set_certificates(self, certs: dict, max_age: float):
+        """
+        Installs {kid: PEM certificate} for `max_age` seconds.
+        """
+        self.public_keys = {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in certs.items()
+        }
+        self.certs_expire_at = time.time() + max_age
+
+    async def _public_key(self, kid: str):
+        if self.certs_expire_at <= time.time() or kid not in self.public_keys:
+            await self._refresh_certs()
+        key = self.public_keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown key id")
+        return key
+
+    def decode(self, token: str, key) -> dict:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=self.project_id,
+            issuer=f"https://securetoken.google.com/{self.project_id}",
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        if not claims.get("sub") or claims.get("auth_time", 0) > time.time():
+            raise jwt.InvalidTokenError("Invalid subject or auth_time")
+        claims["uid"] = claims["sub"]
+        return claims
+
+    async def _is_revoked(self, claims: dict) -> bool:
+        self.revocation_checks += 1
+        from firebase_admin import auth
+        app = await container.get("firebase")
+        async with track("firebase", "get_user"):
+            user = await asyncio.to_thread(auth.get_user, claims["uid"], app=app)
+        valid_after = (user.tokens_valid_after_timestamp or 0) / 1000
+        return user.disabled or claims.get("auth_time", 0) < valid_after
+
+    def deny(self, key: str, expires_at: float):
+        """
+        Rejects the token with this cache key until `expires_at`.
+        """
+        now = time.time()
+        if expires_at > now:
+            self.denied = {k: exp for k, exp in self.denied.items() if exp > now}
+            self.denied[key] = expires_at
+        self.cache.pop(key)
+
+    def is_denied(self, key: str) -> bool:
+        expires_at = self.denied.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self.denied[key]
+            return False
+        return True
+
+    async def verify(self, token: str) -> dict:
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        if self.is_denied(key):
+            raise jwt.InvalidTokenError("Token revoked")
+        claims = self.cache.get(key)
+        if claims is None:
+            header = jwt.get_unverified_header(token)
+            claims = self.decode(token, await self._public_key(header.get("kid")))
+            self.cache.set(key, claims, expires_at=claims["exp"])
+
+        if self.revocation_sample_rate and random.random() < self.revocation_sample_rate:
+            if await self._is_revoked(claims):
+                self.deny(key, claims["exp"])
+                for listener in self.listeners:
+                    listener(key, claims["exp"])
+                raise jwt.InvalidTokenError("Token revoked")
+        return claims
+
+    def stats(self):
+        return {
+            "cache": self.cache.stats(),
+            "cert_fetches": self.cert_fetches,
+            "certs_expire_in": max(0, self.certs_expire_at - time.time()),
+            "revocation_checks": self.revocation_checks,
+            "denied": len(self.denied),
+        }
+
+
+# Shared verifier for the whole process
+token_verifier = FirebaseTokenVerifier()
+
+
+def _initialize_firebase():
+    # The Admin SDK is only needed for user management and revocation checks, so it is
+    # imported and initialized on first use instead of at startup
+    import firebase_admin
+    from firebase_admin import credentials
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    raw = os.getenv("FIREBASE_CREDENTIALS")
+    if not raw:
+        raise RuntimeError("FIREBASE_CREDENTIALS is not set")
+    return firebase_admin.initialize_app(credentials.Certificate(json.loads(raw)))
+
+
+async def _firebase_app():
+    return await asyncio.to_thread(_initialize_firebase)
+
+
+async def _delete_firebase_app(app):
+    import firebase_admin
+    await asyncio.to_thread(firebase_admin.delete_app, app)
+
+
+container.register("firebase", _firebase_app, close=_delete_firebase_app)
+
+
+async def verify_user(authorization: str):
+    """
+    Verifies a "Bearer <Firebase ID token>" header and returns the token claims (with "uid").
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    try:
+        return await token_verifier.verify(authorization[len("Bearer "):].strip())
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    except Exception as e:
+        logger.error(f"Error verifying token: {e}")
+        raise HTTPException(status_code=503, detail="Authentication unavailable")
+
+
+async def get_current_user(authorization: str = Header(None)):
+    """
+    FastAPI dependency for authenticated routes.
+    """
+    return await verify_user(authorization)
+
+
+async def current_account(request: Request) -> int:
+    """
+    users.id of the caller, from the verified token (never from the request body).
+    """
+    # Left by the rate limiter or the entitlement middleware when they ran
+    user = getattr(request.state, "user", None) or await verify_user(request.headers.get("Authorization"))
+    account_id = account_ids.get(user["uid"])
+    if account_id is None:
+        async with db.acquire() as conn:
+            row = await conn.fetchone("SELECT id FROM users WHERE firebase_uid = %s", (user["uid"],))
+        if row is None:
+            raise HTTPException(status_code=403, detail="No account for this user")
+        account_id = row["id"]
+        account_ids.set(user["uid"], account_id)
+    return account_id
+
+
+async def require_admin(authorization: str = Header(None), x_api_key: str = Header(None)):
+    """
+    FastAPI dependency for admin-only routes: a configured ADMIN_API_KEYS key, or a
+    Firebase token carrying the custom claim admin=true.
+    """
+    if x_api_key:
+        if any(hmac.compare_digest(x_api_key.encode(), key.encode()) for key in ADMIN_API_KEYS):
+            return {"api_key": True}
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    user = await verify_user(authorization)
+    if user.get("admin") is not True:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
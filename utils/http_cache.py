@@ -0,0 +1,137 @@
+import os
+import gzip
+import hashlib
+import orjson
+from fastapi import Response
+from utils.metrics import RESPONSE_CACHE
+
+try:
+    # Optional: brotli variants are only offered when the package is installed
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed (headers would eat the savings)
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", 512))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 5))
+
+
+def _accepted(accept_encoding: str):
+    """
+    Content codings the client accepts, ignoring those with q=0.
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, *params = part.split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0
+        if coding.strip() and q > 0:
+            accepted.add(coding.strip())
+    return accepted
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison: W/ prefixes are ignored, as RFC 9110 requires for If-None-Match
+    tag = etag.removeprefix("W/")
+    return any(
+        candidate.strip() == "*" or candidate.strip().removeprefix("W/") == tag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class EncodedBody:
+    """
+    One JSON payload, serialized once, with its compressed variants built on first use.
+    """
+
+    def __init__(self, payload):
+        self.identity = orjson.dumps(payload)
+        # Derived from the content, so every worker hands out the same tag for the same data
+        self.etag = 'W/"' + hashlib.blake2b(self.identity, digest_size=12).hexdigest() + '"'
+        self.variants = {}
+
+    def encoded(self, coding: str) -> bytes:
+        body = self.variants.get(coding)
+        if body is None:
+            if coding == "br":
+                body = brotli.compress(self.identity, quality=RESPONSE_BROTLI_QUALITY)
+            else:
+                body = gzip.compress(self.identity, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+            self.variants[coding] = body
+        return body
+
+    def negotiate(self, accept_encoding: str):
+        """
+        (content coding or None, body) for an Accept-Encoding header.
+        """
+        if len(self.identity) < RESPONSE_COMPRESS_MIN_BYTES or not accept_encoding:
+            return None, self.identity
+        accepted = _accepted(accept_encoding)
+        if brotli is not None and "br" in accepted:
+            return "br", self.encoded("br")
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip", self.encoded("gzip")
+        return None, self.identity
+
+
+class CachedResponse:
+    """
+    Encoded JSON responses for a read-mostly endpoint, rebuilt only when the source
+    version changes. Repeat polls reuse the same bytes, and clients that send back the
+    ETag get a bodiless 304:
+
+        market_response = CachedResponse("/market", max_age=5)
+        return market_response.respond(request, snapshot.version, lambda: snapshot.data)
+
+    variant separates payloads of one route that differ by query parameters.
+    """
+
+    def __init__(self, route: str, max_age: int, private=False):
+        self.route = route
+        self.cache_control = f"{'private' if private else 'public'}, max-age={max_age}"
+        self.entries = {}  # variant -> (version, EncodedBody)
+        self.builds = 0
+        self.hits = 0
+        self.not_modified = 0
+
+    def body(self, version, build, variant=None) -> EncodedBody:
+        entry = self.entries.get(variant)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        body = EncodedBody(build())
+        self.entries[variant] = (version, body)
+        self.builds += 1
+        RESPONSE_CACHE.labels(self.route, "build").inc()
+        return body
+
+    def respond(self, request, version, build, variant=None) -> Response:
+        body = self.body(version, build, variant)
+        headers = {"ETag": body.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, body.etag):
+            self.not_modified += 1
+            RESPONSE_CACHE.labels(self.route, "not_modified").inc()
+            return Response(status_code=304, headers=headers)
+        RESPONSE_CACHE.labels(self.route, "full").inc()
+        coding, content = body.negotiate(request.headers.get("accept-encoding", ""))
+        if coding:
+            headers["Content-Encoding"] = coding
+        return Response(content=content, media_type="application/json", headers=headers)
+
+    def stats(self):
+        return {
+            "route": self.route,
+            "variants": len(self.entries),
+            "builds": self.builds,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "brotli": brotli is not None,
+        }
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import logging
+import unicodedata
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CHAT_INTENTS_PATH = os.getenv("CHAT_INTENTS_PATH", os.path.join(os.path.dirname(__file__), "..", "config", "intents.json"))
+# How often classify() checks the rules file for changes (seconds)
+CHAT_INTENTS_RELOAD_SECONDS = float(os.getenv("CHAT_INTENTS_RELOAD_SECONDS", 5))
+
+VOWELS = set("aeiou")
+
+
+def fold_word(word: str) -> str:
+    # Plural folding: "acciones" -> "accion", "criptomonedas" -> "criptomoneda"
+    if len(word) > 4 and word.endswith("es") and word[-3] not in VOWELS:
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase, strip accents, drop punctuation and fold plurals, word by word.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c if c.isalnum() else " " for c in text if not unicodedata.combining(c))
+    return " ".join(fold_word(word) for word in text.split())
+
+
+class Intent:
+    def __init__(self, name: str, response: str, priority: int):
+        self.name = name
+        self.response = response
+        self.priority = priority
+
+
+class IntentAutomaton:
+    """
+    Aho-Corasick automaton over folded keywords; one pass over the message finds every
+    whole-word keyword match, and the highest-priority (earliest) rule wins.
+    """
+
+    def __init__(self, rules):
+        self.intents = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]  # state -> [(keyword length, intent index)]
+
+        for priority, rule in enumerate(rules):
+            self.intents.append(Intent(rule["intent"], rule["response"], priority))
+            for keyword in rule["keywords"]:
+                folded = fold(keyword)
+                if folded:
+                    self._add(folded, priority)
+        self._build()
+
+    def _add(self, keyword: str, intent: int):
+        state = 0
+        for char in keyword:
+            nxt = self.goto[state].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nxt
+        self.output[state].append((len(keyword), intent))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def classify(self, message: str):
+        text = fold(message)
+        best = None
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, intent in output[state]:
+                start = end - length + 1
+                # Whole words only: "bolsa" must not match inside "embolsar"
+                if (start == 0 or text[start - 1] == " ") and (end + 1 == len(text) or text[end + 1] == " "):
+                    if best is None or intent < best:
+                        best = intent
+                        if best == 0:
+                            return self.intents[0]
+        return self.intents[best] if best is not None else None
+
+
+class IntentRouter:
+    """
+    Loads rules from CHAT_INTENTS_PATH and recompiles them when the file changes,
+    so rule edits apply to every worker without a restart.
+    """
+
+    def __init__(self, path=CHAT_INTENTS_PATH, reload_seconds=CHAT_INTENTS_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.automaton = IntentAutomaton([])
+        self.mtime = None
+        self.checked_at = 0
+        self.reload()
+
+    def reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding="utf-8") as f:
+                rules = json.load(f)["intents"]
+            # Swap only after a successful compile so a bad edit keeps the old rules
+            self.automaton = IntentAutomaton(rules)
+            self.mtime = mtime
+            logger.info(f"Loaded {len(rules)} chat intents from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading chat intents: {e}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.reload_seconds:
+            return
+        self.checked_at = now
+        try:
+            if os.path.getmtime(self.path) != self.mtime:
+                self.reload()
+        except OSError:
+            pass
+
+    def classify(self, message: str):
+        self._maybe_reload()
+        return self.automaton.classify(message)
+
+
+# Shared router for every chat handler
+intent_router = IntentRouter()
@@ -0,0 +1,267 @@
+import os
+import json
+import fcntl
+import asyncio
+import logging
+import tempfile
+from utils.metrics import BUS_MESSAGES, BUS_LEADER, BUS_PEERS
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes (start.sh sizes it to the cores)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+INVALIDATION_BUS_ENABLED = os.getenv("INVALIDATION_BUS_ENABLED", str(WEB_CONCURRENCY > 1)).lower() == "true"
+# Unix socket of the leader's hub; the lock files for leadership and worker slots sit next to it
+INVALIDATION_BUS_PATH = os.getenv("INVALIDATION_BUS_PATH", os.path.join(tempfile.gettempdir(), "fintt-bus.sock"))
+INVALIDATION_BUS_RETRY_SECONDS = float(os.getenv("INVALIDATION_BUS_RETRY_SECONDS", 1))
+# A peer this far behind is disconnected instead of buffering without bound; it resyncs on reconnect
+INVALIDATION_BUS_MAX_BUFFER = int(os.getenv("INVALIDATION_BUS_MAX_BUFFER", 4 * 1024 * 1024))
+# Slots beyond WEB_CONCURRENCY cover a replacement worker starting before the old one exits
+MAX_WORKER_SLOTS = WEB_CONCURRENCY * 2
+
+_slot = None
+_slot_file = None
+
+
+def _try_lock(path: str):
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def worker_slot() -> int:
+    """
+    Index of this worker, held by a file lock for the life of the process. A restarted
+    worker reclaims a freed slot, and with it the journals of the worker it replaces.
+    """
+    global _slot, _slot_file
+    if _slot is None:
+        if not INVALIDATION_BUS_ENABLED:
+            _slot = 0
+            return _slot
+        for slot in range(MAX_WORKER_SLOTS):
+            f = _try_lock(f"{INVALIDATION_BUS_PATH}.worker{slot}.lock")
+            if f is not None:
+                _slot, _slot_file = slot, f
+                break
+        else:
+            raise RuntimeError(f"No free worker slot out of {MAX_WORKER_SLOTS}")
+    return _slot
+
+
+def worker_path(path: str) -> str:
+    """
+    Per-worker variant of a journal path, so workers never append to or compact each other's files.
+    """
+    return f"{path}.{worker_slot()}" if INVALIDATION_BUS_ENABLED else path
+
+
+def peer_paths(path: str):
+    """
+    Existing journals of the other worker slots, for read-only recovery.
+    """
+    if not INVALIDATION_BUS_ENABLED:
+        return []
+    own = worker_path(path)
+    candidates = (f"{path}.{slot}" for slot in range(MAX_WORKER_SLOTS))
+    return [candidate for candidate in candidates if candidate != own and os.path.exists(candidate)]
+
+
+class InvalidationBus:
+    """
+    Cross-worker pub/sub over a Unix domain socket. The worker holding the leader lock
+    runs the hub and owns upstream polling; the others connect to it and take over
+    when it dies.
+
+        invalidation_bus.subscribe("auth", lambda data: token_verifier.deny(data["key"], data["exp"]))
+        invalidation_bus.publish("auth", {"key": key, "exp": exp})
+
+    Messages are newline-delimited JSON, delivered to every other worker at most once.
+    Publishers apply a change locally first; messages carry full state or idempotent
+    invalidations, and resync callbacks run after every (re)connect to cover gaps.
+    With a single worker the bus is disabled: publish() is a no-op and the process
+    is the leader.
+    """
+
+    def __init__(self, path=INVALIDATION_BUS_PATH, enabled=INVALIDATION_BUS_ENABLED,
+                 retry_seconds=INVALIDATION_BUS_RETRY_SECONDS, max_buffer=INVALIDATION_BUS_MAX_BUFFER):
+        self.path = path
+        self.enabled = enabled
+        self.retry_seconds = retry_seconds
+        self.max_buffer = max_buffer
+        self.is_leader = False
+        self.handlers = {}  # channel -> [callback(data)]
+        self.leader_callbacks = []
+        self.resync_callbacks = []
+        self.peers = set()  # leader: writers to connected workers
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self._writer = None  # follower: connection to the hub
+        self._server = None
+        self._lock_file = None
+        self._task = None
+
+    def subscribe(self, channel: str, callback):
+        self.handlers.setdefault(channel, []).append(callback)
+
+    def on_leader(self, callback):
+        """
+        Registers an async callback run once this worker becomes the leader.
+        """
+        self.leader_callbacks.append(callback)
+
+    def on_resync(self, callback):
+        """
+        Registers an async callback run each time a follower (re)connects to the hub.
+        """
+        self.resync_callbacks.append(callback)
+
+    def publish(self, channel: str, data):
+        """
+        Sends data to every other worker without waiting.
+        """
+        if not self.enabled:
+            return
+        line = (json.dumps({"channel": channel, "data": data}) + "\n").encode("utf-8")
+        if self.is_leader:
+            self._broadcast(line)
+        elif self._writer is not None and not self._writer.is_closing():
+            self._writer.write(line)
+        else:
+            self.dropped += 1
+            BUS_MESSAGES.labels(channel, "dropped").inc()
+            return
+        self.published += 1
+        BUS_MESSAGES.labels(channel, "published").inc()
+
+    def _broadcast(self, line: bytes, exclude=None):
+        for writer in list(self.peers):
+            if writer is exclude:
+                continue
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                logger.warning("Disconnecting a worker that stopped reading the invalidation bus")
+                self.peers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def _dispatch(self, line: bytes):
+        self.received += 1
+        try:
+            message = json.loads(line)
+        except ValueError:
+            logger.error("Malformed invalidation bus message")
+            return
+        BUS_MESSAGES.labels(message["channel"], "received").inc()
+        for callback in self.handlers.get(message["channel"], ()):
+            try:
+                result = callback(message["data"])
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Invalidation bus handler error on {message['channel']}: {e}")
+
+    async def _serve_peer(self, reader, writer):
+        self.peers.add(writer)
+        BUS_PEERS.set(len(self.peers))
+        try:
+            while line := await reader.readline():
+                self._broadcast(line, exclude=writer)
+                await self._dispatch(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            BUS_PEERS.set(len(self.peers))
+            writer.close()
+
+    async def _become_leader(self):
+        # Holding the lock means any socket file left behind belongs to a dead leader
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path)
+        self.is_leader = True
+        BUS_LEADER.set(1)
+        logger.info(f"Worker {os.getpid()} is the leader")
+        for callback in self.leader_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Leader callback error: {e}")
+
+    async def _follow(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self._writer = writer
+        try:
+            for callback in self.resync_callbacks:
+                try:
+                    await callback()
+                except Exception as e:
+                    logger.error(f"Resync callback error: {e}")
+            while line := await reader.readline():
+                await self._dispatch(line)
+        finally:
+            self._writer = None
+            writer.close()
+
+    async def _run(self):
+        while True:
+            self._lock_file = _try_lock(f"{self.path}.lock")
+            if self._lock_file is not None:
+                await self._become_leader()
+                return
+            try:
+                await self._follow()
+                logger.warning("Lost connection to the leader worker")
+            except (ConnectionError, FileNotFoundError, asyncio.IncompleteReadError):
+                pass
+            await asyncio.sleep(self.retry_seconds)
+
+    async def start(self):
+        if not self.enabled:
+            self.is_leader = True
+            for callback in self.leader_callbacks:
+                await callback()
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self.peers):
+                writer.close()
+            self.peers.clear()
+            self._server = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
+        BUS_LEADER.set(0)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pid": os.getpid(),
+            "slot": worker_slot(),
+            "workers": WEB_CONCURRENCY,
+            "leader": self.is_leader,
+            "connected": self.is_leader or self._writer is not None,
+            "peers": len(self.peers),
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+# Shared bus for the whole process
+invalidation_bus = InvalidationBus()
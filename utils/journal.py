@@ -0,0 +1,94 @@
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """
+    Append-only JSON-lines journal of records with an "id". Every state transition is one
+    line; the last line per id wins. Appends are written and fsynced off the event loop by a
+    single writer task, in order and batched with whatever queued up during the previous fsync.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending = []  # (line, future) waiting for the writer
+        self.batches = 0
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def load(self) -> dict:
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["id"]] = record
+        return records
+
+    def append(self, record: dict) -> asyncio.Future:
+        """
+        Queues one line; await the returned future when the caller needs it on disk.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Errors are logged by the writer; this keeps unawaited futures from warning again
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.pending.append((json.dumps(record) + "\n", future))
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    def _write(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._write, [line for line, _ in batch])
+            error = None
+        except Exception as e:
+            logger.error(f"Error writing journal {self.path}: {e}")
+            error = e
+        self.batches += 1
+        for _, future in batch:
+            if not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def _run(self):
+        while not (self._closing and not self.pending):
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._flush()
+
+    async def close(self):
+        """
+        Writes whatever is still queued and stops the writer task.
+        """
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._closing = False
+
+    def compact(self, records: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
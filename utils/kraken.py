@@ -1,17 +1,25 @@
-import os
-import krakenex
+from utils.kraken_client import kraken_client
 
-kraken_api = krakenex.API()
-kraken_api.key = os.getenv("KRAKEN_API_KEY")
-kraken_api.secret = os.getenv("KRAKEN_SECRET_KEY")
-
-def execute_trade(crypto_pair, amount, action):
-    response = kraken_api.query_private('AddOrder', {
+async def execute_trade(crypto_pair, amount, action, cl_ord_id=None):
+    order = {
         'pair': crypto_pair,
         'type': action,
         'ordertype': 'market',
         'volume': amount
-    })
-    if response.get("error"):
-        raise Exception(f"Kraken API error: {response['error']}")
-    return response
+    }
+    if cl_ord_id:
+        order['cl_ord_id'] = cl_ord_id
+    return await kraken_client.private('AddOrder', order)
+
+
+async def find_order(cl_ord_id):
+    """
+    (txid, order info) of the order placed with this cl_ord_id, open or closed, or None
+    when Kraken has no such order.
+    """
+    for endpoint, key in (("OpenOrders", "open"), ("ClosedOrders", "closed")):
+        result = await kraken_client.private(endpoint, {'cl_ord_id': cl_ord_id})
+        for txid, info in (result.get(key) or {}).items():
+            if info.get('cl_ord_id', cl_ord_id) == cl_ord_id:
+                return txid, info
+    return None
@@ -0,0 +1,180 @@
+import os
+import time
+import hmac
+import base64
+import hashlib
+import logging
+import urllib.parse
+import httpx
+from dotenv import load_dotenv
+from utils.token_bucket import TokenBucket
+from utils.observability import track
+from utils.container import container
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+KRAKEN_API_URL = os.getenv("KRAKEN_API_URL", "https://api.kraken.com/0")
+KRAKEN_API_KEY = os.getenv("KRAKEN_API_KEY")
+KRAKEN_API_SECRET = os.getenv("KRAKEN_API_SECRET") or os.getenv("KRAKEN_SECRET_KEY")
+
+# Connection pool sizing
+KRAKEN_MAX_CONNECTIONS = int(os.getenv("KRAKEN_MAX_CONNECTIONS", 20))
+KRAKEN_MAX_KEEPALIVE = int(os.getenv("KRAKEN_MAX_KEEPALIVE", 10))
+
+# Kraken's private call counter (starter tier: max 15, decays 0.33/s).
+# Public endpoints are limited to roughly one call per second per IP.
+KRAKEN_PRIVATE_COUNTER_MAX = float(os.getenv("KRAKEN_PRIVATE_COUNTER_MAX", 15))
+KRAKEN_PRIVATE_COUNTER_DECAY = float(os.getenv("KRAKEN_PRIVATE_COUNTER_DECAY", 0.33))
+KRAKEN_PUBLIC_RATE = float(os.getenv("KRAKEN_PUBLIC_RATE", 1))
+KRAKEN_PUBLIC_BURST = float(os.getenv("KRAKEN_PUBLIC_BURST", 3))
+
+# Call counter cost per private endpoint; order placement is limited by the
+# matching engine instead of the call counter.
+ENDPOINT_COST = {
+    "AddOrder": 0,
+    "CancelOrder": 0,
+    "Ledgers": 2,
+    "QueryLedgers": 2,
+    "TradesHistory": 2,
+    "QueryTrades": 2,
+}
+
+# Per-endpoint timeouts (seconds)
+DEFAULT_TIMEOUT = float(os.getenv("KRAKEN_TIMEOUT", 10))
+ENDPOINT_TIMEOUT = {
+    "Ticker": 5,
+    "Depth": 5,
+    "AssetPairs": 15,
+    "AddOrder": 15,
+}
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class KrakenError(Exception):
+    """
+    Raised when Kraken answers with a non-empty "error" list.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"Kraken API error: {errors}")
+
+    @property
+    def rate_limited(self):
+        return any("Rate limit" in error or "Throttled" in error for error in self.errors)
+
+
+def sign_request(urlpath: str, data: dict, secret: str) -> str:
+    """
+    Kraken API-Sign: HMAC-SHA512(urlpath + SHA256(nonce + postdata)) with the base64-decoded secret.
+    """
+    post_data = urllib.parse.urlencode(data)
+    message = f"{data['nonce']}{post_data}".encode("utf-8")
+    signature = hmac.new(
+        base64.b64decode(secret),
+        urlpath.encode("utf-8") + hashlib.sha256(message).digest(),
+        hashlib.sha512
+    )
+    return base64.b64encode(signature.digest()).decode("utf-8")
+
+
+class KrakenClient:
+    """
+    Async Kraken REST client sharing one pooled keep-alive connection set.
+    """
+
+    def __init__(self, api_key=KRAKEN_API_KEY, api_secret=KRAKEN_API_SECRET, base_url=KRAKEN_API_URL):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.private_bucket = TokenBucket(KRAKEN_PRIVATE_COUNTER_MAX, KRAKEN_PRIVATE_COUNTER_DECAY)
+        self.public_bucket = TokenBucket(KRAKEN_PUBLIC_BURST, KRAKEN_PUBLIC_RATE)
+        self._client = None
+        self._last_nonce = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_AVAILABLE,
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=KRAKEN_MAX_CONNECTIONS,
+                    max_keepalive_connections=KRAKEN_MAX_KEEPALIVE,
+                ),
+            )
+        return self._client
+
+    def _nonce(self) -> str:
+        # Strictly increasing even when several requests share a millisecond
+        nonce = max(int(time.time() * 1000), self._last_nonce + 1)
+        self._last_nonce = nonce
+        return str(nonce)
+
+    @staticmethod
+    def _result(response: httpx.Response):
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get("error"):
+            raise KrakenError(payload["error"])
+        return payload["result"]
+
+    async def public(self, endpoint: str, params: dict = None):
+        await self.public_bucket.acquire()
+        async with track("kraken", endpoint):
+            response = await self.client.get(
+                f"/public/{endpoint}",
+                params=params,
+                timeout=ENDPOINT_TIMEOUT.get(endpoint, DEFAULT_TIMEOUT),
+            )
+            return self._result(response)
+
+    async def private(self, endpoint: str, data: dict = None):
+        if not self.api_key or not self.api_secret:
+            raise KrakenError(["EAPI:Missing API key"])
+        await self.private_bucket.acquire(ENDPOINT_COST.get(endpoint, 1))
+
+        data = {"nonce": self._nonce(), **(data or {})}
+        urlpath = f"{urllib.parse.urlparse(self.base_url).path}/private/{endpoint}"
+        headers = {
+            "API-Key": self.api_key,
+            "API-Sign": sign_request(urlpath, data, self.api_secret),
+        }
+        async with track("kraken", endpoint):
+            response = await self.client.post(
+                f"/private/{endpoint}",
+                data=data,
+                headers=headers,
+                timeout=ENDPOINT_TIMEOUT.get(endpoint, DEFAULT_TIMEOUT),
+            )
+            return self._result(response)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Shared client for the whole process
+kraken_client = KrakenClient()
+
+
+async def _kraken():
+    return kraken_client
+
+
+async def _kraken_reachable(client: KrakenClient) -> bool:
+    await client.public("Time")
+    return True
+
+
+container.register("kraken", _kraken, close=KrakenClient.close, check=_kraken_reachable)
@@ -0,0 +1,144 @@
+import os
+import json
+import asyncio
+import logging
+import websockets
+
+logger = logging.getLogger(__name__)
+
+KRAKEN_WS_URL = os.getenv("KRAKEN_WS_URL", "wss://ws.kraken.com")
+KRAKEN_WS_BOOK_DEPTH = int(os.getenv("KRAKEN_WS_BOOK_DEPTH", 10))
+KRAKEN_WS_MAX_BACKOFF = float(os.getenv("KRAKEN_WS_MAX_BACKOFF", 30))
+
+
+class KrakenWebSocketFeed:
+    """
+    Subscribes to Kraken's ticker and book channels and keeps the market
+    snapshot and the order book store up to date.
+    """
+
+    def __init__(self, snapshot, books, broadcaster, url=KRAKEN_WS_URL, depth=KRAKEN_WS_BOOK_DEPTH):
+        self.snapshot = snapshot
+        self.books = books
+        self.broadcaster = broadcaster
+        self.url = url
+        self.depth = depth
+        self.pair_names = {}  # wsname -> REST pair name
+        self.messages = 0
+        self.resyncs = 0
+        self.resync_pending = set()  # wsnames waiting for a fresh book snapshot
+        self.connected = False
+        self._ws = None
+        self._task = None
+
+    async def _subscribe(self, wsnames, name):
+        subscription = {"name": name}
+        if name == "book":
+            subscription["depth"] = self.depth
+        await self._ws.send(json.dumps({"event": "subscribe", "pair": wsnames, "subscription": subscription}))
+
+    async def _resync(self, wsname):
+        """
+        Drops a drifted book and resubscribes so Kraken sends a fresh snapshot.
+        """
+        self.resync_pending.add(wsname)
+        self.resyncs += 1
+        logger.warning(f"Order book checksum mismatch for {wsname}, resyncing")
+        subscription = {"name": "book", "depth": self.depth}
+        await self._ws.send(json.dumps({"event": "unsubscribe", "pair": [wsname], "subscription": subscription}))
+        await self._subscribe([wsname], "book")
+
+    def _on_ticker(self, pair, payload):
+        last, bid, ask = payload["c"][0], payload["b"][0], payload["a"][0]
+        self.snapshot.update_pair(pair, last, bid, ask)
+        self.broadcaster.publish(pair, {"crypto": pair, "last_price": last, "bid": bid, "ask": ask})
+
+    async def _on_book(self, pair, wsname, payloads):
+        book = self.books.book(pair)
+        asks, bids, checksum = [], [], None
+        for payload in payloads:
+            if "as" in payload or "bs" in payload:
+                book.apply_snapshot(payload.get("as", []), payload.get("bs", []))
+                self.resync_pending.discard(wsname)
+                continue
+            asks.extend(payload.get("a", []))
+            bids.extend(payload.get("b", []))
+            checksum = payload.get("c", checksum)
+
+        if not book.synced:
+            # Updates in flight before the (re)subscription snapshot arrives are meaningless
+            return
+        if (asks or bids) and not book.apply_update(asks, bids, checksum):
+            # Checksum mismatch: one resubscription per pair until its snapshot arrives
+            if wsname not in self.resync_pending:
+                await self._resync(wsname)
+            return
+        self.broadcaster.publish(f"{pair}:book", {"crypto": pair, **book.top()})
+
+    async def _handle(self, message):
+        self.messages += 1
+        if isinstance(message, dict):
+            if message.get("event") == "subscriptionStatus" and message.get("status") == "error":
+                logger.error(f"Kraken WebSocket subscription error: {message.get('errorMessage')}")
+            return
+
+        channel, wsname = message[-2], message[-1]
+        pair = self.pair_names.get(wsname)
+        if pair is None:
+            return
+        if channel == "ticker":
+            self._on_ticker(pair, message[1])
+        elif channel.startswith("book"):
+            await self._on_book(pair, wsname, message[1:-2])
+
+    async def _run_once(self):
+        if not self.snapshot.pairs:
+            await self.snapshot.refresh_pairs()
+        self.pair_names = {wsname: pair for pair, wsname in self.snapshot.pairs.items() if wsname}
+        wsnames = list(self.pair_names)
+
+        async with websockets.connect(self.url, ping_interval=20, max_size=None) as ws:
+            self._ws = ws
+            self.connected = True
+            self.resync_pending.clear()
+            for book in self.books.books.values():
+                book.synced = False
+            await self._subscribe(wsnames, "ticker")
+            await self._subscribe(wsnames, "book")
+            async for raw in ws:
+                await self._handle(json.loads(raw))
+
+    async def run(self):
+        backoff = 1
+        while True:
+            try:
+                await self._run_once()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Kraken WebSocket feed error: {e}")
+            finally:
+                self.connected = False
+                self._ws = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, KRAKEN_WS_MAX_BACKOFF)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "messages": self.messages,
+            "resyncs": self.resyncs,
+            "books": len(self.books.books),
+            **self.broadcaster.stats(),
+        }
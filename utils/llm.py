@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+from utils.chat_cache import chat_cache
+from utils.observability import track
+from utils.container import container
+from utils.metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND, LLM_COMPLETIONS, LLM_ACTIVE_STREAMS
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Point at fakes/openai.py for offline runs, e.g. http://127.0.0.1:9002/v1
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 30))
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 300))
+
+ADVISOR_PROMPT = "Eres Fintto, un asesor financiero. Responde de forma clara y breve."
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        # Imported here: the SDK is slow to import and only the chat routes need it
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=OPENAI_BASE_URL,
+            timeout=OPENAI_TIMEOUT,
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def _openai():
+    return await asyncio.to_thread(get_client)
+
+
+async def _close_openai(client):
+    await close_client()
+
+
+container.register("openai", _openai, close=_close_openai)
+
+
+async def stream_advice(message: str):
+    """
+    Yields completion text chunks as they arrive. Closing the generator (e.g. when the
+    HTTP client disconnects) closes the upstream stream as well.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    outcome = "error"
+    async with track("openai", "chat.completions.create"):
+        client = await container.get("openai")
+        stream = await client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": ADVISOR_PROMPT},
+                {"role": "user", "content": message},
+            ],
+            max_tokens=LLM_MAX_TOKENS,
+            temperature=0.7,
+            stream=True,
+        )
+    LLM_ACTIVE_STREAMS.inc()
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                LLM_TIME_TO_FIRST_TOKEN.observe(first_token_at - start)
+            tokens += 1
+            yield text
+        outcome = "completed"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "cancelled"
+        raise
+    finally:
+        LLM_ACTIVE_STREAMS.dec()
+        LLM_COMPLETIONS.labels(outcome).inc()
+        await stream.close()
+        if first_token_at is not None and tokens > 1:
+            elapsed = time.perf_counter() - first_token_at
+            if elapsed > 0:
+                LLM_TOKENS_PER_SECOND.observe(tokens / elapsed)
+
+
+async def cached_advice(message: str) -> str:
+    """
+    Full advisor answer, served from the chat response cache when possible.
+    """
+    cached = chat_cache.get(message)
+    if cached is not None:
+        return cached
+    response = "".join([text async for text in stream_advice(message)]).strip()
+    chat_cache.set(message, response)
+    return response
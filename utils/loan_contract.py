@@ -0,0 +1,119 @@
+import os
+from decimal import Decimal
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LOAN_CONTRACT_ADDRESS = os.getenv("LOAN_CONTRACT_ADDRESS")
+LOAN_SIGNER_PRIVATE_KEY = os.getenv("LOAN_SIGNER_PRIVATE_KEY")
+
+# ABI del contrato de préstamos (puedes obtenerla en Remix tras compilar el contrato)
+LOAN_ABI = [
+    {
+        "inputs": [
+            {"internalType": "uint256", "name": "_amount", "type": "uint256"},
+            {"internalType": "uint256", "name": "_interestRate", "type": "uint256"}
+        ],
+        "name": "requestLoan",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "uint256", "name": "_id", "type": "uint256"}],
+        "name": "payLoan",
+        "outputs": [],
+        "stateMutability": "payable",
+        "type": "function"
+    },
+    # Eventos emitidos por requestLoan/payLoan; deben coincidir con el contrato desplegado
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "uint256", "name": "id", "type": "uint256"},
+            {"indexed": True, "internalType": "address", "name": "borrower", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "amount", "type": "uint256"},
+            {"indexed": False, "internalType": "uint256", "name": "interestRate", "type": "uint256"}
+        ],
+        "name": "LoanRequested",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "uint256", "name": "id", "type": "uint256"},
+            {"indexed": True, "internalType": "address", "name": "borrower", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "LoanPaid",
+        "type": "event"
+    }
+]
+
+_signer = None
+_event_topics = None
+
+
+def to_wei(amount) -> int:
+    # Through Decimal so 0.1 ETH is exactly 10**17 wei
+    return int(Decimal(str(amount)) * 10**18)
+
+
+def encode_call(function_name: str, *args) -> str:
+    """
+    Calldata for a LOAN_ABI function: 4-byte selector followed by the ABI-encoded arguments.
+    """
+    from eth_abi import encode
+    from eth_utils import keccak
+
+    spec = next(item for item in LOAN_ABI if item.get("type") == "function" and item["name"] == function_name)
+    types = [arg["type"] for arg in spec["inputs"]]
+    selector = keccak(text=f"{function_name}({','.join(types)})")[:4]
+    return "0x" + (selector + encode(types, list(args))).hex()
+
+
+def event_topics() -> dict:
+    """
+    topic0 (keccak of the event signature) -> event ABI entry.
+    """
+    global _event_topics
+    if _event_topics is None:
+        from eth_utils import keccak
+        _event_topics = {}
+        for item in LOAN_ABI:
+            if item.get("type") == "event":
+                signature = f"{item['name']}({','.join(arg['type'] for arg in item['inputs'])})"
+                _event_topics["0x" + keccak(text=signature).hex()] = item
+    return _event_topics
+
+
+def decode_log(log: dict):
+    """
+    (event name, {argument: value}) for a LOAN_ABI event log, or None for unknown topics.
+    """
+    from eth_abi import decode
+
+    topics = log.get("topics") or []
+    spec = event_topics().get(topics[0].lower()) if topics else None
+    if spec is None:
+        return None
+    indexed = [arg for arg in spec["inputs"] if arg["indexed"]]
+    plain = [arg for arg in spec["inputs"] if not arg["indexed"]]
+    values = {}
+    for arg, topic in zip(indexed, topics[1:]):
+        values[arg["name"]] = decode([arg["type"]], bytes.fromhex(topic[2:]))[0]
+    data = bytes.fromhex(log.get("data", "0x")[2:])
+    for arg, value in zip(plain, decode([arg["type"] for arg in plain], data) if plain else ()):
+        values[arg["name"]] = value
+    return spec["name"], values
+
+
+def loan_signer():
+    global _signer
+    if _signer is None:
+        if not LOAN_SIGNER_PRIVATE_KEY or not LOAN_CONTRACT_ADDRESS:
+            raise RuntimeError("LOAN_SIGNER_PRIVATE_KEY and LOAN_CONTRACT_ADDRESS must be set")
+        from eth_account import Account
+        _signer = Account.from_key(LOAN_SIGNER_PRIVATE_KEY)
+    return _signer
@@ -0,0 +1,366 @@
+import os
+import asyncio
+import logging
+from utils.db import db
+from utils.loan_contract import LOAN_CONTRACT_ADDRESS, decode_log, event_topics
+from utils.web3_tx import web3_tx, RPCError
+from utils.metrics import (
+    LOAN_INDEXER_HEAD, LOAN_INDEXER_BLOCK, LOAN_INDEXER_LAG, LOAN_INDEXER_EVENTS, LOAN_INDEXER_REORGS,
+)
+
+logger = logging.getLogger(__name__)
+
+LOAN_INDEXER_ENABLED = os.getenv("LOAN_INDEXER_ENABLED", "false").lower() == "true"
+# First block to index on an empty store; defaults to the current head
+LOAN_INDEXER_START_BLOCK = os.getenv("LOAN_INDEXER_START_BLOCK")
+LOAN_INDEXER_POLL_SECONDS = float(os.getenv("LOAN_INDEXER_POLL_SECONDS", 5))
+# Blocks per eth_getLogs call and how many calls run at once during backfill
+LOAN_INDEXER_CHUNK = int(os.getenv("LOAN_INDEXER_CHUNK", 2000))
+LOAN_INDEXER_PARALLEL = int(os.getenv("LOAN_INDEXER_PARALLEL", 4))
+# Blocks behind the head before indexing, and how far back reorgs are tracked
+LOAN_INDEXER_CONFIRMATIONS = int(os.getenv("LOAN_INDEXER_CONFIRMATIONS", 2))
+LOAN_INDEXER_REORG_DEPTH = int(os.getenv("LOAN_INDEXER_REORG_DEPTH", 64))
+
+SCHEMA = {
+    "mysql": [
+        """CREATE TABLE IF NOT EXISTS loan_events (
+            block_number BIGINT NOT NULL,
+            log_index INT NOT NULL,
+            block_hash VARCHAR(66) NOT NULL,
+            tx_hash VARCHAR(66) NOT NULL,
+            event VARCHAR(32) NOT NULL,
+            loan_id BIGINT NOT NULL,
+            borrower VARCHAR(42) NOT NULL,
+            amount VARCHAR(78) NOT NULL,
+            interest_rate BIGINT NULL,
+            PRIMARY KEY (block_number, log_index),
+            INDEX idx_loan_events_loan (loan_id),
+            INDEX idx_loan_events_borrower (borrower),
+            INDEX idx_loan_events_tx (tx_hash)
+        )""",
+        """CREATE TABLE IF NOT EXISTS loan_indexer_blocks (
+            block_number BIGINT NOT NULL PRIMARY KEY,
+            block_hash VARCHAR(66) NOT NULL
+        )""",
+    ],
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS loan_events (
+            block_number INTEGER NOT NULL,
+            log_index INTEGER NOT NULL,
+            block_hash TEXT NOT NULL,
+            tx_hash TEXT NOT NULL,
+            event TEXT NOT NULL,
+            loan_id INTEGER NOT NULL,
+            borrower TEXT NOT NULL,
+            amount TEXT NOT NULL,
+            interest_rate INTEGER,
+            PRIMARY KEY (block_number, log_index)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_loan_events_loan ON loan_events (loan_id)",
+        "CREATE INDEX IF NOT EXISTS idx_loan_events_borrower ON loan_events (borrower)",
+        "CREATE INDEX IF NOT EXISTS idx_loan_events_tx ON loan_events (tx_hash)",
+        """CREATE TABLE IF NOT EXISTS loan_indexer_blocks (
+            block_number INTEGER NOT NULL PRIMARY KEY,
+            block_hash TEXT NOT NULL
+        )""",
+    ],
+}
+
+
+def loan_summary(request: dict, payments: list) -> dict:
+    """
+    One loan's state from its LoanRequested row and its LoanPaid rows.
+    interestRate is read as a simple percentage over the principal.
+    """
+    principal = int(request["amount"])
+    rate = request["interest_rate"] or 0
+    due = principal + principal * rate // 100
+    repaid = sum(int(payment["amount"]) for payment in payments)
+    return {
+        "loan_id": request["loan_id"],
+        "borrower": request["borrower"],
+        "principal_wei": str(principal),
+        "interest_rate": rate,
+        "repaid_wei": str(repaid),
+        "outstanding_wei": str(max(due - repaid, 0)),
+        "status": "paid" if repaid >= due else "active",
+        "tx_hash": request["tx_hash"],
+        "block_number": request["block_number"],
+        "payments": [
+            {
+                "amount_wei": payment["amount"],
+                "tx_hash": payment["tx_hash"],
+                "block_number": payment["block_number"],
+            }
+            for payment in payments
+        ],
+    }
+
+
+def balances(loans: list) -> dict:
+    """
+    Outstanding totals across a list of loan summaries.
+    """
+    active = [loan for loan in loans if loan["status"] == "active"]
+    return {
+        "loans": len(loans),
+        "active": len(active),
+        "principal_wei": str(sum(int(loan["principal_wei"]) for loan in loans)),
+        "repaid_wei": str(sum(int(loan["repaid_wei"]) for loan in loans)),
+        "outstanding_wei": str(sum(int(loan["outstanding_wei"]) for loan in active)),
+    }
+
+
+class LoanEventIndexer:
+    """
+    Follows the loan contract's events into local tables. Backfill fetches several
+    block chunks concurrently; every stored range ends with a block hash
+    checkpoint, and a checkpoint whose hash no longer matches the chain rolls the
+    store back to the last block that still does.
+    """
+
+    def __init__(self, rpc=web3_tx, contract_address=LOAN_CONTRACT_ADDRESS, chunk=LOAN_INDEXER_CHUNK,
+                 parallel=LOAN_INDEXER_PARALLEL, confirmations=LOAN_INDEXER_CONFIRMATIONS,
+                 reorg_depth=LOAN_INDEXER_REORG_DEPTH, poll_interval=LOAN_INDEXER_POLL_SECONDS):
+        self.rpc = rpc
+        self.contract_address = contract_address.lower() if contract_address else None
+        self.chunk = chunk
+        self.parallel = parallel
+        self.confirmations = confirmations
+        self.reorg_depth = reorg_depth
+        self.poll_interval = poll_interval
+        self.cursor = None  # last indexed block
+        self.head = None
+        self.reorgs = 0
+        self.events = 0
+        self.errors = 0
+        self._task = None
+
+    # Schema and state
+
+    async def ensure_schema(self):
+        async with db.acquire() as conn:
+            for statement in SCHEMA[db.backend]:
+                await conn.execute(statement)
+            await conn.commit()
+
+    async def _load_cursor(self):
+        async with db.acquire() as conn:
+            row = await conn.fetchone("SELECT MAX(block_number) AS block_number FROM loan_indexer_blocks")
+        if row and row["block_number"] is not None:
+            return row["block_number"]
+        if LOAN_INDEXER_START_BLOCK is not None:
+            return int(LOAN_INDEXER_START_BLOCK) - 1
+        return self.head - self.confirmations
+
+    # Chain reads
+
+    async def _logs(self, from_block: int, to_block: int):
+        try:
+            return await self.rpc.call("eth_getLogs", {
+                "address": self.contract_address,
+                "fromBlock": hex(from_block),
+                "toBlock": hex(to_block),
+                "topics": [list(event_topics())],
+            })
+        except RPCError:
+            # Providers cap the range or result size; split and retry
+            if from_block >= to_block:
+                raise
+            middle = (from_block + to_block) // 2
+            left, right = await asyncio.gather(self._logs(from_block, middle), self._logs(middle + 1, to_block))
+            return left + right
+
+    async def _block_hashes(self, numbers):
+        blocks = await self.rpc.batch([("eth_getBlockByNumber", [hex(number), False]) for number in numbers])
+        return {number: block["hash"] if block else None for number, block in zip(numbers, blocks)}
+
+    # Reorgs
+
+    async def _check_reorg(self):
+        async with db.acquire() as conn:
+            checkpoints = await conn.fetchall(
+                "SELECT block_number, block_hash FROM loan_indexer_blocks ORDER BY block_number DESC"
+            )
+        if not checkpoints:
+            return
+        latest = checkpoints[0]
+        if (await self._block_hashes([latest["block_number"]]))[latest["block_number"]] == latest["block_hash"]:
+            return
+
+        chain = await self._block_hashes([row["block_number"] for row in checkpoints[1:]])
+        # Deeper than every checkpoint: the range before the oldest one may have changed too
+        ancestor = next(
+            (row["block_number"] for row in checkpoints[1:] if chain[row["block_number"]] == row["block_hash"]),
+            max(checkpoints[-1]["block_number"] - self.reorg_depth, -1),
+        )
+        async with db.acquire() as conn:
+            await conn.execute("DELETE FROM loan_events WHERE block_number > %s", (ancestor,))
+            await conn.execute("DELETE FROM loan_indexer_blocks WHERE block_number > %s", (ancestor,))
+            await conn.commit()
+        logger.warning(f"Loan indexer reorg: rolled back from block {self.cursor} to {ancestor}")
+        self.cursor = ancestor
+        self.reorgs += 1
+        LOAN_INDEXER_REORGS.inc()
+
+    # Indexing
+
+    def _rows(self, logs):
+        rows = []
+        for log in logs:
+            if log.get("removed"):
+                continue
+            decoded = decode_log(log)
+            if decoded is None:
+                continue
+            event, values = decoded
+            rows.append((
+                int(log["blockNumber"], 16),
+                int(log["logIndex"], 16),
+                log["blockHash"],
+                log["transactionHash"].lower(),
+                event,
+                values["id"],
+                values["borrower"].lower(),
+                str(values["amount"]),
+                values.get("interestRate"),
+            ))
+            LOAN_INDEXER_EVENTS.labels(event).inc()
+        return rows
+
+    async def _store(self, from_block: int, to_block: int, rows, block_hash: str):
+        async with db.acquire() as conn:
+            # Re-indexing a range replaces it, so retries after a crash are idempotent
+            await conn.execute(
+                "DELETE FROM loan_events WHERE block_number BETWEEN %s AND %s", (from_block, to_block)
+            )
+            if rows:
+                await conn.executemany(
+                    "INSERT INTO loan_events (block_number, log_index, block_hash, tx_hash, event, loan_id, "
+                    "borrower, amount, interest_rate) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    rows,
+                )
+            await conn.execute(
+                "DELETE FROM loan_indexer_blocks WHERE block_number < %s OR block_number >= %s",
+                (to_block - self.reorg_depth, to_block),
+            )
+            await conn.execute(
+                "INSERT INTO loan_indexer_blocks (block_number, block_hash) VALUES (%s, %s)",
+                (to_block, block_hash),
+            )
+            await conn.commit()
+
+    def _update_lag(self):
+        LOAN_INDEXER_HEAD.set(self.head)
+        LOAN_INDEXER_BLOCK.set(self.cursor)
+        LOAN_INDEXER_LAG.set(max(self.head - self.cursor, 0))
+
+    async def sync(self):
+        """
+        Indexes up to head - confirmations. Returns the number of events stored.
+        """
+        self.head = int(await self.rpc.call("eth_blockNumber"), 16)
+        if self.cursor is None:
+            self.cursor = await self._load_cursor()
+        await self._check_reorg()
+
+        target = self.head - self.confirmations
+        stored = 0
+        while self.cursor < target:
+            ranges = []
+            start = self.cursor + 1
+            while start <= target and len(ranges) < self.parallel:
+                end = min(start + self.chunk - 1, target)
+                ranges.append((start, end))
+                start = end + 1
+            results = await asyncio.gather(*(self._logs(a, b) for a, b in ranges))
+            end = ranges[-1][1]
+            block_hash = (await self._block_hashes([end]))[end]
+            rows = self._rows([log for logs in results for log in logs])
+            await self._store(ranges[0][0], end, rows, block_hash)
+            self.cursor = end
+            stored += len(rows)
+            self._update_lag()
+        self.events += stored
+        self._update_lag()
+        return stored
+
+    async def _loop(self):
+        await self.ensure_schema()
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Loan indexer error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None and self.contract_address:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Reads
+
+    async def record_owner(self, tx_hash: str, user_id: str):
+        """
+        Links a requestLoan transaction sent on a user's behalf to that user.
+        """
+        async with db.acquire() as conn:
+            await conn.execute(
+                "INSERT INTO loan_owners (tx_hash, user_id) VALUES (%s, %s)", (tx_hash.lower(), user_id)
+            )
+            await conn.commit()
+
+    async def _loans(self, where: str, params) -> list:
+        async with db.acquire() as conn:
+            requests = await conn.fetchall(
+                f"SELECT * FROM loan_events WHERE event = 'LoanRequested' AND {where} ORDER BY block_number, log_index",
+                params,
+            )
+            payments = []
+            if requests:
+                ids = [row["loan_id"] for row in requests]
+                placeholders = ", ".join(["%s"] * len(ids))
+                payments = await conn.fetchall(
+                    f"SELECT * FROM loan_events WHERE event = 'LoanPaid' AND loan_id IN ({placeholders}) "
+                    "ORDER BY block_number, log_index",
+                    ids,
+                )
+        by_loan = {}
+        for payment in payments:
+            by_loan.setdefault(payment["loan_id"], []).append(payment)
+        return [loan_summary(row, by_loan.get(row["loan_id"], [])) for row in requests]
+
+    async def loans_for_user(self, user_id: str) -> list:
+        return await self._loans("tx_hash IN (SELECT tx_hash FROM loan_owners WHERE user_id = %s)", (user_id,))
+
+    async def loans_for_borrower(self, address: str) -> list:
+        return await self._loans("borrower = %s", (address.lower(),))
+
+    async def loan(self, loan_id: int):
+        loans = await self._loans("loan_id = %s", (loan_id,))
+        return loans[0] if loans else None
+
+    def stats(self):
+        return {
+            "enabled": self._task is not None,
+            "contract": self.contract_address,
+            "head": self.head,
+            "indexed_block": self.cursor,
+            "lag_blocks": max(self.head - self.cursor, 0) if self.head is not None and self.cursor is not None else None,
+            "events": self.events,
+            "reorgs": self.reorgs,
+            "errors": self.errors,
+        }
+
+
+# Shared indexer for the whole process
+loan_indexer = LoanEventIndexer()
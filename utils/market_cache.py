@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Refresh intervals and staleness bound (seconds)
+PAIRS_REFRESH_SECONDS = float(os.getenv("MARKET_PAIRS_REFRESH_SECONDS", 3600))
+TICKER_REFRESH_SECONDS = float(os.getenv("MARKET_TICKER_REFRESH_SECONDS", 5))
+MAX_STALENESS_SECONDS = float(os.getenv("MARKET_MAX_STALENESS_SECONDS", 30))
+STALE_WHILE_REVALIDATE = os.getenv("MARKET_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+
+
+class MarketSnapshotService:
+    """
+    Keeps the Kraken market snapshot in memory.
+    Asset pairs are refreshed rarely, tickers on a short interval, both in the background.
+    """
+
+    def __init__(self, fetch_pairs, fetch_ticker,
+                 pairs_interval=PAIRS_REFRESH_SECONDS,
+                 ticker_interval=TICKER_REFRESH_SECONDS,
+                 max_staleness=MAX_STALENESS_SECONDS,
+                 stale_while_revalidate=STALE_WHILE_REVALIDATE,
+                 broadcaster=None):
+        # fetch_pairs() -> {pair: wsname}, fetch_ticker(pairs) -> Kraken ticker "result" dict
+        self.fetch_pairs = fetch_pairs
+        self.fetch_ticker = fetch_ticker
+        self.pairs_interval = pairs_interval
+        self.ticker_interval = ticker_interval
+        self.max_staleness = max_staleness
+        self.stale_while_revalidate = stale_while_revalidate
+        self.broadcaster = broadcaster
+        # Followers in multi-worker mode: the leader polls Kraken and replicates the snapshot
+        self.replica = False
+
+        self.pairs = {}
+        self.tickers = {}
+        self._data = []
+        self._dirty = False
+        self.version = 0
+        self.updated_at = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+        self._lock = asyncio.Lock()
+        self._revalidating = None
+        self._tasks = []
+
+    async def refresh_pairs(self):
+        self.pairs = await self.fetch_pairs()
+        logger.info(f"Market pairs refreshed: {len(self.pairs)} pairs")
+
+    async def refresh_tickers(self):
+        seen = self.version
+        async with self._lock:
+            # Callers that queued behind a refresh reuse its result instead of refetching
+            if self.version != seen and self.is_fresh():
+                return
+            if not self.pairs:
+                await self.refresh_pairs()
+            result = await self.fetch_ticker(list(self.pairs))
+            self.update(result)
+
+    def update(self, ticker_result):
+        """
+        Replaces the snapshot with a Kraken ticker "result" payload.
+        """
+        tickers = {}
+        for pair, info in ticker_result.items():
+            tickers[pair] = {
+                "crypto": pair,
+                "last_price": info["c"][0],
+                "bid": info["b"][0],
+                "ask": info["a"][0]
+            }
+        self.replace(tickers)
+
+    def replace(self, tickers):
+        """
+        Swaps in a full set of normalized tickers, e.g. a snapshot replicated from the leader worker.
+        """
+        if self.broadcaster:
+            # Only changed pairs are pushed to streaming clients
+            for pair, ticker in tickers.items():
+                if self.tickers.get(pair) != ticker:
+                    self.broadcaster.publish(pair, ticker)
+        self.tickers = tickers
+        self._touch()
+
+    def update_pair(self, pair, last_price, bid, ask):
+        """
+        Applies a single streamed ticker update.
+        """
+        self.tickers[pair] = {"crypto": pair, "last_price": last_price, "bid": bid, "ask": ask}
+        self._touch()
+
+    def _touch(self):
+        self._dirty = True
+        self.version += 1
+        self.updated_at = time.time()
+
+    @property
+    def data(self):
+        # Rebuilt at most once per version, however many updates arrived
+        if self._dirty:
+            self._data = list(self.tickers.values())
+            self._dirty = False
+        return self._data
+
+    def age(self):
+        if self.updated_at is None:
+            return None
+        return time.time() - self.updated_at
+
+    def is_fresh(self):
+        age = self.age()
+        return age is not None and age <= self.max_staleness
+
+    async def get(self):
+        """
+        Returns the snapshot, refreshing it inline only when nothing usable is in memory.
+        Replicas never fetch; they serve what they have until the leader's next snapshot arrives.
+        """
+        if self.is_fresh():
+            self.hits += 1
+            return self.data
+
+        if self.replica:
+            if self.data:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+            return self.data
+
+        if self.data and self.stale_while_revalidate:
+            self.stale_hits += 1
+            if self._revalidating is None or self._revalidating.done():
+                self._revalidating = asyncio.create_task(self._safe_refresh(self.refresh_tickers))
+            return self.data
+
+        self.misses += 1
+        await self.refresh_tickers()
+        return self.data
+
+    def price(self, pair):
+        ticker = self.tickers.get(pair)
+        return float(ticker["last_price"]) if ticker else None
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "pairs": len(self.pairs),
+            "age_seconds": self.age(),
+            "max_staleness_seconds": self.max_staleness,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+        }
+
+    async def _safe_refresh(self, refresh):
+        try:
+            await refresh()
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.error(f"Market snapshot refresh failed: {e}")
+
+    async def _loop(self, refresh, interval):
+        while True:
+            await self._safe_refresh(refresh)
+            await asyncio.sleep(interval)
+
+    def start(self, poll_tickers=True):
+        """
+        Starts the background refresh. Ticker polling is skipped when a streaming feed updates the snapshot.
+        """
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._loop(self.refresh_pairs, self.pairs_interval))]
+        if poll_tickers:
+            self._tasks.append(asyncio.create_task(self._loop(self.refresh_tickers, self.ticker_interval)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
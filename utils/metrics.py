@@ -0,0 +1,120 @@
+import os
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST  # noqa: F401
+
+# Database pool
+DB_POOL_SIZE = Gauge("db_pool_size", "Open connections in the database pool")
+DB_POOL_IN_USE = Gauge("db_pool_in_use", "Connections currently checked out of the database pool")
+DB_POOL_MAX = Gauge("db_pool_max", "Maximum size of the database pool")
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting to acquire a database connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Database connection acquires that timed out")
+DB_QUERY_LATENCY = Histogram(
+    "db_query_seconds", "Database query latency", ["operation"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Failed database queries", ["operation"])
+
+# Quote service
+QUOTE_REQUESTS = Counter("quote_requests_total", "Quote lookups requested by callers", ["kind"])
+QUOTE_UPSTREAM_CALLS = Counter("quote_upstream_calls_total", "Upstream quote provider calls", ["provider"])
+QUOTE_UPSTREAM_ERRORS = Counter("quote_upstream_errors_total", "Failed upstream quote provider calls", ["provider"])
+QUOTE_UPSTREAM_LATENCY = Histogram(
+    "quote_upstream_seconds", "Upstream quote provider latency", ["provider"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+QUOTE_BREAKER_OPEN = Gauge("quote_breaker_open", "1 while a provider's circuit breaker is open", ["provider"])
+
+# LLM advisor
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time from request to first streamed token",
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10),
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second", "Streaming throughput per completion",
+    buckets=(5, 10, 20, 40, 60, 80, 100, 150, 200, 400),
+)
+LLM_COMPLETIONS = Counter("llm_completions_total", "LLM completions by outcome", ["outcome"])
+LLM_ACTIVE_STREAMS = Gauge("llm_active_streams", "LLM completions currently streaming")
+
+# Chat response cache
+CHAT_CACHE_REQUESTS = Counter("chat_cache_requests_total", "Chat cache lookups by result", ["result"])
+CHAT_CACHE_SIZE = Gauge("chat_cache_entries", "Answers held in the chat response cache")
+
+# Web3 JSON-RPC
+WEB3_RPC_CALLS = Counter("web3_rpc_calls_total", "JSON-RPC calls by method", ["method"])
+WEB3_RPC_REQUESTS = Counter("web3_rpc_requests_total", "HTTP requests to the JSON-RPC node (a batch counts once)")
+WEB3_RPC_ERRORS = Counter("web3_rpc_errors_total", "Failed JSON-RPC calls by method", ["method"])
+WEB3_RPC_LATENCY = Histogram(
+    "web3_rpc_seconds", "JSON-RPC request latency",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Loan event indexer
+LOAN_INDEXER_HEAD = Gauge("loan_indexer_chain_head", "Latest block number reported by the node")
+LOAN_INDEXER_BLOCK = Gauge("loan_indexer_indexed_block", "Last block indexed by the loan event indexer")
+LOAN_INDEXER_LAG = Gauge("loan_indexer_lag_blocks", "Blocks between the chain head and the indexed block")
+LOAN_INDEXER_EVENTS = Counter("loan_indexer_events_total", "Loan events indexed", ["event"])
+LOAN_INDEXER_REORGS = Counter("loan_indexer_reorgs_total", "Chain reorganisations rolled back by the indexer")
+
+# Rate limiting
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected with 429 by route class", ["policy"])
+
+# HTTP server
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "http_request_seconds", "HTTP request latency by route", ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+# Outbound dependencies (kraken, firebase, stripe, openai, web3, mysql/sqlite)
+OUTBOUND_LATENCY = Histogram(
+    "outbound_request_seconds", "Latency of calls to external dependencies", ["dependency", "operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+OUTBOUND_ERRORS = Counter("outbound_errors_total", "Failed calls to external dependencies", ["dependency", "operation"])
+
+# Event loop
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wake-up and when the event loop ran it",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+EVENT_LOOP_LAG_MAX = Gauge("event_loop_lag_max_seconds", "Worst event loop lag in the last sampling window")
+
+# Dependency container
+DEPENDENCY_READY = Gauge("dependency_ready", "1 when an external dependency is created and passing its check", ["dependency"])
+DEPENDENCY_INIT_SECONDS = Gauge("dependency_init_seconds", "Time taken to create each dependency", ["dependency"])
+
+# Cross-worker invalidation bus
+BUS_MESSAGES = Counter("invalidation_bus_messages_total", "Invalidation bus messages by channel", ["channel", "direction"])
+BUS_LEADER = Gauge("invalidation_bus_leader", "1 in the worker that owns upstream polling", multiprocess_mode="liveall")
+BUS_PEERS = Gauge("invalidation_bus_peers", "Workers connected to the leader's hub", multiprocess_mode="liveall")
+
+# Write-behind batching
+WRITE_BATCH_SIZE = Histogram(
+    "write_batch_size", "Writes committed together in one batch", ["writer"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+WRITE_BATCH_LATENCY = Histogram(
+    "write_batch_seconds", "Time to write and commit one batch", ["writer"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+WRITE_BATCH_FALLBACKS = Counter("write_batch_fallbacks_total", "Batches that failed and were retried one write at a time", ["writer"])
+REGISTRATION_OUTBOX = Counter("registration_outbox_total", "Registrations settled by outcome", ["outcome"])
+
+
+# Precomputed JSON responses
+RESPONSE_CACHE = Counter("response_cache_total", "Cached JSON responses by route and result", ["route", "result"])
+
+
+def render() -> bytes:
+    """
+    Exposition for this process, or for every worker when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
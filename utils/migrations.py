@@ -0,0 +1,118 @@
+"""
+Versioned schema migrations.
+
+    python -m utils.migrations            # apply pending migrations
+    python -m utils.migrations status     # list applied and pending versions
+
+Migrations are the numbered .sql files in migrations/, applied in order and recorded
+in schema_migrations. Each file is plain SQL that runs on both MySQL and SQLite;
+statements are separated by ";" at the end of a line.
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+from utils.db import db
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.getenv("MIGRATIONS_DIR", os.path.join(os.path.dirname(__file__), "..", "migrations"))
+# Also apply pending migrations when the leader worker starts (start.sh already runs the CLI)
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "false").lower() == "true"
+# MySQL advisory lock so two deploys never migrate at once
+MIGRATION_LOCK_TIMEOUT = int(os.getenv("MIGRATION_LOCK_TIMEOUT", 60))
+
+FILENAME = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """
+    [(version, name, statements)] sorted by version.
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            sql = "\n".join(line for line in f.read().splitlines() if not line.lstrip().startswith("--"))
+        statements = [statement.strip() for statement in re.split(r";\s*$", sql, flags=re.M) if statement.strip()]
+        migrations.append((int(match.group(1)), match.group(2), statements))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+async def applied_versions(conn):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, applied_at DOUBLE NOT NULL)"
+    )
+    await conn.commit()
+    rows = await conn.fetchall("SELECT version FROM schema_migrations")
+    return {row["version"] for row in rows}
+
+
+async def migrate(directory=MIGRATIONS_DIR):
+    """
+    Applies every pending migration in order and returns the versions applied.
+    """
+    applied = []
+    async with db.acquire() as conn:
+        if db.backend == "mysql":
+            row = await conn.fetchone("SELECT GET_LOCK('fintt_migrations', %s) AS locked", (MIGRATION_LOCK_TIMEOUT,))
+            if not row or not row["locked"]:
+                raise RuntimeError("Another process is running migrations")
+        try:
+            done = await applied_versions(conn)
+            for version, name, statements in discover(directory):
+                if version in done:
+                    continue
+                start = time.perf_counter()
+                # MySQL commits DDL implicitly, so a migration is recorded only after all of it ran
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                    (version, name, time.time()),
+                )
+                await conn.commit()
+                applied.append(version)
+                logger.info(f"Applied migration {version:04d}_{name} in {time.perf_counter() - start:.2f}s")
+        finally:
+            if db.backend == "mysql":
+                await conn.fetchone("SELECT RELEASE_LOCK('fintt_migrations') AS released")
+    return applied
+
+
+async def status(directory=MIGRATIONS_DIR):
+    async with db.acquire() as conn:
+        done = await applied_versions(conn)
+    return [(version, name, version in done) for version, name, _ in discover(directory)]
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "apply"
+    try:
+        if command == "status":
+            for version, name, done in await status():
+                print(f"{version:04d}_{name}: {'applied' if done else 'pending'}")
+        elif command == "apply":
+            applied = await migrate()
+            print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+        else:
+            sys.exit(f"Unknown command: {command}")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
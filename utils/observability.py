@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager, nullcontext
+from utils.metrics import (
+    HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, OUTBOUND_LATENCY, OUTBOUND_ERRORS,
+    EVENT_LOOP_LAG, EVENT_LOOP_LAG_MAX,
+)
+
+logger = logging.getLogger(__name__)
+
+# Spans per outbound call when opentelemetry-api is installed and an SDK is configured
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.5))
+# Reported max lag covers this many samples
+EVENT_LOOP_LAG_WINDOW = int(os.getenv("EVENT_LOOP_LAG_WINDOW", 20))
+
+tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        tracer = trace.get_tracer("fintt-backend")
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed; tracing disabled")
+
+
+@asynccontextmanager
+async def track(dependency: str, operation: str):
+    """
+    Times one outbound call into OUTBOUND_LATENCY / OUTBOUND_ERRORS, inside a
+    client span when tracing is on.
+
+        async with track("kraken", "Ticker"):
+            response = await client.get(...)
+    """
+    span = nullcontext()
+    if tracer is not None:
+        span = tracer.start_as_current_span(
+            f"{dependency} {operation}", kind=trace.SpanKind.CLIENT,
+            attributes={"peer.service": dependency, "operation": operation},
+        )
+    start = time.perf_counter()
+    with span:
+        try:
+            yield
+        except Exception:
+            OUTBOUND_ERRORS.labels(dependency, operation).inc()
+            raise
+        finally:
+            OUTBOUND_LATENCY.labels(dependency, operation).observe(time.perf_counter() - start)
+
+
+def route_label(scope, route) -> str:
+    """
+    Template of the matched route including the prefix it was included with. FastAPI keeps
+    included routes un-prefixed ("/orders/{order_id}" under "/trade"), so the prefix is the
+    part of the path in front of what the route's own pattern matches.
+    """
+    root_path = scope.get("root_path", "")
+    path = scope["path"].removeprefix(root_path)
+    template = route.path
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.match(path):
+        for i in range(1, len(path)):
+            if path[i] == "/" and regex.match(path[i:]):
+                template = path[:i] + route.path
+                break
+    return root_path + template
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight count per route. Routes
+    are labelled by their template ("/trade/orders/{order_id}"), never the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Requests rejected before routing (rate limits, entitlements) or 404s
+            if getattr(route, "path", None):
+                label = route_label(scope, route)
+            else:
+                label = "<rejected>" if status in (401, 403, 429) else "<unmatched>"
+            HTTP_LATENCY.labels(scope["method"], label).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(scope["method"], label, str(status)).inc()
+
+
+class EventLoopLagMonitor:
+    """
+    Sleeps for a fixed interval and records how late the loop woke it up; sustained
+    lag means something is blocking the loop.
+    """
+
+    def __init__(self, interval=EVENT_LOOP_LAG_INTERVAL, window=EVENT_LOOP_LAG_WINDOW):
+        self.interval = interval
+        self.window = window
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _loop(self):
+        samples = []
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - start - self.interval, 0.0)
+            EVENT_LOOP_LAG.observe(lag)
+            samples.append(lag)
+            if len(samples) > self.window:
+                samples.pop(0)
+            self.last_lag = lag
+            self.max_lag = max(samples)
+            EVENT_LOOP_LAG_MAX.set(self.max_lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {"last_lag_seconds": self.last_lag, "max_lag_seconds": self.max_lag, "interval": self.interval}
+
+
+# Shared event loop monitor for the whole process
+loop_monitor = EventLoopLagMonitor()
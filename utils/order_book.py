@@ -0,0 +1,148 @@
+import zlib
+from array import array
+from bisect import bisect_left
+
+# Kraken computes its book checksum over the top 10 levels of each side
+CHECKSUM_LEVELS = 10
+
+
+class BookSide:
+    """
+    One side of an L2 book kept as sorted parallel arrays.
+    Bids are stored with negated keys so both sides sort ascending (best level first).
+    """
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self.keys = array("d")
+        self.sizes = array("d")
+        # Raw strings as sent by Kraken, needed to reproduce the checksum
+        self.raw_prices = []
+        self.raw_sizes = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        del self.keys[:]
+        del self.sizes[:]
+        self.raw_prices.clear()
+        self.raw_sizes.clear()
+
+    def update(self, price: str, size: str):
+        key = -float(price) if self.descending else float(price)
+        i = bisect_left(self.keys, key)
+        exists = i < len(self.keys) and self.keys[i] == key
+
+        if float(size) == 0:
+            if exists:
+                del self.keys[i]
+                del self.sizes[i]
+                del self.raw_prices[i]
+                del self.raw_sizes[i]
+            return
+
+        if exists:
+            self.sizes[i] = float(size)
+            self.raw_sizes[i] = size
+        else:
+            self.keys.insert(i, key)
+            self.sizes.insert(i, float(size))
+            self.raw_prices.insert(i, price)
+            self.raw_sizes.insert(i, size)
+
+    def truncate(self, depth: int):
+        del self.keys[depth:]
+        del self.sizes[depth:]
+        del self.raw_prices[depth:]
+        del self.raw_sizes[depth:]
+
+    def best(self):
+        if not self.keys:
+            return None
+        return abs(self.keys[0])
+
+    def levels(self, n: int):
+        return [[abs(key), size] for key, size in zip(self.keys[:n], self.sizes[:n])]
+
+
+class OrderBook:
+    def __init__(self, depth: int = 10):
+        self.depth = depth
+        self.asks = BookSide(descending=False)
+        self.bids = BookSide(descending=True)
+        self.synced = False
+
+    def apply_snapshot(self, asks, bids):
+        self.asks.clear()
+        self.bids.clear()
+        for level in asks:
+            self.asks.update(level[0], level[1])
+        for level in bids:
+            self.bids.update(level[0], level[1])
+        self.asks.truncate(self.depth)
+        self.bids.truncate(self.depth)
+        self.synced = True
+
+    def apply_update(self, asks, bids, checksum=None) -> bool:
+        """
+        Applies incremental levels. Returns False when the book has drifted and needs a resync.
+        """
+        if not self.synced:
+            return False
+        for level in asks:
+            self.asks.update(level[0], level[1])
+        for level in bids:
+            self.bids.update(level[0], level[1])
+        self.asks.truncate(self.depth)
+        self.bids.truncate(self.depth)
+
+        if checksum is not None and self.checksum() != int(checksum):
+            self.synced = False
+            return False
+        return True
+
+    def checksum(self) -> int:
+        parts = []
+        for side in (self.asks, self.bids):
+            for price, size in zip(side.raw_prices[:CHECKSUM_LEVELS], side.raw_sizes[:CHECKSUM_LEVELS]):
+                parts.append(price.replace(".", "").lstrip("0"))
+                parts.append(size.replace(".", "").lstrip("0"))
+        return zlib.crc32("".join(parts).encode("utf-8"))
+
+    def top(self):
+        return {"bid": self.bids.best(), "ask": self.asks.best()}
+
+    def to_dict(self, levels: int = 10):
+        return {"asks": self.asks.levels(levels), "bids": self.bids.levels(levels)}
+
+
+class OrderBookStore:
+    """
+    L2 books per pair, keyed by the REST pair name (e.g. XXBTZUSD).
+    """
+
+    def __init__(self, depth: int = 10):
+        self.depth = depth
+        self.books = {}
+
+    def get(self, pair: str):
+        return self.books.get(pair)
+
+    def book(self, pair: str) -> OrderBook:
+        if pair not in self.books:
+            self.books[pair] = OrderBook(self.depth)
+        return self.books[pair]
+
+    def best(self, pair: str):
+        """
+        Best bid/ask for a synced book, or None.
+        """
+        book = self.books.get(pair)
+        if book is None or not book.synced:
+            return None
+        return book.top()
+
+
+# Shared store for the whole process
+order_books = OrderBookStore()
@@ -0,0 +1,333 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import httpx
+from utils.broadcast import Subscription
+from utils.kraken import execute_trade, find_order
+from utils.kraken_client import KrakenError
+from utils.journal import Journal
+from utils.invalidation import worker_path, peer_paths
+
+logger = logging.getLogger(__name__)
+
+ORDER_JOURNAL_PATH = os.getenv("ORDER_JOURNAL_PATH", "orders.journal")
+ORDER_QUEUE_MAX = int(os.getenv("ORDER_QUEUE_MAX", 1000))
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", 4))
+ORDER_PAIR_CONCURRENCY = int(os.getenv("ORDER_PAIR_CONCURRENCY", 1))
+ORDER_MAX_ATTEMPTS = int(os.getenv("ORDER_MAX_ATTEMPTS", 5))
+ORDER_BACKOFF_BASE = float(os.getenv("ORDER_BACKOFF_BASE", 1))
+ORDER_BACKOFF_MAX = float(os.getenv("ORDER_BACKOFF_MAX", 30))
+# Finished orders older than this are dropped from memory and, on restart, from the journal
+ORDER_RETENTION_SECONDS = float(os.getenv("ORDER_RETENTION_SECONDS", 86400))
+ORDER_EVICTION_INTERVAL = float(os.getenv("ORDER_EVICTION_INTERVAL", 300))
+# Orders whose AddOrder outcome is unknown are looked up by cl_ord_id this long after the failure,
+# giving Kraken time to register an order that was still in flight
+ORDER_RECONCILE_DELAY = float(os.getenv("ORDER_RECONCILE_DELAY", 2))
+ORDER_RECONCILE_ATTEMPTS = int(os.getenv("ORDER_RECONCILE_ATTEMPTS", 5))
+
+QUEUED, SUBMITTING, RETRYING, SUBMITTED, FAILED = "queued", "submitting", "retrying", "submitted", "failed"
+# AddOrder may or may not have reached Kraken (lost response, crash mid-call)
+UNKNOWN = "unknown"
+TERMINAL = {SUBMITTED, FAILED}
+# The request never reached Kraken, so sending it again cannot place a second order
+NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class QueueFull(Exception):
+    """
+    Raised when the order queue is at capacity; callers should retry later.
+    """
+
+
+class OrderPipeline:
+    """
+    Accepts trades into a bounded queue and drains them with a worker pool,
+    at most ORDER_PAIR_CONCURRENCY in flight per pair.
+    """
+
+    def __init__(self, journal_path=ORDER_JOURNAL_PATH, queue_max=ORDER_QUEUE_MAX, workers=ORDER_WORKERS):
+        self.journal_path = journal_path
+        self.journal = Journal(worker_path(journal_path))
+        self.queue = asyncio.Queue(maxsize=queue_max)
+        self.workers = workers
+        self.orders = {}
+        self.idempotency_keys = {}  # (user id, Idempotency-Key) -> order id
+        self.pair_limits = {}
+        self.watchers = {}
+        self.rate_limited_until = 0
+        # Called with the order once Kraken accepted it
+        self.listeners = []
+        # Called with a copy of the order after every state change (cross-worker replication)
+        self.replicas = []
+        self._tasks = []
+
+    def _save(self, order: dict) -> asyncio.Future:
+        """
+        Journals, notifies and replicates a state change; the future resolves once it is on disk.
+        """
+        order["updated_at"] = time.time()
+        written = self.journal.append(order)
+        self._notify(order)
+        for replica in self.replicas:
+            replica(dict(order))
+        return written
+
+    @staticmethod
+    def _idempotency_scope(order: dict):
+        # Keys are chosen by clients, so two users may send the same one
+        return (order["user_id"], order["idempotency_key"])
+
+    def _notify(self, order: dict):
+        for subscription in self.watchers.get(order["id"], ()):
+            subscription.push("order", dict(order))
+
+    def apply_remote(self, order: dict):
+        """
+        Mirrors an order owned by another worker so lookups, idempotency keys and
+        status streams work whichever worker serves the request.
+        """
+        current = self.orders.get(order["id"])
+        if current is not None and current["updated_at"] > order["updated_at"]:
+            return
+        self.orders[order["id"]] = order
+        if order["idempotency_key"]:
+            self.idempotency_keys[self._idempotency_scope(order)] = order["id"]
+        self._notify(order)
+        # Settlement listeners (e.g. portfolio refreshes) run on every worker, once per order
+        if order["status"] == SUBMITTED and (current is None or current["status"] != SUBMITTED):
+            for listener in self.listeners:
+                listener(order)
+
+    async def submit(self, pair: str, amount: float, action: str, idempotency_key: str = None, user_id=None) -> dict:
+        """
+        Queues a trade once it is journaled. A repeated idempotency key from the same user
+        returns the original order.
+        """
+        if idempotency_key and (user_id, idempotency_key) in self.idempotency_keys:
+            return self.orders[self.idempotency_keys[(user_id, idempotency_key)]]
+        if self.queue.full():
+            raise QueueFull("Order queue is full")
+
+        now = time.time()
+        order = {
+            "id": str(uuid.uuid4()),
+            "idempotency_key": idempotency_key,
+            "user_id": user_id,
+            "pair": pair,
+            "amount": amount,
+            "action": action,
+            "status": QUEUED,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": now,
+        }
+        self.orders[order["id"]] = order
+        if idempotency_key:
+            self.idempotency_keys[(user_id, idempotency_key)] = order["id"]
+        await self._save(order)
+        try:
+            self.queue.put_nowait(order["id"])
+        except asyncio.QueueFull:
+            # Filled up while the order was being journaled
+            order["status"] = FAILED
+            order["error"] = "Order queue is full"
+            await self._save(order)
+            raise QueueFull("Order queue is full")
+        return order
+
+    def get(self, order_id: str):
+        return self.orders.get(order_id)
+
+    def watch(self, order_id: str) -> Subscription:
+        subscription = Subscription()
+        self.watchers.setdefault(order_id, set()).add(subscription)
+        return subscription
+
+    def unwatch(self, order_id: str, subscription: Subscription):
+        watchers = self.watchers.get(order_id)
+        if watchers is not None:
+            watchers.discard(subscription)
+            if not watchers:
+                del self.watchers[order_id]
+
+    def _pair_limit(self, pair: str) -> asyncio.Semaphore:
+        if pair not in self.pair_limits:
+            self.pair_limits[pair] = asyncio.Semaphore(ORDER_PAIR_CONCURRENCY)
+        return self.pair_limits[pair]
+
+    async def _settle(self, order: dict, result: dict):
+        order["result"] = result
+        order["status"] = SUBMITTED
+        order["error"] = None
+        await self._save(order)
+        for listener in self.listeners:
+            listener(order)
+
+    async def _reconcile(self, order: dict) -> bool:
+        """
+        Looks up an order whose AddOrder outcome is unknown by its cl_ord_id. Returns False only
+        when Kraken confirmed it was never placed; True when it was found (and settled) or is
+        still unknown, in which case it is left for the next restart rather than risking a second fill.
+        """
+        order["status"] = UNKNOWN
+        await self._save(order)
+        for attempt in range(ORDER_RECONCILE_ATTEMPTS):
+            await asyncio.sleep(min(ORDER_RECONCILE_DELAY * 2 ** attempt, ORDER_BACKOFF_MAX))
+            try:
+                found = await find_order(order["id"])
+            except (KrakenError, httpx.TransportError, httpx.HTTPStatusError) as e:
+                order["error"] = f"Order lookup failed: {e}"
+                continue
+            if found is None:
+                return False
+            txid, info = found
+            if info.get("status") in ("canceled", "expired") and not float(info.get("vol_exec") or 0):
+                order["status"] = FAILED
+                order["error"] = f"Kraken {info['status']} the order"
+                await self._save(order)
+            else:
+                await self._settle(order, {"txid": [txid], "descr": info.get("descr")})
+            return True
+        await self._save(order)
+        logger.error(f"Order {order['id']} outcome still unknown after {ORDER_RECONCILE_ATTEMPTS} lookups")
+        return True
+
+    async def _execute(self, order: dict):
+        # Interrupted after SUBMITTING was journaled: Kraken may already have the order
+        if order["status"] in (SUBMITTING, UNKNOWN) and await self._reconcile(order):
+            return
+        while True:
+            if order["attempts"] >= ORDER_MAX_ATTEMPTS:
+                order["status"] = FAILED
+                await self._save(order)
+                return
+            # Shared pause so every worker backs off once Kraken rate-limits one of them
+            pause = self.rate_limited_until - time.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            order["attempts"] += 1
+            order["status"] = SUBMITTING
+            # On disk before Kraken sees the order, so a crash never loses track of it
+            await self._save(order)
+            try:
+                # cl_ord_id is how _reconcile finds the order again; Kraken only keeps it unique
+                # among open orders, so it does not stop a filled market order from filling twice
+                result = await execute_trade(order["pair"], order["amount"], order["action"],
+                                             cl_ord_id=order["id"])
+            except (KrakenError, *NOT_SENT) as e:
+                # Rejected by Kraken or never sent: the order was not placed
+                order["error"] = str(e)
+                if isinstance(e, KrakenError) and not e.rate_limited:
+                    order["status"] = FAILED
+                    await self._save(order)
+                    return
+                delay = min(ORDER_BACKOFF_BASE * 2 ** (order["attempts"] - 1), ORDER_BACKOFF_MAX)
+                if isinstance(e, KrakenError):
+                    self.rate_limited_until = max(self.rate_limited_until, time.time() + delay)
+                order["status"] = RETRYING
+                await self._save(order)
+                await asyncio.sleep(delay)
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                # Timeouts and 5xx after the request went out: resubmit only once Kraken confirms
+                # it has no order with this cl_ord_id
+                order["error"] = str(e)
+                if await self._reconcile(order):
+                    return
+            except Exception as e:
+                order["status"] = FAILED
+                order["error"] = str(e)
+                await self._save(order)
+                return
+            else:
+                await self._settle(order, result)
+                return
+
+    async def _worker(self):
+        while True:
+            order_id = await self.queue.get()
+            try:
+                order = self.orders[order_id]
+                async with self._pair_limit(order["pair"]):
+                    await self._execute(order)
+            except Exception as e:
+                logger.error(f"Order worker error for {order_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _evict(self):
+        """
+        Forgets finished orders older than the retention window, with their idempotency keys.
+        """
+        cutoff = time.time() - ORDER_RETENTION_SECONDS
+        expired = [o for o in self.orders.values() if o["status"] in TERMINAL and o["updated_at"] < cutoff]
+        for order in expired:
+            del self.orders[order["id"]]
+            if order["idempotency_key"]:
+                self.idempotency_keys.pop(self._idempotency_scope(order), None)
+        return len(expired)
+
+    async def _evictor(self):
+        while True:
+            await asyncio.sleep(ORDER_EVICTION_INTERVAL)
+            self._evict()
+
+    def _recover(self):
+        """
+        Reloads the journal, drops expired finished orders and requeues unfinished ones;
+        orders caught mid-submission are reconciled with Kraken before anything is resent.
+        """
+        cutoff = time.time() - ORDER_RETENTION_SECONDS
+        orders = {
+            order_id: order for order_id, order in self.journal.load().items()
+            if order["status"] not in TERMINAL or order["updated_at"] >= cutoff
+        }
+        self.journal.compact(orders)
+        # Other workers' recent orders are visible here but stay owned (and requeued) by them
+        peers = {}
+        for path in peer_paths(self.journal_path):
+            try:
+                peers.update(Journal(path).load())
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading peer order journal {path}: {e}")
+        self.orders = {**{i: o for i, o in peers.items() if o["updated_at"] >= cutoff}, **orders}
+        self.idempotency_keys = {
+            self._idempotency_scope(o): o["id"] for o in self.orders.values() if o["idempotency_key"]
+        }
+        for order in orders.values():
+            if order["status"] not in TERMINAL:
+                self.queue.put_nowait(order["id"])
+        logger.info(f"Order journal recovered: {len(orders)} orders, {self.queue.qsize()} requeued")
+
+    def start(self):
+        if self._tasks:
+            return
+        self._recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._evictor()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.journal.close()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "queue_max": self.queue.maxsize,
+            "workers": self.workers,
+            "orders": len(self.orders),
+            "unknown": sum(1 for order in self.orders.values() if order["status"] == UNKNOWN),
+            "journal_pending": len(self.journal.pending),
+            "journal_batches": self.journal.batches,
+            "rate_limited_for": max(0, self.rate_limited_until - time.time()),
+        }
+
+
+# Shared pipeline for the whole process
+order_pipeline = OrderPipeline()
@@ -0,0 +1,246 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+import numpy as np
+from utils.db import db
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_CACHE_SIZE = int(os.getenv("PORTFOLIO_CACHE_SIZE", 50000))
+# Incremental price adjustments accumulate float error; recompute a total from scratch this often
+PORTFOLIO_REVALUE_EVERY = int(os.getenv("PORTFOLIO_REVALUE_EVERY", 1000))
+QUOTE_CURRENCY = "USD"
+# Wallet currency codes that Kraken lists under a different name
+ASSET_ALIASES = {"BTC": "XBT", "XDG": "DOGE"}
+
+
+def normalize_asset(asset: str) -> str:
+    asset = asset.upper()
+    return ASSET_ALIASES.get(asset, asset)
+
+
+class Portfolio:
+    def __init__(self, user_id, balances: dict):
+        self.user_id = user_id
+        self.balances = balances  # asset -> quantity
+        self.total = 0.0
+        self.unpriced = []
+        self.adjustments = 0  # incremental updates since the last full revalue
+
+    def revalue(self, prices: dict):
+        total, unpriced = 0.0, []
+        for asset, quantity in self.balances.items():
+            price = prices.get(asset)
+            if price is None:
+                unpriced.append(asset)
+            else:
+                total += quantity * price
+        self.total = total
+        self.unpriced = unpriced
+        self.adjustments = 0
+
+    def to_dict(self, prices: dict):
+        positions = []
+        for asset, quantity in self.balances.items():
+            price = prices.get(asset)
+            positions.append({
+                "asset": asset,
+                "balance": quantity,
+                "price": price,
+                "value": quantity * price if price is not None else None,
+            })
+        return {
+            "user_id": self.user_id,
+            "currency": QUOTE_CURRENCY,
+            "total_value": self.total,
+            "positions": positions,
+            "unpriced": self.unpriced,
+        }
+
+
+class PortfolioStore:
+    """
+    Per-user valued portfolios kept in a bounded LRU.
+    Price moves adjust only the portfolios holding the moved asset; settled trades
+    reload only the trading user's balances.
+    """
+
+    def __init__(self, maxsize=PORTFOLIO_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.portfolios = OrderedDict()
+        self.holders = {}  # asset -> set of user ids
+        self.prices = {QUOTE_CURRENCY: 1.0}
+        self.pair_assets = {}  # Kraken pair -> base asset, for USD-quoted pairs
+        self.snapshot = None
+        self._indexed_pairs = 0
+        self.hits = 0
+        self.misses = 0
+        self._task = None
+
+    # Prices
+
+    def _index_pairs(self):
+        pair_assets = {}
+        for pair, wsname in self.snapshot.pairs.items():
+            if wsname and "/" in wsname:
+                base, quote = wsname.split("/", 1)
+                if quote == QUOTE_CURRENCY:
+                    pair_assets[pair] = normalize_asset(base)
+        self.pair_assets = pair_assets
+        self._indexed_pairs = len(self.snapshot.pairs)
+
+    def on_price(self, pair: str, last_price):
+        asset = self.pair_assets.get(pair)
+        if asset is None:
+            return
+        new = float(last_price)
+        old = self.prices.get(asset)
+        self.prices[asset] = new
+        for user_id in self.holders.get(asset, ()):
+            portfolio = self.portfolios[user_id]
+            quantity = portfolio.balances[asset]
+            if old is None or portfolio.adjustments >= PORTFOLIO_REVALUE_EVERY:
+                portfolio.revalue(self.prices)
+            else:
+                portfolio.total += quantity * (new - old)
+                portfolio.adjustments += 1
+
+    async def _follow_prices(self, subscription):
+        while True:
+            batch = await subscription.next_batch()
+            if len(self.snapshot.pairs) != self._indexed_pairs:
+                self._index_pairs()
+            for update in batch:
+                if "last_price" in update:
+                    self.on_price(update["crypto"], update["last_price"])
+
+    def start(self, snapshot, broadcaster):
+        """
+        Seeds prices from the market snapshot and follows its updates.
+        """
+        self.snapshot = snapshot
+        self._index_pairs()
+        for pair, ticker in snapshot.tickers.items():
+            self.on_price(pair, ticker["last_price"])
+        self._subscription = broadcaster.subscribe()
+        self._task = asyncio.create_task(self._follow_prices(self._subscription))
+
+    async def stop(self, broadcaster):
+        if self._task is not None:
+            broadcaster.unsubscribe(self._subscription)
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Balances
+
+    def _put(self, user_id, balances: dict):
+        self._drop(user_id)
+        portfolio = Portfolio(user_id, balances)
+        portfolio.revalue(self.prices)
+        self.portfolios[user_id] = portfolio
+        for asset in balances:
+            self.holders.setdefault(asset, set()).add(user_id)
+        while len(self.portfolios) > self.maxsize:
+            self._drop(next(iter(self.portfolios)))
+        return portfolio
+
+    def _drop(self, user_id):
+        portfolio = self.portfolios.pop(user_id, None)
+        if portfolio is None:
+            return
+        for asset in portfolio.balances:
+            holders = self.holders.get(asset)
+            if holders is not None:
+                holders.discard(user_id)
+                if not holders:
+                    del self.holders[asset]
+
+    @staticmethod
+    def _balances(rows):
+        balances = {}
+        for row in rows:
+            asset = normalize_asset(row["currency"])
+            balances[asset] = balances.get(asset, 0.0) + float(row["balance"])
+        return balances
+
+    async def _load(self, user_ids) -> dict:
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        async with db.acquire() as conn:
+            rows = await conn.fetchall(
+                f"SELECT user_id, currency, balance FROM wallets WHERE user_id IN ({placeholders})",
+                tuple(user_ids),
+            )
+        by_user = {user_id: [] for user_id in user_ids}
+        for row in rows:
+            by_user[row["user_id"]].append(row)
+        # Returned directly: loading more users than the LRU holds evicts the first ones
+        return {user_id: self._put(user_id, self._balances(user_rows)) for user_id, user_rows in by_user.items()}
+
+    async def get(self, user_id) -> Portfolio:
+        portfolio = self.portfolios.get(user_id)
+        if portfolio is not None:
+            self.hits += 1
+            self.portfolios.move_to_end(user_id)
+            return portfolio
+        self.misses += 1
+        return (await self._load([user_id]))[user_id]
+
+    async def get_many(self, user_ids):
+        found = {user_id: self.portfolios[user_id] for user_id in user_ids if user_id in self.portfolios}
+        missing = [user_id for user_id in user_ids if user_id not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            found.update(await self._load(missing))
+        return [found[user_id] for user_id in user_ids]
+
+    async def refresh(self, user_id):
+        """
+        Reloads one user's balances, e.g. after one of their trades settled.
+        """
+        await self._load([user_id])
+
+    def on_order_settled(self, order: dict):
+        user_id = order.get("user_id")
+        if user_id is not None and user_id in self.portfolios:
+            asyncio.create_task(self.refresh(user_id))
+
+    def valuation(self, user_id) -> dict:
+        # The incrementally maintained total; on_price recomputes it every PORTFOLIO_REVALUE_EVERY moves
+        return self.portfolios[user_id].to_dict(self.prices)
+
+    async def value_many(self, user_ids) -> dict:
+        """
+        Values many users at once with vectorized arithmetic against the current prices.
+        Returns {user_id: total_value}.
+        """
+        portfolios = await self.get_many(user_ids)
+        assets = {asset: i for i, asset in enumerate(self.prices)}
+        prices = np.array(list(self.prices.values()), dtype=np.float64)
+
+        user_index, asset_index, quantities = [], [], []
+        for i, portfolio in enumerate(portfolios):
+            for asset, quantity in portfolio.balances.items():
+                if asset in assets:
+                    user_index.append(i)
+                    asset_index.append(assets[asset])
+                    quantities.append(quantity)
+
+        values = np.array(quantities, dtype=np.float64) * prices[np.array(asset_index, dtype=np.int64)]
+        totals = np.bincount(np.array(user_index, dtype=np.int64), weights=values, minlength=len(portfolios))
+        return {portfolio.user_id: float(total) for portfolio, total in zip(portfolios, totals)}
+
+    def stats(self):
+        return {
+            "portfolios": len(self.portfolios),
+            "maxsize": self.maxsize,
+            "priced_assets": len(self.prices),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Shared read model for the whole process
+portfolio_store = PortfolioStore()
@@ -0,0 +1,237 @@
+import os
+import time
+import asyncio
+import logging
+import httpx
+from utils.kraken_client import kraken_client
+from utils.ttl_cache import TTLCache
+from utils.metrics import (
+    QUOTE_REQUESTS, QUOTE_UPSTREAM_CALLS, QUOTE_UPSTREAM_ERRORS, QUOTE_UPSTREAM_LATENCY, QUOTE_BREAKER_OPEN,
+)
+
+logger = logging.getLogger(__name__)
+
+QUOTE_TTL = float(os.getenv("QUOTE_TTL", 2))
+QUOTE_BATCH_WINDOW = float(os.getenv("QUOTE_BATCH_WINDOW", 0.01))
+QUOTE_BATCH_MAX = int(os.getenv("QUOTE_BATCH_MAX", 50))
+QUOTE_TIMEOUT = float(os.getenv("QUOTE_TIMEOUT", 5))
+BREAKER_FAILURES = int(os.getenv("QUOTE_BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("QUOTE_BREAKER_RESET_SECONDS", 30))
+ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY", "TU_CLAVE_API")
+
+# CoinGecko ids that Kraken also lists, with their USD pair
+KRAKEN_PAIRS = {
+    "bitcoin": "XXBTZUSD",
+    "ethereum": "XETHZUSD",
+    "solana": "SOLUSD",
+    "cardano": "ADAUSD",
+    "polkadot": "DOTUSD",
+    "ripple": "XXRPZUSD",
+    "litecoin": "XLTCZUSD",
+    "dogecoin": "XDGUSD",
+    "tether": "USDTZUSD",
+}
+# Kraken pair -> CoinGecko id, for data keyed by the pair names the ticker reports
+COINGECKO_IDS = {pair: coin for coin, pair in KRAKEN_PAIRS.items()}
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive errors and lets one trial call through after `reset_seconds`;
+    other callers stay rejected until that probe reports back.
+    """
+
+    def __init__(self, name: str, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state != "half-open":
+            return state == "closed"
+        now = time.monotonic()
+        # A probe that never reported back (cancelled) frees the slot after reset_seconds
+        if self.probe_started is not None and now - self.probe_started < self.reset_seconds:
+            return False
+        self.probe_started = now
+        return True
+
+    def success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        QUOTE_BREAKER_OPEN.labels(self.name).set(0)
+
+    def failure(self):
+        self.consecutive_failures += 1
+        self.probe_started = None
+        if self.state == "half-open" or self.consecutive_failures >= self.failures:
+            self.opened_at = time.monotonic()
+            QUOTE_BREAKER_OPEN.labels(self.name).set(1)
+            logger.warning(f"Circuit breaker opened for {self.name}")
+
+
+class QuoteService:
+    """
+    USD quotes for crypto (CoinGecko ids) and stocks (tickers).
+
+    Identical concurrent lookups share one in-flight future, lookups arriving within
+    QUOTE_BATCH_WINDOW are sent as one multi-symbol call, and providers are tried in
+    order behind per-provider circuit breakers.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache(maxsize=10000, ttl=QUOTE_TTL)
+        self.inflight = {}  # (kind, symbol) -> Future
+        self.pending = {"crypto": [], "stock": []}
+        self.flushers = {}
+        self.breakers = {name: CircuitBreaker(name) for name in ("kraken", "coingecko", "alphavantage")}
+        self.providers = {
+            "crypto": [("kraken", self._kraken, KRAKEN_PAIRS.__contains__), ("coingecko", self._coingecko, None)],
+            "stock": [("alphavantage", self._alphavantage, None)],
+        }
+        self.requests = 0
+        self.upstream_calls = 0
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=QUOTE_TIMEOUT)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Providers: each takes a list of symbols and returns {symbol: price} for the ones it found.
+    # The optional third tuple element filters the symbols a provider can answer.
+
+    async def _kraken(self, symbols):
+        pairs = {KRAKEN_PAIRS[s]: s for s in symbols}
+        result = await kraken_client.public("Ticker", {"pair": ",".join(pairs)})
+        prices = {}
+        for pair, info in result.items():
+            if pair in pairs:
+                prices[pairs[pair]] = float(info["c"][0])
+        return prices
+
+    async def _coingecko(self, symbols):
+        response = await self.client.get(
+            "https://api.coingecko.com/api/v3/simple/price",
+            params={"ids": ",".join(symbols), "vs_currencies": "usd"},
+        )
+        response.raise_for_status()
+        data = response.json()
+        return {s: float(data[s]["usd"]) for s in symbols if "usd" in data.get(s, {})}
+
+    async def _alphavantage(self, symbols):
+        # GLOBAL_QUOTE takes one symbol per call
+        async def one(symbol):
+            response = await self.client.get("https://www.alphavantage.co/query", params={
+                "function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": ALPHA_VANTAGE_API_KEY,
+            })
+            response.raise_for_status()
+            price = response.json().get("Global Quote", {}).get("05. price")
+            return symbol, float(price) if price else None
+
+        results = await asyncio.gather(*(one(s) for s in symbols))
+        return {symbol: price for symbol, price in results if price is not None}
+
+    async def _fetch(self, kind: str, symbols):
+        remaining = list(symbols)
+        prices = {}
+        for name, provider, supports in self.providers[kind]:
+            if not remaining:
+                break
+            breaker = self.breakers[name]
+            candidates = [s for s in remaining if supports is None or supports(s)]
+            if not candidates or not breaker.allow():
+                continue
+            self.upstream_calls += 1
+            QUOTE_UPSTREAM_CALLS.labels(name).inc()
+            start = time.perf_counter()
+            try:
+                found = await provider(candidates)
+                breaker.success()
+            except Exception as e:
+                QUOTE_UPSTREAM_ERRORS.labels(name).inc()
+                breaker.failure()
+                logger.error(f"Quote provider {name} failed: {e}")
+                continue
+            finally:
+                QUOTE_UPSTREAM_LATENCY.labels(name).observe(time.perf_counter() - start)
+            prices.update(found)
+            remaining = [s for s in remaining if s not in found]
+        return prices
+
+    async def _flush(self, kind: str):
+        await asyncio.sleep(QUOTE_BATCH_WINDOW)
+        self.flushers.pop(kind, None)
+        batch, self.pending[kind] = self.pending[kind], []
+        for i in range(0, len(batch), QUOTE_BATCH_MAX):
+            chunk = batch[i:i + QUOTE_BATCH_MAX]
+            try:
+                prices = await self._fetch(kind, chunk)
+            except Exception as e:
+                prices = {}
+                logger.error(f"Quote batch failed: {e}")
+            for symbol in chunk:
+                key = (kind, symbol)
+                future = self.inflight.pop(key, None)
+                price = prices.get(symbol)
+                if price is not None:
+                    self.cache.set(key, price)
+                if future is not None and not future.done():
+                    future.set_result(price)
+
+    async def get(self, symbol: str, kind: str = "crypto"):
+        """
+        Returns the USD price, or None when no provider knows the symbol.
+        """
+        self.requests += 1
+        QUOTE_REQUESTS.labels(kind).inc()
+        key = (kind, symbol)
+        price = self.cache.get(key)
+        if price is not None:
+            return price
+
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[key] = future
+            self.pending[kind].append(symbol)
+            if kind not in self.flushers:
+                self.flushers[kind] = asyncio.create_task(self._flush(kind))
+        return await asyncio.shield(future)
+
+    async def get_many(self, symbols, kind: str = "crypto") -> dict:
+        prices = await asyncio.gather(*(self.get(s, kind) for s in symbols))
+        return dict(zip(symbols, prices))
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "reduction_ratio": 1 - self.upstream_calls / self.requests if self.requests else 0,
+            "inflight": len(self.inflight),
+            "cache": self.cache.stats(),
+            "breakers": {name: breaker.state for name, breaker in self.breakers.items()},
+        }
+
+
+# Shared service for the whole process
+quote_service = QuoteService()
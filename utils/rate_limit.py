@@ -0,0 +1,257 @@
+import os
+import json
+import math
+import hashlib
+import logging
+from collections import OrderedDict
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from utils.firebase_auth import verify_user
+from utils.metrics import RATE_LIMIT_REJECTIONS
+from utils.token_bucket import TokenBucket
+from utils.invalidation import WEB_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITS_PATH = os.getenv(
+    "RATE_LIMITS_PATH", os.path.join(os.path.dirname(__file__), "..", "config", "rate_limits.json")
+)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "local" (per process) or "redis" (shared across workers, needs RATE_LIMIT_REDIS_URL).
+# Local buckets split each policy evenly across WEB_CONCURRENCY workers.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://127.0.0.1:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Comma-separated API keys that identify a client instead of its IP
+RATE_LIMIT_API_KEYS = {key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()}
+# Only behind a proxy that sets X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+
+class Policy:
+    __slots__ = ("name", "capacity", "rate", "static_headers")
+
+    def __init__(self, name: str, capacity: float, rate: float):
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        # Headers that never change for this policy, encoded once
+        self.static_headers = [
+            (b"ratelimit-limit", str(int(capacity)).encode()),
+            (b"ratelimit-policy", f"{int(capacity)};w={math.ceil(capacity / rate)}".encode()),
+        ]
+
+
+class PolicySet:
+    """
+    Route classes from RATE_LIMITS_PATH. Exact paths win over prefixes, longer
+    prefixes over shorter ones; anything else falls under the default policy.
+    """
+
+    def __init__(self, path=RATE_LIMITS_PATH):
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        self.default = Policy("default", config["default"]["capacity"], config["default"]["rate"])
+        self.exempt = set(config.get("exempt", ()))
+        self.exact = {}
+        self.prefixes = []
+        for entry in config.get("policies", []):
+            policy = Policy(entry["name"], entry["capacity"], entry["rate"])
+            methods = set(entry["methods"]) if entry.get("methods") else None
+            if "path" in entry:
+                self.exact.setdefault(entry["path"], []).append((methods, policy))
+            else:
+                self.prefixes.append((entry["prefix"], methods, policy))
+        self.prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def match(self, path: str, method: str):
+        """
+        Policy for a request, or None when the path is exempt.
+        """
+        if path in self.exempt:
+            return None
+        for methods, policy in self.exact.get(path, ()):
+            if methods is None or method in methods:
+                return policy
+        for prefix, methods, policy in self.prefixes:
+            if path.startswith(prefix) and (methods is None or method in methods):
+                return policy
+        return self.default
+
+
+class LocalBucketStore:
+    """
+    One TokenBucket per (policy, client) in this process, bounded by LRU. With several
+    workers each holds 1/workers of the capacity and rate, so a client spreading requests
+    across them gets the configured limit in total rather than once per worker.
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS, workers=WEB_CONCURRENCY):
+        self.max_keys = max_keys
+        self.workers = max(1, workers)
+        self.buckets = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1):
+        """
+        Returns (allowed, tokens left, seconds until the bucket is full again).
+        """
+        # Never below one request's worth, or small policies would reject everything
+        share = max(1 / self.workers, cost / capacity)
+        capacity, rate = capacity * share, rate * share
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(capacity, rate)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        allowed = bucket.try_acquire(cost)
+        # Reported against the whole policy, like the shared backend
+        return allowed, bucket.tokens / share, (capacity - bucket.tokens) / rate
+
+    def stats(self):
+        return {"backend": "local", "keys": len(self.buckets), "max_keys": self.max_keys, "workers": self.workers}
+
+    async def close(self):
+        pass
+
+
+# Refill and take in one atomic step, on the Redis server clock
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """
+    Buckets shared by every worker and instance, kept in Redis. Same interface as
+    LocalBucketStore, which stands in for it in single-process and local runs.
+    """
+
+    def __init__(self, url=RATE_LIMIT_REDIS_URL, prefix="ratelimit:"):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1):
+        allowed, tokens = await self.script(keys=[self.prefix + key], args=[capacity, rate, cost])
+        tokens = float(tokens)
+        return bool(allowed), tokens, (capacity - tokens) / rate
+
+    def stats(self):
+        return {"backend": "redis"}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def build_store():
+    if RATE_LIMIT_BACKEND == "redis":
+        try:
+            return RedisBucketStore()
+        except ImportError:
+            logger.error("RATE_LIMIT_BACKEND=redis but the redis package is not installed; using local buckets")
+    return LocalBucketStore()
+
+
+async def client_identity(scope, headers: dict) -> str:
+    """
+    Verified Firebase uid, else a configured API key, else the client IP.
+    A verified user is left in request.state.user for later middleware and handlers.
+    """
+    state = scope.setdefault("state", {})
+    user = state.get("user")
+    authorization = headers.get(b"authorization")
+    if user is None and authorization:
+        try:
+            user = await verify_user(authorization.decode("latin-1"))
+            state["user"] = user
+        except HTTPException:
+            user = None
+    if user is not None:
+        return f"uid:{user['uid']}"
+
+    api_key = headers.get(b"x-api-key")
+    if api_key and api_key.decode("latin-1") in RATE_LIMIT_API_KEYS:
+        return "key:" + hashlib.sha256(api_key).hexdigest()[:16]
+
+    if RATE_LIMIT_TRUST_FORWARDED and b"x-forwarded-for" in headers:
+        return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def rate_limit_headers(policy: Policy, tokens: float, reset: float):
+    return policy.static_headers + [
+        (b"ratelimit-remaining", str(max(int(tokens), 0)).encode()),
+        (b"ratelimit-reset", str(math.ceil(reset)).encode()),
+    ]
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying a token bucket per (route class, client). Every
+    limited response carries RateLimit-* headers; rejections get 429 and Retry-After.
+    """
+
+    def __init__(self, app, policies=None, store=None):
+        self.app = app
+        self.policies = policies or rate_limit_policies
+        self.store = store or rate_limit_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not RATE_LIMIT_ENABLED:
+            return await self.app(scope, receive, send)
+        policy = self.policies.match(scope["path"], scope["method"])
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        identity = await client_identity(scope, headers)
+        try:
+            allowed, tokens, reset = await self.store.take(f"{policy.name}:{identity}", policy.capacity, policy.rate)
+        except Exception as e:
+            # Fail open: a broken shared store must not take the API down
+            logger.error(f"Rate limit store error: {e}")
+            return await self.app(scope, receive, send)
+        limit_headers = rate_limit_headers(policy, tokens, reset)
+
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.labels(policy.name).inc()
+            retry_after = math.ceil((1 - tokens) / policy.rate)
+            response = JSONResponse(
+                {"detail": "Too many requests", "policy": policy.name, "retry_after": retry_after},
+                status_code=429,
+            )
+            response.raw_headers.extend(limit_headers + [(b"retry-after", str(retry_after).encode())])
+            return await response(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + limit_headers
+            await send(message)
+
+        return await self.app(scope, receive, send_with_headers)
+
+
+# Shared policies and bucket store for the whole process
+rate_limit_policies = PolicySet()
+rate_limit_store = build_store()
@@ -0,0 +1,164 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from utils.db import db
+from utils.container import container
+import utils.firebase_auth  # noqa: F401 (registers the "firebase" dependency)
+from utils.observability import track
+from utils.write_batch import WriteBatcher, values_clause, placeholders
+from utils.metrics import REGISTRATION_OUTBOX
+
+logger = logging.getLogger(__name__)
+
+# Pending registrations older than this are settled against Firebase by the leader worker
+REGISTRATION_OUTBOX_GRACE = float(os.getenv("REGISTRATION_OUTBOX_GRACE", 120))
+REGISTRATION_OUTBOX_INTERVAL = float(os.getenv("REGISTRATION_OUTBOX_INTERVAL", 30))
+REGISTRATION_OUTBOX_BATCH = int(os.getenv("REGISTRATION_OUTBOX_BATCH", 100))
+
+
+class RegistrationPending(Exception):
+    """
+    Firebase did not answer; the registration is settled later by the outbox relay.
+    """
+
+
+def _is_rejection(error) -> bool:
+    # Firebase refused the account (invalid input, email taken): nothing was created
+    from firebase_admin import exceptions
+    return isinstance(error, (ValueError, exceptions.InvalidArgumentError, exceptions.AlreadyExistsError))
+
+
+async def _insert_users(conn, rows):
+    now = time.time()
+    await conn.execute(
+        f"INSERT INTO users (firebase_uid, name, email, country) VALUES {values_clause(rows, '(%s, %s, %s, %s)')}",
+        tuple(value for row in rows for value in row),
+    )
+    await conn.execute(
+        f"INSERT INTO registration_outbox (firebase_uid, email, created_at) VALUES {values_clause(rows, '(%s, %s, %s)')}",
+        tuple(value for uid, _, email, _ in rows for value in (uid, email, now)),
+    )
+
+
+async def _clear_outbox(conn, uids):
+    await conn.execute(f"DELETE FROM registration_outbox WHERE firebase_uid IN ({placeholders(uids)})", tuple(uids))
+
+
+class Registrations:
+    """
+    Creates a user in Firebase and in the users table so that either both exist or
+    neither does, without a distributed transaction:
+
+    1. The users row and an outbox entry commit together (batched with other signups)
+       under a uid generated here, before Firebase is called.
+    2. Firebase creates the account with that uid. If it refuses, the row is deleted;
+       if it succeeds, the outbox entry is cleared.
+    3. Entries left behind by a crash or a Firebase timeout are settled by the leader
+       after a grace period: kept if the Firebase account exists, deleted otherwise.
+
+    The password is never stored; it only travels to Firebase.
+    """
+
+    def __init__(self, grace=REGISTRATION_OUTBOX_GRACE, interval=REGISTRATION_OUTBOX_INTERVAL):
+        self.grace = grace
+        self.interval = interval
+        self.users = WriteBatcher("users", _insert_users)
+        self.outbox = WriteBatcher("registration_outbox", _clear_outbox)
+        self._task = None
+
+    async def register(self, email: str, password: str, name: str, country: str) -> str:
+        """
+        Returns the new Firebase uid. Raises RegistrationPending when Firebase did not
+        answer, and the Firebase or database error otherwise.
+        """
+        from firebase_admin import auth
+        firebase_app = await container.get("firebase")
+        uid = uuid.uuid4().hex
+        await self.users.submit((uid, name, email, country))
+        try:
+            async with track("firebase", "create_user"):
+                await asyncio.to_thread(auth.create_user, uid=uid, email=email, password=password, app=firebase_app)
+        except Exception as e:
+            if not _is_rejection(e):
+                REGISTRATION_OUTBOX.labels("pending").inc()
+                raise RegistrationPending(uid) from e
+            await self._discard(uid)
+            REGISTRATION_OUTBOX.labels("rejected").inc()
+            raise
+        REGISTRATION_OUTBOX.labels("created").inc()
+        try:
+            await self.outbox.submit(uid)
+        except Exception as e:
+            # The account is complete either way; the relay clears the entry later
+            logger.warning(f"Error clearing registration outbox for {uid}: {e}")
+        return uid
+
+    async def _discard(self, uid: str):
+        async with db.acquire() as conn:
+            await conn.execute("DELETE FROM users WHERE firebase_uid = %s", (uid,))
+            await conn.execute("DELETE FROM registration_outbox WHERE firebase_uid = %s", (uid,))
+            await conn.commit()
+
+    async def reconcile(self) -> int:
+        """
+        Settles outbox entries older than the grace period and returns how many.
+        """
+        from firebase_admin import auth
+        async with db.acquire() as conn:
+            rows = await conn.fetchall(
+                "SELECT firebase_uid FROM registration_outbox WHERE created_at < %s ORDER BY created_at LIMIT %s",
+                (time.time() - self.grace, REGISTRATION_OUTBOX_BATCH),
+            )
+        if not rows:
+            return 0
+        firebase_app = await container.get("firebase")
+        settled = 0
+        for row in rows:
+            uid = row["firebase_uid"]
+            try:
+                async with track("firebase", "get_user"):
+                    await asyncio.to_thread(auth.get_user, uid, app=firebase_app)
+            except auth.UserNotFoundError:
+                await self._discard(uid)
+                REGISTRATION_OUTBOX.labels("rolled_back").inc()
+                logger.info(f"Rolled back registration {uid}: no Firebase account")
+            except Exception as e:
+                logger.error(f"Error settling registration {uid}: {e}")
+                continue
+            else:
+                await self.outbox.submit(uid)
+                REGISTRATION_OUTBOX.labels("confirmed").inc()
+            settled += 1
+        return settled
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Registration outbox relay error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Starts the outbox relay; run it in one worker only.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.users.stop()
+        await self.outbox.stop()
+
+    def stats(self):
+        return {"users": self.users.stats(), "outbox": self.outbox.stats()}
+
+
+# Shared registration service for the whole process
+registrations = Registrations()
@@ -0,0 +1,314 @@
+import os
+import time
+import asyncio
+import logging
+from utils.journal import Journal
+from utils.invalidation import worker_path, peer_paths
+
+logger = logging.getLogger(__name__)
+
+STRIPE_EVENTS_JOURNAL = os.getenv("STRIPE_EVENTS_JOURNAL", "stripe_events.journal")
+STRIPE_EVENT_WORKERS = int(os.getenv("STRIPE_EVENT_WORKERS", 2))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", 5))
+# Stripe retries undelivered events for up to three days; keep ids at least that long for dedup
+STRIPE_EVENT_RETENTION_SECONDS = float(os.getenv("STRIPE_EVENT_RETENTION_SECONDS", 3 * 86400))
+STRIPE_EVENT_PRUNE_INTERVAL = float(os.getenv("STRIPE_EVENT_PRUNE_INTERVAL", 3600))
+STRIPE_EVENT_BACKOFF_MAX = float(os.getenv("STRIPE_EVENT_BACKOFF_MAX", 60))
+
+QUEUED, PROCESSED, FAILED = "queued", "processed", "failed"
+TERMINAL = {PROCESSED, FAILED}
+ACTIVE_STATUSES = {"active", "trialing"}
+
+
+def _price(subscription: dict):
+    items = (subscription.get("items") or {}).get("data") or []
+    if items:
+        price = items[0].get("price") or {}
+        return price.get("lookup_key") or price.get("id")
+    return None
+
+
+def _plan(subscription: dict):
+    metadata = subscription.get("metadata") or {}
+    return metadata.get("plan") or _price(subscription)
+
+
+class SubscriptionStateCache:
+    """
+    Per-user subscription state built from Stripe webhooks, so entitlement checks
+    never call Stripe. Events older than the last one applied for a user are ignored,
+    which makes out-of-order delivery harmless.
+    """
+
+    def __init__(self):
+        self.users = {}  # user id -> state
+        self.customers = {}  # Stripe customer id -> user id
+
+    def get(self, user_id):
+        return self.users.get(str(user_id))
+
+    def is_active(self, user_id) -> bool:
+        state = self.get(user_id)
+        return state is not None and state["status"] in ACTIVE_STATUSES
+
+    def _user_for(self, obj: dict):
+        metadata = obj.get("metadata") or {}
+        user_id = metadata.get("user_id") or obj.get("client_reference_id")
+        if user_id:
+            if obj.get("customer"):
+                self.customers[obj["customer"]] = str(user_id)
+            return str(user_id)
+        return self.customers.get(obj.get("customer"))
+
+    def _update(self, user_id: str, event: dict, **fields):
+        state = self.users.get(user_id)
+        if state is not None and state["event_created"] > event["created"]:
+            return False
+        state = dict(state or {"user_id": user_id, "plan": None, "status": None, "subscription_id": None,
+                               "price": None, "customer": None, "current_period_end": None, "cancel_at_period_end": False})
+        state.update({key: value for key, value in fields.items() if value is not None})
+        state["event_created"] = event["created"]
+        state["event_id"] = event["id"]
+        self.users[user_id] = state
+        return True
+
+    def apply(self, event: dict):
+        """
+        Applies one event. Returns the affected user id, or None when the event
+        is irrelevant or cannot be tied to a user.
+        """
+        event_type = event["type"]
+        obj = event["data"]["object"]
+        user_id = self._user_for(obj)
+        if user_id is None:
+            return None
+
+        if event_type == "checkout.session.completed":
+            if obj.get("mode") != "subscription":
+                return None
+            changed = self._update(user_id, event, customer=obj.get("customer"), subscription_id=obj.get("subscription"),
+                                   plan=(obj.get("metadata") or {}).get("plan"),
+                                   status="active" if obj.get("payment_status") == "paid" else None)
+        elif event_type in ("customer.subscription.created", "customer.subscription.updated",
+                            "customer.subscription.deleted"):
+            changed = self._update(
+                user_id, event,
+                customer=obj.get("customer"),
+                subscription_id=obj.get("id"),
+                plan=_plan(obj),
+                price=_price(obj),
+                status="canceled" if event_type.endswith("deleted") else obj.get("status"),
+                current_period_end=obj.get("current_period_end"),
+                cancel_at_period_end=obj.get("cancel_at_period_end"),
+            )
+        elif event_type == "invoice.payment_failed":
+            changed = self._update(user_id, event, status="past_due")
+        elif event_type == "invoice.paid":
+            changed = self._update(user_id, event, status="active")
+        else:
+            return None
+        return user_id if changed else None
+
+    def merge(self, state: dict):
+        """
+        Applies a user's state as computed by another worker; older states are ignored.
+        """
+        current = self.users.get(state["user_id"])
+        if current is not None and current["event_created"] > state["event_created"]:
+            return
+        self.users[state["user_id"]] = state
+        if state.get("customer"):
+            self.customers[state["customer"]] = state["user_id"]
+
+    def stats(self):
+        return {
+            "users": len(self.users),
+            "active": sum(1 for state in self.users.values() if state["status"] in ACTIVE_STATUSES),
+            "customers": len(self.customers),
+        }
+
+
+class StripeEventProcessor:
+    """
+    Webhook events are journaled (fsync) before the endpoint acks, then applied by
+    a worker pool; failed events wait for their retry time outside the pool. Event ids are remembered for the retention window so Stripe's
+    redeliveries are dropped.
+    """
+
+    def __init__(self, state: SubscriptionStateCache, journal_path=STRIPE_EVENTS_JOURNAL, workers=STRIPE_EVENT_WORKERS):
+        self.state = state
+        self.journal_path = journal_path
+        self.journal = Journal(worker_path(journal_path))
+        self.queue = asyncio.Queue()
+        self.workers = workers
+        self.events = {}
+        # Called with (user id, state) after a webhook changed a user's subscription
+        self.listeners = []
+        self.duplicates = 0
+        self._retries = set()  # timer handles of events waiting for their next attempt
+        self._tasks = []
+
+    def _save(self, entry: dict) -> asyncio.Future:
+        entry["updated_at"] = time.time()
+        return self.journal.append(entry)
+
+    def _schedule(self, entry: dict):
+        """
+        Queues an event at its retry_at without holding a worker while it waits.
+        """
+        delay = (entry.get("retry_at") or 0) - time.time()
+        if delay <= 0:
+            self.queue.put_nowait(entry["id"])
+            return
+
+        def due():
+            self._retries.discard(handle)
+            self.queue.put_nowait(entry["id"])
+
+        handle = asyncio.get_running_loop().call_later(delay, due)
+        self._retries.add(handle)
+
+    async def enqueue(self, event: dict) -> bool:
+        """
+        Durably records a verified webhook event. Returns False for a duplicate.
+        """
+        if event["id"] in self.events:
+            self.duplicates += 1
+            return False
+        entry = {"id": event["id"], "type": event["type"], "event": event, "status": QUEUED,
+                 "attempts": 0, "user_id": None, "error": None, "received_at": time.time()}
+        self.events[entry["id"]] = entry
+        await self._save(entry)
+        self.queue.put_nowait(entry["id"])
+        return True
+
+    async def _process(self, entry: dict):
+        entry["attempts"] += 1
+        try:
+            user_id = self.state.apply(entry["event"])
+            if user_id is not None:
+                entry["user_id"] = user_id
+                for listener in self.listeners:
+                    result = listener(user_id, self.state.get(user_id))
+                    if asyncio.iscoroutine(result):
+                        await result
+            entry["status"] = PROCESSED
+            entry["error"] = None
+        except Exception as e:
+            entry["error"] = str(e)
+            logger.error(f"Error processing Stripe event {entry['id']}: {e}")
+            if entry["attempts"] < STRIPE_EVENT_MAX_ATTEMPTS:
+                entry["retry_at"] = time.time() + min(2 ** entry["attempts"], STRIPE_EVENT_BACKOFF_MAX)
+                self._save(entry)
+                self._schedule(entry)
+                return
+            entry["status"] = FAILED
+        self._save(entry)
+
+    async def _worker(self):
+        while True:
+            event_id = await self.queue.get()
+            try:
+                await self._process(self.events[event_id])
+            except Exception as e:
+                logger.error(f"Stripe event worker error for {event_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _retained(self, entries) -> dict:
+        """
+        Entries still needed: unfinished, inside the dedup window, or a user's latest applied event.
+        """
+        cutoff = time.time() - STRIPE_EVENT_RETENTION_SECONDS
+        latest = {state["event_id"] for state in self.state.users.values()}
+        return {
+            entry["id"]: entry for entry in entries
+            if entry["status"] not in TERMINAL or entry["received_at"] >= cutoff or entry["id"] in latest
+        }
+
+    def _prune(self) -> int:
+        before = len(self.events)
+        self.events = self._retained(self.events.values())
+        return before - len(self.events)
+
+    async def _pruner(self):
+        while True:
+            await asyncio.sleep(STRIPE_EVENT_PRUNE_INTERVAL)
+            self._prune()
+
+    def _peer_entries(self):
+        entries = []
+        for path in peer_paths(self.journal_path):
+            try:
+                entries.extend(Journal(path).load().values())
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading peer Stripe journal {path}: {e}")
+        return entries
+
+    def _replay(self, entries):
+        for entry in sorted(entries, key=lambda entry: entry["event"]["created"]):
+            if entry["status"] == PROCESSED:
+                # The event that first tied a customer to a user may have been compacted away
+                customer = entry["event"]["data"]["object"].get("customer")
+                if entry["user_id"] and customer:
+                    self.state.customers.setdefault(customer, entry["user_id"])
+                self.state.apply(entry["event"])
+
+    async def resync(self):
+        """
+        Catches up on states other workers published while this one was off the bus,
+        by replaying their journals; events already applied are ignored.
+        """
+        entries = await asyncio.to_thread(self._peer_entries)
+        self._replay(entries)
+
+    def _recover(self):
+        """
+        Rebuilds the subscription state from processed events and requeues the rest.
+        Compaction keeps every event inside the dedup window plus each user's latest
+        applied event, so the state survives restarts without asking Stripe.
+        """
+        entries = sorted(self.journal.load().values(), key=lambda entry: entry["event"]["created"])
+        # Webhooks land on any worker: rebuild the state from every worker's journal,
+        # but only this worker's own events are requeued and compacted
+        self._replay(entries + self._peer_entries())
+
+        self.events = self._retained(entries)
+        self.journal.compact(self.events)
+        for entry in self.events.values():
+            if entry["status"] not in TERMINAL:
+                self._schedule(entry)
+        logger.info(f"Stripe events recovered: {len(self.events)} events, "
+                    f"{self.queue.qsize() + len(self._retries)} requeued")
+
+    def start(self):
+        if self._tasks:
+            return
+        self._recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._pruner()))
+
+    async def stop(self):
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.journal.close()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "retrying": len(self._retries),
+            "events": len(self.events),
+            "duplicates": self.duplicates,
+            "failed": sum(1 for entry in self.events.values() if entry["status"] == FAILED),
+            **self.state.stats(),
+        }
+
+
+# Shared subscription state and webhook processor for the whole process
+subscription_state = SubscriptionStateCache()
+stripe_events = StripeEventProcessor(subscription_state)
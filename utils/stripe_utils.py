@@ -1,19 +1,98 @@
 import os
-import stripe
+import asyncio
+from utils.container import container
+from utils.observability import track
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# Currency of catalog prices, for plans without a "stripe_price" in config/plans.json
+STRIPE_CURRENCY = os.getenv("STRIPE_CURRENCY", "usd")
 
-def create_checkout_session(plan_id):
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[
+
+def _load_stripe():
+    # The SDK takes most of a second to import, so it is loaded on first use
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    # Point at fakes/stripe.py for offline runs, e.g. http://127.0.0.1:9004
+    if os.getenv("STRIPE_API_BASE"):
+        stripe.api_base = os.getenv("STRIPE_API_BASE")
+    return stripe
+
+
+async def _stripe():
+    return await asyncio.to_thread(_load_stripe)
+
+
+container.register("stripe", _stripe)
+
+def checkout_session_params(plan_id, user_id=None, success_url=None, cancel_url=None):
+    params = {
+        "payment_method_types": ["card"],
+        "line_items": [
             {
                 "price": plan_id,
                 "quantity": 1,
             },
         ],
-        mode="subscription",
-        success_url=os.getenv("FRONTEND_SUCCESS_URL"),
-        cancel_url=os.getenv("FRONTEND_CANCEL_URL"),
-    )
-    return session
+        "mode": "subscription",
+        "success_url": success_url or os.getenv("FRONTEND_SUCCESS_URL"),
+        "cancel_url": cancel_url or os.getenv("FRONTEND_CANCEL_URL"),
+    }
+    if user_id is not None:
+        # Lets the webhook processor tie every session and subscription event to the user
+        params["client_reference_id"] = str(user_id)
+        params["subscription_data"] = {"metadata": {"user_id": str(user_id)}}
+    return params
+
+def create_checkout_session(plan_id, user_id=None):
+    return _load_stripe().checkout.Session.create(**checkout_session_params(plan_id, user_id))
+
+
+def plan_checkout_params(plan: dict, period_days: int, user_id, success_url=None, cancel_url=None):
+    """
+    Checkout for a catalog plan: its Stripe price when configured, otherwise a recurring
+    price built from the catalog. The plan name travels in the session and subscription
+    metadata, so the webhook can activate it once Stripe reports the payment.
+    """
+    params = checkout_session_params(plan.get("stripe_price"), user_id, success_url, cancel_url)
+    if not plan.get("stripe_price"):
+        params["line_items"] = [{
+            "price_data": {
+                "currency": STRIPE_CURRENCY,
+                "unit_amount": int(round(plan["price"] * 100)),
+                "product_data": {"name": f"FINTT {plan['name']}"},
+                "recurring": {"interval": "day", "interval_count": period_days},
+            },
+            "quantity": 1,
+        }]
+    params["metadata"] = {"plan": plan["name"], "user_id": str(user_id)}
+    params["subscription_data"]["metadata"]["plan"] = plan["name"]
+    return params
+
+
+async def create_plan_checkout(plan: dict, period_days: int, user_id) -> str:
+    """
+    Creates a Checkout Session for plan and returns its URL.
+    """
+    stripe = await container.get("stripe")
+    params = plan_checkout_params(plan, period_days, user_id)
+    async with track("stripe", "checkout.session.create"):
+        session = await asyncio.to_thread(stripe.checkout.Session.create, **params)
+    return session.url
+
+
+async def change_subscription_price(subscription_id: str, price_id: str):
+    """
+    Moves a Stripe subscription to another price and invoices the prorated difference
+    now. With pending_if_incomplete the change only applies once that invoice is paid,
+    and the customer.subscription.updated webhook then carries the new price.
+    """
+    stripe = await container.get("stripe")
+    async with track("stripe", "subscription.retrieve"):
+        subscription = await asyncio.to_thread(stripe.Subscription.retrieve, subscription_id)
+    item = subscription["items"]["data"][0]
+    async with track("stripe", "subscription.modify"):
+        return await asyncio.to_thread(
+            stripe.Subscription.modify, subscription_id,
+            items=[{"id": item["id"], "price": price_id}],
+            proration_behavior="always_invoice",
+            payment_behavior="pending_if_incomplete",
+        )
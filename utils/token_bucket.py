@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket that refills `rate` tokens per second up to `capacity`.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self, cost: float = 1) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def wait_time(self, cost: float = 1) -> float:
+        """
+        Seconds until `cost` tokens are available (0 if they already are).
+        """
+        self._refill(time.monotonic())
+        missing = cost - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+    async def acquire(self, cost: float = 1):
+        while not self.try_acquire(cost):
+            await asyncio.sleep(self.wait_time(cost))
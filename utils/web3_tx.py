@@ -0,0 +1,255 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+import statistics
+import httpx
+from dotenv import load_dotenv
+from utils.observability import track
+from utils.container import container
+from utils.metrics import WEB3_RPC_CALLS, WEB3_RPC_REQUESTS, WEB3_RPC_ERRORS, WEB3_RPC_LATENCY
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Point at a local dev chain (`anvil`, chain id 31337) for offline runs
+WEB3_PROVIDER_URL = os.getenv("WEB3_PROVIDER_URL", "http://127.0.0.1:8545")
+WEB3_TIMEOUT = float(os.getenv("WEB3_TIMEOUT", 10))
+# Safety margin on top of eth_estimateGas
+WEB3_GAS_MULTIPLIER = float(os.getenv("WEB3_GAS_MULTIPLIER", 1.2))
+# Fee history window and the priority fee percentile taken from it
+WEB3_FEE_HISTORY_BLOCKS = int(os.getenv("WEB3_FEE_HISTORY_BLOCKS", 10))
+WEB3_PRIORITY_PERCENTILE = float(os.getenv("WEB3_PRIORITY_PERCENTILE", 50))
+WEB3_FEE_CACHE_SECONDS = float(os.getenv("WEB3_FEE_CACHE_SECONDS", 12))
+WEB3_MIN_PRIORITY_FEE = int(os.getenv("WEB3_MIN_PRIORITY_FEE", 10**9))  # 1 gwei
+WEB3_RECEIPT_POLL_SECONDS = float(os.getenv("WEB3_RECEIPT_POLL_SECONDS", 1))
+WEB3_RECEIPT_TIMEOUT = float(os.getenv("WEB3_RECEIPT_TIMEOUT", 120))
+
+NONCE_ERRORS = ("nonce too low", "nonce too high", "already known", "replacement transaction underpriced")
+
+
+class RPCError(Exception):
+    """
+    Raised when the node answers a JSON-RPC call with an "error" object.
+    """
+
+    def __init__(self, method: str, error: dict):
+        self.method = method
+        self.code = error.get("code")
+        self.message = error.get("message", "")
+        super().__init__(f"{method} failed: {self.message} ({self.code})")
+
+    @property
+    def nonce_error(self):
+        message = self.message.lower()
+        return any(text in message for text in NONCE_ERRORS)
+
+
+def fees_from_history(history: dict):
+    """
+    EIP-1559 fees from eth_feeHistory: the configured percentile of recent priority
+    fees, and a max fee that survives two full blocks of base fee growth.
+    """
+    base_fee = int(history["baseFeePerGas"][-1], 16)  # next block's base fee
+    rewards = [int(reward[0], 16) for reward in history.get("reward") or [] if reward]
+    priority_fee = max(int(statistics.median(rewards)) if rewards else 0, WEB3_MIN_PRIORITY_FEE)
+    return {"maxFeePerGas": 2 * base_fee + priority_fee, "maxPriorityFeePerGas": priority_fee}
+
+
+class TransactionManager:
+    """
+    Async transaction submission over raw JSON-RPC. Nonces are tracked locally per
+    signer, so concurrent requests never race on eth_getTransactionCount; gas
+    estimation, fee history and chain id go to the node as a single batch.
+    """
+
+    def __init__(self, rpc_url=WEB3_PROVIDER_URL):
+        self.rpc_url = rpc_url
+        self._client = None
+        self._ids = itertools.count(1)
+        self.chain_id = None
+        self.nonces = {}  # address -> next nonce
+        self.nonce_locks = {}
+        self.fees = None
+        self.fees_at = 0
+        self.rpc_requests = 0
+        self.rpc_calls = 0
+        self.submitted = 0
+        self.nonce_resyncs = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=WEB3_TIMEOUT)
+        return self._client
+
+    async def batch(self, calls):
+        """
+        Sends [(method, params), ...] in one HTTP request and returns the results in order.
+        """
+        payload = [
+            {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+            for method, params in calls
+        ]
+        self.rpc_requests += 1
+        self.rpc_calls += len(calls)
+        WEB3_RPC_REQUESTS.inc()
+        for method, _ in calls:
+            WEB3_RPC_CALLS.labels(method).inc()
+
+        start = time.perf_counter()
+        try:
+            async with track("web3", calls[0][0] if len(calls) == 1 else "batch"):
+                response = await self.client.post(self.rpc_url, json=payload if len(payload) > 1 else payload[0])
+                response.raise_for_status()
+        finally:
+            WEB3_RPC_LATENCY.observe(time.perf_counter() - start)
+        replies = response.json()
+        if isinstance(replies, dict):
+            replies = [replies]
+        by_id = {reply.get("id"): reply for reply in replies}
+
+        results = []
+        for request in payload:
+            reply = by_id.get(request["id"], {"error": {"message": "missing response"}})
+            if reply.get("error"):
+                WEB3_RPC_ERRORS.labels(request["method"]).inc()
+                raise RPCError(request["method"], reply["error"])
+            results.append(reply.get("result"))
+        return results
+
+    async def call(self, method: str, *params):
+        return (await self.batch([(method, list(params))]))[0]
+
+    async def prepare(self, address: str, tx: dict):
+        """
+        Gas limit and fees for tx, refreshing the chain id, fee history and the
+        signer's starting nonce in the same round trip when needed.
+        """
+        calls = [("eth_estimateGas", [tx])]
+        need_chain = self.chain_id is None
+        need_fees = self.fees is None or time.monotonic() - self.fees_at > WEB3_FEE_CACHE_SECONDS
+        need_nonce = address not in self.nonces
+        if need_chain:
+            calls.append(("eth_chainId", []))
+        if need_fees:
+            calls.append(("eth_feeHistory", [hex(WEB3_FEE_HISTORY_BLOCKS), "latest", [WEB3_PRIORITY_PERCENTILE]]))
+        if need_nonce:
+            calls.append(("eth_getTransactionCount", [address, "pending"]))
+
+        results = iter(await self.batch(calls))
+        gas = int(int(next(results), 16) * WEB3_GAS_MULTIPLIER)
+        if need_chain:
+            self.chain_id = int(next(results), 16)
+        if need_fees:
+            self.fees = fees_from_history(next(results))
+            self.fees_at = time.monotonic()
+        if need_nonce:
+            # Another request may have initialised the counter meanwhile; keep the local one
+            self.nonces.setdefault(address, int(next(results), 16))
+        return gas, dict(self.fees)
+
+    async def send(self, account, to: str, data: str = "0x", value: int = 0) -> str:
+        """
+        Signs locally and submits an EIP-1559 transaction. Returns the tx hash.
+
+        Submission is serialised per signer so a failed send never leaves a nonce gap;
+        everything before it (estimation, fees) runs concurrently.
+        """
+        address = account.address
+        gas, fees = await self.prepare(address, {"from": address, "to": to, "data": data, "value": hex(value)})
+
+        lock = self.nonce_locks.setdefault(address, asyncio.Lock())
+        async with lock:
+            if address not in self.nonces:
+                self.nonces[address] = int(await self.call("eth_getTransactionCount", address, "pending"), 16)
+            nonce = self.nonces[address]
+            signed = account.sign_transaction({
+                "type": 2,
+                "chainId": self.chain_id,
+                "nonce": nonce,
+                "to": to,
+                "value": value,
+                "data": data,
+                "gas": gas,
+                **fees,
+            })
+            raw = getattr(signed, "raw_transaction", None) or signed.rawTransaction
+            try:
+                tx_hash = await self.call("eth_sendRawTransaction", "0x" + bytes(raw).hex())
+            except RPCError as e:
+                if e.nonce_error:
+                    # Something else used this signer; re-read the nonce on the next send
+                    self.nonces.pop(address, None)
+                    self.nonce_resyncs += 1
+                    logger.warning(f"Nonce resync for {address}: {e.message}")
+                raise
+            self.nonces[address] = nonce + 1
+            self.submitted += 1
+            return tx_hash
+
+    async def receipts(self, tx_hashes):
+        """
+        Current receipts for several transactions in one batch (None while pending).
+        """
+        if not tx_hashes:
+            return {}
+        results = await self.batch([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes])
+        return dict(zip(tx_hashes, results))
+
+    async def wait_for_receipts(self, tx_hashes, timeout=WEB3_RECEIPT_TIMEOUT, poll=WEB3_RECEIPT_POLL_SECONDS):
+        """
+        Polls every outstanding transaction in a single batch per tick until all are mined.
+        """
+        deadline = time.monotonic() + timeout
+        pending = list(tx_hashes)
+        mined = {}
+        while pending:
+            for tx_hash, receipt in (await self.receipts(pending)).items():
+                if receipt is not None:
+                    mined[tx_hash] = receipt
+            pending = [tx_hash for tx_hash in pending if tx_hash not in mined]
+            if not pending:
+                break
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError(f"{len(pending)} transactions not mined after {timeout}s")
+            await asyncio.sleep(poll)
+        return mined
+
+    async def wait_for_receipt(self, tx_hash: str, timeout=WEB3_RECEIPT_TIMEOUT, poll=WEB3_RECEIPT_POLL_SECONDS):
+        return (await self.wait_for_receipts([tx_hash], timeout, poll))[tx_hash]
+
+    def stats(self):
+        return {
+            "chain_id": self.chain_id,
+            "signers": {address: nonce for address, nonce in self.nonces.items()},
+            "fees": self.fees,
+            "rpc_requests": self.rpc_requests,
+            "rpc_calls": self.rpc_calls,
+            "submitted": self.submitted,
+            "nonce_resyncs": self.nonce_resyncs,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Shared transaction manager for the whole process
+web3_tx = TransactionManager()
+
+
+async def _web3():
+    return web3_tx
+
+
+async def _web3_reachable(manager: TransactionManager) -> bool:
+    await manager.call("eth_chainId")
+    return True
+
+
+container.register("web3", _web3, close=TransactionManager.close, check=_web3_reachable)
@@ -0,0 +1,166 @@
+import os
+import time
+import asyncio
+import logging
+from utils.db import db
+from utils.metrics import WRITE_BATCH_SIZE, WRITE_BATCH_LATENCY, WRITE_BATCH_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", 100))
+# How long the first write of a batch waits for company (seconds)
+WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY", 0.005))
+# Batches of one writer committing at the same time (connections used)
+WRITE_BATCH_CONCURRENCY = int(os.getenv("WRITE_BATCH_CONCURRENCY", 2))
+
+
+def values_clause(rows, row: str) -> str:
+    """
+    The row template repeated for a multi-row INSERT, e.g. "(%s, %s), (%s, %s)".
+    """
+    return ", ".join([row] * len(rows))
+
+
+def placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+class WriteBatcher:
+    """
+    Write-behind queue that groups small writes from concurrent requests into one
+    transaction per batch, so a signup spike costs one connection and one commit per
+    batch instead of per request. Each caller still awaits its own outcome:
+
+        users_writer = WriteBatcher("users", insert_users)
+        await users_writer.submit(("uid", "Ana", "ana@example.com", "AR"))
+
+    write(conn, items) runs the statements for a batch without committing. When a
+    batch fails it is rolled back and retried one item per transaction, so only the
+    offending callers see the error. Items sharing key(item) never go in the same
+    batch, and keyed writers commit one batch at a time, which keeps per-key order
+    for read-modify-write statements.
+    """
+
+    def __init__(self, name: str, write, key=None, max_batch=WRITE_BATCH_MAX, max_delay=WRITE_BATCH_DELAY,
+                 concurrency=WRITE_BATCH_CONCURRENCY):
+        self.name = name
+        self.write = write
+        self.key = key
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(1 if key else concurrency)
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+        self._deferred = []
+        self._flushes = set()
+        self._task = None
+
+    async def submit(self, item):
+        """
+        Queues one write and waits until its batch has committed (or failed).
+        """
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = self._deferred or [await self.queue.get()]
+        self._deferred = []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 and self.queue.empty():
+                break
+            try:
+                batch.append(self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        if self.key is None:
+            return batch
+        keys, selected = set(), []
+        for entry in batch:
+            key = self.key(entry[0])
+            if key in keys:
+                self._deferred.append(entry)
+            else:
+                keys.add(key)
+                selected.append(entry)
+        return selected
+
+    async def _flush(self, batch):
+        start = time.perf_counter()
+        try:
+            async with db.acquire() as conn:
+                try:
+                    await self.write(conn, [item for item, _ in batch])
+                    await conn.commit()
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result(None)
+                    return
+                except Exception as e:
+                    await conn.rollback()
+                    if len(batch) == 1:
+                        raise
+                    self.fallbacks += 1
+                    WRITE_BATCH_FALLBACKS.labels(self.name).inc()
+                    logger.warning(f"{self.name} batch of {len(batch)} failed, retrying one by one: {e}")
+                for item, future in batch:
+                    try:
+                        await self.write(conn, [item])
+                        await conn.commit()
+                        if not future.done():
+                            future.set_result(None)
+                    except Exception as e:
+                        await conn.rollback()
+                        if not future.done():
+                            future.set_exception(e)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            WRITE_BATCH_LATENCY.labels(self.name).observe(time.perf_counter() - start)
+            self.slots.release()
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            WRITE_BATCH_SIZE.labels(self.name).observe(len(batch))
+            await self.slots.acquire()
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flushes what is already queued, then stops.
+        """
+        while not self.queue.empty() or self._deferred:
+            await asyncio.sleep(self.max_delay)
+            if self._task is None:
+                break
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize() + len(self._deferred),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0,
+            "fallbacks": self.fallbacks,
+        }